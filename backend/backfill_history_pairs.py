@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Script para agregar el atributo "pair" (p. ej. "USD#COP") a las conversiones
+guardadas antes del GSI pair-index. Sin él, esas conversiones no aparecen
+en GET /history?from=&to=.
+
+Uso:
+    python backfill_history_pairs.py --dry-run
+    python backfill_history_pairs.py
+"""
+
+import argparse
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append('.')
+
+from shared import storage
+from rebuild_history_aggregates import iter_history_items
+
+
+def backfill(table, dry_run=False):
+    """Agrega el par a los items que no lo tienen; retorna cuántos actualizó."""
+    updated = 0
+    for item in iter_history_items(table):
+        pair = storage._pair(item.get("from"), item.get("to"))
+        if not pair or item.get(storage.PAIR_ATTRIBUTE) == pair:
+            continue
+        if not dry_run:
+            table.update_item(
+                Key={storage.PARTITION_KEY: item[storage.PARTITION_KEY], storage.SORT_KEY: item[storage.SORT_KEY]},
+                UpdateExpression="SET #pair = :pair",
+                ExpressionAttributeNames={"#pair": storage.PAIR_ATTRIBUTE},
+                ExpressionAttributeValues={":pair": pair},
+            )
+        updated += 1
+    return updated
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Agrega el atributo pair al historial existente")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta los items sin par")
+    args = parser.parse_args()
+
+    table = storage._get_table()
+    if table is None:
+        print("❌ No se pudo obtener la tabla DynamoDB")
+        sys.exit(1)
+
+    print("🔄 Agregando el par a las conversiones existentes...")
+    updated = backfill(table, dry_run=args.dry_run)
+    action = "a actualizar" if args.dry_run else "actualizadas"
+    print(f"✅ {updated} conversiones {action}")
+
+
+if __name__ == "__main__":
+    main()
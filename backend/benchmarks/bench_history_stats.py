@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark de GET /history/stats sobre historial sintético.
+
+Genera N registros (default 1.000.000) en páginas de 1.000 items con
+números Decimal, como los devuelve boto3, y los agrega con cada motor de
+shared.stats. Las páginas se entregan una a una, igual que en el handler,
+así que el pico de memoria (--memory) refleja solo los acumuladores.
+
+  - numpy: bincount / ufunc.at por página (si numpy está instalado)
+  - array: columnas del módulo array y un bucle por registro
+  - legacy (--legacy): cargar todo a floats y agrupar con dicts, como
+    hacía el cliente con GET /history
+
+Uso:
+    python benchmarks/bench_history_stats.py [--records 1000000] [--legacy] [--memory]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+# Agregar el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import stats
+
+PAIRS = [("USD", "COP"), ("USD", "EUR"), ("EUR", "COP"), ("USD", "MXN"), ("GBP", "USD"), ("USD", "JPY")]
+PAGE_SIZE = 1000
+
+
+def build_day_pages(days=30):
+    """Una página por día con items como los entrega fetch_history_page (Decimal)."""
+    start = date(2025, 11, 28)
+    pages = []
+    for offset in range(days):
+        day = (start - timedelta(days=offset)).isoformat()
+        page = []
+        for index in range(PAGE_SIZE):
+            source, target = PAIRS[index % len(PAIRS)]
+            amount = Decimal(10 + index % 990)
+            rate = Decimal("4012.35") + Decimal(index % 97) / 100
+            page.append({
+                "from": source,
+                "to": target,
+                "amount": amount,
+                "result": (amount * rate).quantize(Decimal("0.01")),
+                "rate": rate,
+                "timestamp": f"{day}T10:00:00.{index:06d}+00:00",
+            })
+        pages.append(page)
+    return pages
+
+
+def synthetic_pages(day_pages, records):
+    """Recorre las páginas por día hasta completar ``records`` (sin copiarlas)."""
+    per_day = max(1, records // PAGE_SIZE // len(day_pages))
+    remaining = records
+    for page_index in range(0, -(-records // PAGE_SIZE)):
+        page = day_pages[min(page_index // per_day, len(day_pages) - 1)]
+        yield page if remaining >= PAGE_SIZE else page[:remaining]
+        remaining -= PAGE_SIZE
+
+
+def legacy_stats(pages):
+    """Camino anterior: todo el historial en memoria como floats y agregado con dicts."""
+    history = [
+        {key: float(value) if isinstance(value, Decimal) else value for key, value in item.items()}
+        for page in pages
+        for item in page
+    ]
+    groups = {}
+    for item in history:
+        key = (item["timestamp"][:10], item["from"], item["to"])
+        group = groups.setdefault(key, [0, 0.0, 0.0, []])
+        group[0] += 1
+        group[1] += item["amount"]
+        group[2] += item["result"]
+        group[3].append(item["rate"])
+    return {key: (count, amount, result, sum(rates) / len(rates), min(rates), max(rates))
+            for key, (count, amount, result, rates) in groups.items()}
+
+
+def engine_stats(engine):
+    def run(pages):
+        aggregator = stats.HistoryAggregator(engine)
+        for page in pages:
+            aggregator.add(page)
+        return aggregator.summary()
+    return run
+
+
+def measure(name, func, day_pages, records, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    func(synthetic_pages(day_pages, records))
+    elapsed = time.perf_counter() - started
+    peak = "-"
+    if trace_memory:
+        peak = f"{tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f}"
+        tracemalloc.stop()
+    print(f"{name:<10}{elapsed:>12.2f}{records / elapsed:>18,.0f}{peak:>18}")
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Benchmark de agregados del historial")
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--legacy", action="store_true", help="Incluye el camino en memoria (lento)")
+    parser.add_argument("--memory", action="store_true", help="Mide el pico de memoria (tracemalloc, más lento)")
+    args = parser.parse_args()
+
+    cases = []
+    if stats._load_numpy():
+        cases.append(("numpy", engine_stats("numpy")))
+    cases.append(("array", engine_stats("array")))
+    if args.legacy:
+        cases.append(("legacy", legacy_stats))
+
+    day_pages = build_day_pages()
+    print(f"🚀 Agregados sobre {args.records:,} registros sintéticos (páginas de {PAGE_SIZE})\n")
+    print(f"{'motor':<10}{'tiempo (s)':>12}{'registros/s':>18}{'pico memoria (MB)':>18}")
+    for name, func in cases:
+        measure(name, func, day_pages, args.records, args.memory)
+
+    if not stats._load_numpy():
+        print("\n💡 numpy no está instalado; instálalo para comparar ese motor")
+
+
+if __name__ == "__main__":
+    main()
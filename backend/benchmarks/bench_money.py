@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark del motor de montos de las conversiones.
+
+Mide el núcleo de una conversión tal como lo ejecutan los handlers
+(parsear el monto, aplicar la tasa, redondear, serializar a float y
+preparar los números del item de DynamoDB):
+
+  - conversión: una línea de POST /convert, con la tasa recién cotizada
+  - página: 1.000 líneas de POST /convert/batch (tasas ya resueltas por par)
+
+Motores:
+
+  - anterior: Decimal(str(...)) y quantize a centavos en cada llamada
+  - money: shared.money (Decimal sin str() intermedio, quantum por moneda)
+  - enteros: montos y tasas como enteros escalados en Python puro
+    (prototipo evaluado; queda aquí como referencia)
+
+Para la página también reporta la memoria retenida por los resultados y los
+registros del historial (tracemalloc).
+
+Uso:
+    python benchmarks/bench_money.py [--rows 1000] [--repeat 7]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Context, Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
+
+# Agregar el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import money
+
+CENTS = Decimal("0.01")
+RATE_CONTEXT = Context(prec=12, rounding=ROUND_HALF_EVEN)
+PIVOT_RATES = {"USD": 1, "EUR": 0.9, "COP": 4012.35, "JPY": 150.2, "MXN": 17.05, "GBP": 0.79}
+PAIRS = [("USD", "COP"), ("EUR", "COP"), ("USD", "JPY"), ("GBP", "MXN"), ("COP", "USD"), ("EUR", "USD")]
+
+
+def quote(source, target):
+    """Tasa como la entrega exchange.get_rate (Decimal con 12 dígitos)."""
+    from_rate, to_rate = Decimal(str(PIVOT_RATES[source])), Decimal(str(PIVOT_RATES[target]))
+    return to_rate if source == "USD" else RATE_CONTEXT.divide(to_rate, from_rate)
+
+
+def build_lines(rows):
+    """Montos como llegan de json.loads: enteros y floats."""
+    return [
+        (PAIRS[index % len(PAIRS)], (10 + index % 990) if index % 3 else (10 + index % 990) + 0.25)
+        for index in range(rows)
+    ]
+
+
+# --- anterior -----------------------------------------------------------------
+
+def legacy_line(source, target, raw_amount, rate):
+    amount = Decimal(str(raw_amount))
+    if not amount.is_finite():
+        raise ValueError("'amount' must be a valid number")
+    converted = (amount * rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+    result = {"amount": float(amount), "result": float(converted), "rate": float(rate)}
+    record = {"amount": amount, "result": converted, "rate": rate}
+    return result, record
+
+
+# --- shared.money -------------------------------------------------------------
+
+def money_line(source, target, raw_amount, rate):
+    amount = money.to_decimal(raw_amount)
+    converted = money.convert(amount, rate, target)
+    result = {"amount": float(amount), "result": float(converted), "rate": float(rate)}
+    record = {"amount": amount, "result": converted, "rate": rate}
+    return result, record
+
+
+# --- enteros escalados ----------------------------------------------------------
+
+RATE_DECIMALS = 18
+POWERS = [10 ** exponent for exponent in range(RATE_DECIMALS + 4)]
+
+
+def scale(value, decimals):
+    """``value`` * 10**decimals como entero (ROUND_HALF_UP)."""
+    if type(value) is int:
+        return value * POWERS[decimals]
+    text = repr(value) if type(value) is float else str(value)
+    sign = -1 if text.startswith("-") else 1
+    whole, _, fraction = text.lstrip("+-").partition(".")
+    if not whole.isdigit() or (fraction and not fraction.isdigit()):
+        number = Decimal(text).scaleb(decimals)
+        return int(number.to_integral_value(rounding=ROUND_HALF_UP))
+    if len(fraction) <= decimals:
+        return sign * int(whole + fraction.ljust(decimals, "0"))
+    units = int(whole + fraction[:decimals]) + (fraction[decimals] >= "5")
+    return sign * units
+
+
+class ScaledMoney:
+    __slots__ = ("units", "currency")
+
+    def __init__(self, units, currency):
+        self.units = units
+        self.currency = currency
+
+    def __float__(self):
+        return self.units / POWERS[money.minor_units(self.currency)]
+
+    def to_decimal(self):
+        return Decimal(self.units).scaleb(-money.minor_units(self.currency))
+
+
+class ScaledRate:
+    __slots__ = ("units",)
+
+    def __init__(self, units):
+        self.units = units
+
+    def convert(self, amount, currency):
+        shift = money.minor_units(amount.currency) + RATE_DECIMALS - money.minor_units(currency)
+        quotient, remainder = divmod(abs(amount.units * self.units), POWERS[shift])
+        quotient += 2 * remainder >= POWERS[shift]
+        return ScaledMoney(quotient if amount.units >= 0 else -quotient, currency)
+
+    def __float__(self):
+        return self.units / POWERS[RATE_DECIMALS]
+
+    def to_decimal(self):
+        return Decimal(self.units).scaleb(-RATE_DECIMALS)
+
+
+def scaled_line(source, target, raw_amount, rate):
+    amount = ScaledMoney(scale(raw_amount, money.minor_units(source)), source)
+    converted = rate.convert(amount, target)
+    result = {"amount": float(amount), "result": float(converted), "rate": float(rate)}
+    record = {"amount": amount.to_decimal(), "result": converted.to_decimal(), "rate": rate.to_decimal()}
+    return result, record
+
+
+def scaled_rate(rate):
+    return ScaledRate(scale(rate, RATE_DECIMALS))
+
+
+ENGINES = {
+    "anterior": (legacy_line, None),
+    "money": (money_line, None),
+    "enteros": (scaled_line, scaled_rate),
+}
+
+
+def run_single(engine, lines):
+    """Una conversión por llamada: la tasa se cotiza cada vez."""
+    line, adapt_rate = ENGINES[engine]
+    for (source, target), raw_amount in lines:
+        rate = quote(source, target)
+        line(source, target, raw_amount, adapt_rate(rate) if adapt_rate else rate)
+
+
+def run_page(engine, lines):
+    """Un lote: la tasa se resuelve una vez por par, como convert_currency_batch."""
+    line, adapt_rate = ENGINES[engine]
+    rates = {}
+    results, records = [], []
+    for (source, target), raw_amount in lines:
+        rate = rates.get((source, target))
+        if rate is None:
+            rate = quote(source, target)
+            rate = rates[(source, target)] = adapt_rate(rate) if adapt_rate else rate
+        result, record = line(source, target, raw_amount, rate)
+        results.append(result)
+        records.append(record)
+    return results, records
+
+
+def best_of(repeat, func, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def retained_bytes(engine, lines):
+    tracemalloc.start()
+    kept = run_page(engine, lines)
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def check_results(lines):
+    """Con 2 decimales en destino los tres motores dan los mismos números."""
+    pages = {engine: run_page(engine, lines)[0] for engine in ENGINES}
+    for index, ((_, target), _) in enumerate(lines):
+        rows = [pages[engine][index] for engine in ENGINES]
+        if money.minor_units(target) == 2 and any(row != rows[0] for row in rows):
+            raise SystemExit(f"❌ Resultados distintos en la línea {index}: {rows}")
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Benchmark del motor de montos")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    lines = build_lines(args.rows)
+    single_lines = lines * max(1, 20_000 // len(lines))
+    check_results(lines)
+
+    print(f"🚀 Conversión individual ({len(single_lines):,} llamadas) y página de {args.rows:,} líneas\n")
+    print(f"{'motor':<10}{'µs/conversión':>16}{'ms/página':>12}{'KB retenidos':>14}")
+    for engine in ENGINES:
+        single = best_of(args.repeat, run_single, engine, single_lines) / len(single_lines) * 1e6
+        page = best_of(args.repeat, run_page, engine, lines) * 1e3
+        kept = retained_bytes(engine, lines) / 1024
+        print(f"{engine:<10}{single:>16.2f}{page:>12.2f}{kept:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de serialización de respuestas.
+
+Compara el camino anterior (convertir cada Decimal a float y luego
+json.dumps) con los encoders de shared.responses sobre:
+  - una página de historial de 1.000 items leída de DynamoDB (Decimal)
+  - un payload de 160 tasas de cambio
+
+Uso:
+    python benchmarks/bench_serializers.py [--repeat 200]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import string
+import sys
+import timeit
+from decimal import Decimal
+
+# Agregar el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import responses
+
+
+def build_history_page(size=1000):
+    """Items como los devuelve boto3: números en Decimal."""
+    return [
+        {
+            "id": f"2025-11-28T10:{index // 60 % 60:02d}:{index % 60:02d}.{index:06d}+00:00",
+            "from": "USD",
+            "to": "COP",
+            "amount": Decimal(str(10 + index)),
+            "result": Decimal(str(round((10 + index) * 4012.35, 2))),
+            "rate": Decimal("4012.35"),
+            "timestamp": f"2025-11-28T10:{index // 60 % 60:02d}:{index % 60:02d}.{index:06d}+00:00",
+            "last_updated": "Fri, 28 Nov 2025 00:02:31 +0000",
+        }
+        for index in range(size)
+    ]
+
+
+def build_rates_payload(size=160):
+    codes = ("".join(letters) for letters in itertools.product(string.ascii_uppercase, repeat=3))
+    rates = {code: 1 + index * 0.731 for index, code in zip(range(size), codes)}
+    return {
+        "success": True,
+        "base": "USD",
+        "rates": rates,
+        "last_updated": "Fri, 28 Nov 2025 00:02:31 +0000",
+        "next_update": "Sat, 29 Nov 2025 00:02:31 +0000",
+    }
+
+
+def legacy_history_dumps(page):
+    """Camino anterior: pasada de _to_float por item + json.dumps."""
+    converted = [
+        {key: float(value) if isinstance(value, Decimal) else value for key, value in item.items()}
+        for item in page
+    ]
+    return json.dumps({"success": True, "history": converted})
+
+
+def run(repeat):
+    page = build_history_page()
+    rates = build_rates_payload()
+
+    cases = [("legacy (float pass + json)", lambda: legacy_history_dumps(page), None)]
+    for name, encoder in responses.ENCODERS.items():
+        cases.append((f"{name} (Decimal directo)", lambda e=encoder: e({"success": True, "history": page}),
+                      lambda e=encoder: e(rates)))
+
+    print(f"🚀 Benchmark de serialización ({repeat} repeticiones)\n")
+    print(f"{'encoder':<30}{'historial 1000 (ms)':>22}{'tasas 160 (µs)':>18}")
+    legacy_rates = timeit.timeit(lambda: json.dumps(rates), number=repeat) / repeat
+    for name, history_call, rates_call in cases:
+        history_time = timeit.timeit(history_call, number=repeat) / repeat
+        rates_time = (timeit.timeit(rates_call, number=repeat) / repeat) if rates_call else legacy_rates
+        print(f"{name:<30}{history_time * 1000:>22.3f}{rates_time * 1_000_000:>18.1f}")
+
+    if "orjson" not in responses.ENCODERS:
+        print("\n💡 orjson no está instalado; instálalo para comparar ese encoder")
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Benchmark de encoders JSON")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Perfil del costo de import en cold start por handler (python -X importtime).
+
+Cada handler se importa en un proceso nuevo, igual que en un contenedor
+Lambda recién creado. El script falla (exit 1) cuando:
+  - el import de un handler supera su presupuesto en milisegundos, o
+  - un handler importa en cold start un módulo pesado que debe cargarse
+    en el primer uso (boto3, requests).
+
+Uso:
+    python benchmarks/import_profile.py [--budget-scale 2.0] [--top 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Presupuesto de import (ms) por handler, medido con margen en un runtime Lambda.
+HANDLER_BUDGETS_MS = {
+    "convert_currency.handler": 90,
+    "get_exchange_rates.handler": 90,
+    "get_history.handler": 90,
+}
+
+# Módulos que ningún handler debe importar al cargar; se importan en el primer uso.
+LAZY_MODULES = ("boto3", "botocore", "requests", "urllib3", "numpy")
+
+
+def profile_import(module):
+    """Importa ``module`` en un intérprete nuevo.
+
+    Retorna (cumulative_us, {submódulo: cumulative_us}) considerando solo lo
+    que importa el handler (se excluye el arranque del intérprete y ``site``).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # importtime imprime en post-orden: los hijos aparecen antes que su padre,
+    # con más indentación. Los del handler son los que preceden su línea raíz.
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        if raw_name[1:].startswith(" "):
+            children[name] = int(cumulative_us)
+        elif name == module:
+            return (int(cumulative_us), children)
+        else:
+            children = {}
+    raise RuntimeError(f"No se encontró {module} en la salida de importtime")
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Perfil de import por handler")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="Multiplicador de presupuestos (máquinas más lentas que Lambda)")
+    parser.add_argument("--top", type=int, default=5, help="Imports más costosos a mostrar")
+    args = parser.parse_args()
+
+    failures = []
+    print("🚀 Perfil de imports en cold start\n")
+
+    for module, budget_ms in HANDLER_BUDGETS_MS.items():
+        total_us, children = profile_import(module)
+        total_ms = total_us / 1000
+        allowed_ms = budget_ms * args.budget_scale
+        eager = sorted(name for name in children if name in LAZY_MODULES)
+
+        status = "✅" if total_ms <= allowed_ms and not eager else "❌"
+        print(f"{status} {module}: {total_ms:.1f} ms (presupuesto {allowed_ms:.0f} ms)")
+        heaviest = sorted(children.items(), key=lambda entry: entry[1], reverse=True)
+        for name, cumulative_us in heaviest[:args.top]:
+            print(f"     {cumulative_us / 1000:8.1f} ms  {name}")
+
+        if total_ms > allowed_ms:
+            failures.append(f"{module} supera el presupuesto ({total_ms:.1f} > {allowed_ms:.0f} ms)")
+        if eager:
+            failures.append(f"{module} importa en cold start: {', '.join(eager)}")
+
+    if failures:
+        print("\n❌ Regresiones de cold start:")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+
+    print("\n🎉 Todos los handlers dentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,22 @@
 import base64
 import json
 import logging
-from datetime import datetime, timezone
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-
-import requests
-
-from shared.exchange import ExchangeRateProviderError, fetch_rates, normalize_currency
-from shared.storage import store_conversion_record
+from datetime import datetime, timedelta, timezone
+
+from shared import money
+from shared.exchange import (
+    ExchangeRateConnectionError,
+    ExchangeRateHTTPError,
+    ExchangeRateProviderError,
+    ExchangeRateTimeoutError,
+    get_rate,
+    normalize_currency,
+)
+from shared.responses import error_response, success_response
+from shared.storage import flush_history_on_exit, store_conversion_record, store_conversion_records
 
 logger = logging.getLogger(__name__)
-HEADERS = {
-    "Access-Control-Allow-Origin": "*",
-    "Content-Type": "application/json",
-}
-
-
-def _success_response(payload):
-    return {
-        "statusCode": 200,
-        "headers": HEADERS,
-        "body": json.dumps(payload),
-    }
-
-
-def _error_response(status_code, message, error_detail=None):
-    body = {"success": False, "message": message}
-    if error_detail is not None:
-        body["error"] = error_detail
-    return {
-        "statusCode": status_code,
-        "headers": HEADERS,
-        "body": json.dumps(body),
-    }
+MAX_BATCH_ITEMS = 500
 
 
 def _parse_json_body(event):
@@ -49,6 +33,14 @@ def _parse_json_body(event):
         raise ValueError("Request body must be valid JSON") from exc
 
 
+def _parse_amount(raw_amount):
+    try:
+        return money.to_decimal(raw_amount)
+    except ValueError:
+        raise ValueError("'amount' must be a valid number") from None
+
+
+@flush_history_on_exit
 def convert_currency(event, context):
     try:
         body = _parse_json_body(event)
@@ -56,18 +48,14 @@ def convert_currency(event, context):
         to_currency = normalize_currency(body.get("to"))
 
         try:
-            amount = Decimal(str(body.get("amount")))
-        except (InvalidOperation, TypeError):
-            return _error_response(400, "'amount' must be a valid number")
-
-        rates_payload = fetch_rates(from_currency)
-        rates = rates_payload["rates"]
-
-        if to_currency not in rates:
-            return _error_response(400, f"Currency '{to_currency}' is not supported")
-
-        rate = Decimal(str(rates[to_currency]))
-        converted = (amount * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            amount = _parse_amount(body.get("amount"))
+        except ValueError as exc:
+            return error_response(400, str(exc))
+
+        quote = get_rate(from_currency, to_currency)
+        rate = quote["rate"]
+        # Redondeo a la unidad mínima de la divisa destino (JPY sin decimales)
+        converted = money.convert(amount, rate, to_currency)
         timestamp = datetime.now(timezone.utc).isoformat()
 
         payload = {
@@ -77,8 +65,13 @@ def convert_currency(event, context):
             "amount": float(amount),
             "result": float(converted),
             "rate": float(rate),
-            "last_updated": rates_payload.get("last_updated"),
+            "last_updated": quote["last_updated"],
             "timestamp": timestamp,
+            "metadata": {
+                "cache": quote["cache"],
+                "rate_source": quote["source"],
+                "pivot": quote["pivot"],
+            },
         }
 
         try:
@@ -88,23 +81,110 @@ def convert_currency(event, context):
                 "amount": amount,
                 "result": converted,
                 "rate": rate,
-                "last_updated": rates_payload.get("last_updated"),
+                "last_updated": quote["last_updated"],
                 "timestamp": timestamp,
             })
         except Exception as exc:  # pragma: no cover - logging only
             logger.warning("No se pudo guardar el historial de conversiones: %s", exc)
 
-        return _success_response(payload)
+        return success_response(payload)
+
+    except ValueError as exc:
+        return error_response(400, str(exc))
+    except ExchangeRateTimeoutError:
+        return error_response(504, "Exchange rate service timed out")
+    except ExchangeRateHTTPError as exc:
+        return error_response(exc.status_code, "Exchange rate service returned an error", str(exc))
+    except ExchangeRateConnectionError:
+        return error_response(502, "Unable to contact exchange rate service")
+    except ExchangeRateProviderError as exc:
+        return error_response(502, str(exc))
+    except Exception as exc:
+        return error_response(500, "Internal server error", str(exc))
+
+
+@flush_history_on_exit
+def convert_currency_batch(event, context):
+    """POST /convert/batch - Convierte varias líneas con una sola resolución de tasas"""
+    try:
+        body = _parse_json_body(event)
+        items = body.get("items") if isinstance(body, dict) else body
+
+        if not isinstance(items, list) or not items:
+            return error_response(400, "'items' must be a non-empty array")
+        if len(items) > MAX_BATCH_ITEMS:
+            return error_response(400, f"A batch accepts at most {MAX_BATCH_ITEMS} items")
+
+        quotes = {}
+        results = []
+        records = []
+        started_at = datetime.now(timezone.utc)
+
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Each item must be an object")
+                from_currency = normalize_currency(item.get("from"))
+                to_currency = normalize_currency(item.get("to"))
+                amount = _parse_amount(item.get("amount"))
+
+                pair = (from_currency, to_currency)
+                if pair not in quotes:
+                    quote = get_rate(from_currency, to_currency)
+                    quotes[pair] = (quote, float(quote["rate"]))
+                quote, rate_value = quotes[pair]
+                rate = quote["rate"]
+                converted = money.convert(amount, rate, to_currency)
+            except ValueError as exc:
+                results.append({"index": index, "success": False, "message": str(exc)})
+                continue
+
+            # Un timestamp distinto por línea: el sort key debe ser único.
+            timestamp = (started_at + timedelta(microseconds=index)).isoformat()
+
+            results.append({
+                "index": index,
+                "success": True,
+                "from": from_currency,
+                "to": to_currency,
+                "amount": float(amount),
+                "result": float(converted),
+                "rate": rate_value,
+                "timestamp": timestamp,
+            })
+            records.append({
+                "from": from_currency,
+                "to": to_currency,
+                "amount": amount,
+                "result": converted,
+                "rate": rate,
+                "last_updated": quote["last_updated"],
+                "timestamp": timestamp,
+            })
+
+        try:
+            persisted = store_conversion_records(records)
+        except Exception as exc:  # pragma: no cover - logging only
+            logger.warning("No se pudo guardar el historial de conversiones: %s", exc)
+            persisted = 0
+
+        return success_response({
+            "success": True,
+            "results": results,
+            "converted": len(records),
+            "failed": len(results) - len(records),
+            "persisted": persisted,
+        })
 
     except ValueError as exc:
-        return _error_response(400, str(exc))
-    except requests.Timeout:
-        return _error_response(504, "Exchange rate service timed out")
-    except requests.HTTPError as exc:
-        return _error_response(exc.response.status_code, "Exchange rate service returned an error", str(exc))
-    except requests.RequestException:
-        return _error_response(502, "Unable to contact exchange rate service")
+        return error_response(400, str(exc))
+    except ExchangeRateTimeoutError:
+        return error_response(504, "Exchange rate service timed out")
+    except ExchangeRateHTTPError as exc:
+        return error_response(exc.status_code, "Exchange rate service returned an error", str(exc))
+    except ExchangeRateConnectionError:
+        return error_response(502, "Unable to contact exchange rate service")
     except ExchangeRateProviderError as exc:
-        return _error_response(502, str(exc))
+        return error_response(502, str(exc))
     except Exception as exc:
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
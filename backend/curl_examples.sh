@@ -96,6 +96,25 @@ curl -X DELETE "${API_URL}/history/${CONVERSION_ID}" \
 curl -X DELETE "${API_URL}/history/2025-10-28T10:00:00Z" \
   -H "Accept: application/json"
 
+# =============================================================================
+# 6. OPERACIONES MASIVAS (POST /history/bulk-delete, PATCH /history/bulk)
+# =============================================================================
+
+# Eliminar varias conversiones en una sola petición (máximo 500 IDs)
+curl -X POST "${API_URL}/history/bulk-delete" \
+  -H "Content-Type: application/json" \
+  -d '{"ids": ["2025-10-28T10:00:00Z", "2025-10-27T14:30:00Z"]}'
+
+# Aplicar los mismos cambios a varias conversiones
+curl -X PATCH "${API_URL}/history/bulk" \
+  -H "Content-Type: application/json" \
+  -d '{"ids": ["2025-10-28T10:00:00Z", "2025-10-27T14:30:00Z"], "updates": {"rate": 0.93}}'
+
+# Cambios distintos por conversión
+curl -X PATCH "${API_URL}/history/bulk" \
+  -H "Content-Type: application/json" \
+  -d '{"items": [{"id": "2025-10-28T10:00:00Z", "amount": 120}, {"id": "2025-10-27T14:30:00Z", "amount": 60}]}'
+
 # =============================================================================
 # EJEMPLOS DE CASOS DE ERROR
 # =============================================================================
@@ -1,59 +1,168 @@
-import json
+import base64
+import hashlib
+import struct
+from datetime import date, datetime, timedelta, timezone
 
-import requests
+from shared.exchange import (
+    ExchangeRateConnectionError,
+    ExchangeRateHTTPError,
+    ExchangeRateProviderError,
+    ExchangeRateTimeoutError,
+    rates_for_base,
+    rates_history,
+)
+from shared.responses import (
+    cache_headers,
+    error_response,
+    etag_matches,
+    not_modified_response,
+    success_response,
+)
 
-from shared.exchange import ExchangeRateProviderError, fetch_rates
+DEFAULT_HISTORY_DAYS = 30
+MAX_HISTORY_DAYS = 366
+RATE_FORMATS = ("full", "compact", "packed")
 
-HEADERS = {
-    "Access-Control-Allow-Origin": "*",
-    "Content-Type": "application/json",
-}
 
+def _parse_day(raw, name):
+    try:
+        return date.fromisoformat(str(raw).strip())
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format") from None
 
-def _success_response(payload):
-    return {
-        "statusCode": 200,
-        "headers": HEADERS,
-        "body": json.dumps(payload),
-    }
+
+def _parse_symbols(raw):
+    return [code.strip() for code in (raw or "").split(",") if code.strip()]
+
+
+def _rates_etag(rates_payload, variant=""):
+    """Versión de las tasas: cambia solo cuando el proveedor publica (last_updated).
+
+    ``variant`` distingue representaciones de la misma versión (formato y símbolos).
+    """
+    last_updated = rates_payload.get("last_updated")
+    if not last_updated:
+        return None
+    key = f"{rates_payload['base']}|{last_updated}|{variant}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return f'W/"rates-{digest}"'
 
 
-def _error_response(status_code, message, error_detail=None):
-    body = {"success": False, "message": message}
-    if error_detail is not None:
-        body["error"] = error_detail
-    return {
-        "statusCode": status_code,
-        "headers": HEADERS,
-        "body": json.dumps(body),
+def _compact_rates(rates_payload, symbols, packed=False):
+    """Lista fija de monedas y arreglo paralelo de tasas (o float64 little-endian en base64).
+
+    Sin ``symbols`` la lista es la tabla completa en orden alfabético.
+    """
+    rates = rates_payload["rates"]
+    symbols = symbols or sorted(rates)
+    values = [float(rates[code]) for code in symbols]
+    body = {
+        "success": True,
+        "base": rates_payload["base"],
+        "symbols": symbols,
+        "rates": values,
+        "last_updated": rates_payload.get("last_updated"),
+        "next_update": rates_payload.get("next_update"),
+        "stale": rates_payload.get("stale", False),
     }
+    if packed:
+        body["rates"] = base64.b64encode(struct.pack(f"<{len(values)}d", *values)).decode("ascii")
+        body["encoding"] = "float64le"
+    return body
 
 
 def get_exchange_rates(event, context):
     try:
         params = event.get("queryStringParameters") or {}
         base_currency = params.get("base") or "USD"
+        symbols = _parse_symbols(params.get("symbols"))
+        response_format = (params.get("format") or "full").strip().lower()
+        if response_format not in RATE_FORMATS:
+            return error_response(400, f"'format' must be one of: {', '.join(RATE_FORMATS)}")
+
+        rates_payload = rates_for_base(base_currency, symbols or None)
+        # Códigos normalizados y en el orden pedido
+        symbols = list(rates_payload["rates"]) if symbols else None
+
+        # Cacheable hasta la próxima actualización; si se sirve stale, se revalida
+        headers = {}
+        etag = _rates_etag(rates_payload, f"{response_format}|{','.join(symbols or ())}")
+        if etag:
+            cache = rates_payload.get("cache") or {}
+            max_age = 0 if rates_payload.get("stale") else cache.get("expires_in", 0)
+            headers = cache_headers(etag, max_age)
+            if etag_matches(event, etag):
+                return not_modified_response(headers)
 
-        rates_payload = fetch_rates(base_currency)
+        if response_format != "full":
+            return success_response(
+                _compact_rates(rates_payload, symbols, packed=response_format == "packed"), headers=headers
+            )
 
-        return _success_response({
+        return success_response({
             "success": True,
             "base": rates_payload["base"],
             "rates": rates_payload["rates"],
             "last_updated": rates_payload.get("last_updated"),
             "next_update": rates_payload.get("next_update"),
-            "metadata": rates_payload.get("additional_info"),
-        })
+            "stale": rates_payload.get("stale", False),
+            "metadata": {
+                **(rates_payload.get("additional_info") or {}),
+                "cache": rates_payload.get("cache"),
+                "rate_source": rates_payload.get("source"),
+            },
+        }, headers=headers)
 
     except ValueError as exc:
-        return _error_response(400, str(exc))
-    except requests.Timeout:
-        return _error_response(504, "Exchange rate service timed out")
-    except requests.HTTPError as exc:
-        return _error_response(exc.response.status_code, "Exchange rate service returned an error", str(exc))
-    except requests.RequestException:
-        return _error_response(502, "Unable to contact exchange rate service")
+        return error_response(400, str(exc))
+    except ExchangeRateTimeoutError:
+        return error_response(504, "Exchange rate service timed out")
+    except ExchangeRateHTTPError as exc:
+        return error_response(exc.status_code, "Exchange rate service returned an error", str(exc))
+    except ExchangeRateConnectionError:
+        return error_response(502, "Unable to contact exchange rate service")
     except ExchangeRateProviderError as exc:
-        return _error_response(502, str(exc))
+        return error_response(502, str(exc))
+    except Exception as exc:
+        return error_response(500, "Internal server error", str(exc))
+
+
+def get_rates_history(event, context):
+    """GET /rates/history?base=&symbols=&from=&to= - Tasas diarias en un rango de fechas"""
+    try:
+        params = event.get("queryStringParameters") or {}
+        base_currency = params.get("base") or "USD"
+        symbols = _parse_symbols(params.get("symbols"))
+
+        end_day = (
+            _parse_day(params["to"], "to") if params.get("to")
+            else datetime.now(timezone.utc).date()
+        )
+        start_day = (
+            _parse_day(params["from"], "from") if params.get("from")
+            else end_day - timedelta(days=DEFAULT_HISTORY_DAYS - 1)
+        )
+        if (end_day - start_day).days >= MAX_HISTORY_DAYS:
+            return error_response(400, f"Date range cannot exceed {MAX_HISTORY_DAYS} days")
+
+        history = rates_history(base_currency, start_day, end_day, symbols or None)
+        if history is None:
+            return error_response(503, "Rate history storage unavailable")
+
+        return success_response({
+            "success": True,
+            "base": history["base"],
+            "from": start_day.isoformat(),
+            "to": end_day.isoformat(),
+            "rates": history["rates"],
+            "metadata": {
+                "days": len(history["rates"]),
+                "pivot": history["pivot"],
+                "rate_source": history["source"],
+            },
+        })
+
+    except ValueError as exc:
+        return error_response(400, str(exc))
     except Exception as exc:
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
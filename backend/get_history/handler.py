@@ -1,20 +1,42 @@
+import hashlib
 import json
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from urllib.parse import unquote_plus
 
+from shared.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from shared.responses import (
+    cache_headers,
+    error_response,
+    etag_matches,
+    not_modified_response,
+    success_response,
+)
+from shared.stats import HistoryAggregator, summarize_counters
 from shared.storage import (
-    fetch_history, 
+    EDITABLE_FIELDS,
+    fetch_daily_aggregates,
+    fetch_history_page,
     store_conversion_record, 
     get_conversion_by_id,
     update_conversion_record,
-    delete_conversion_record
+    delete_conversion_record,
+    delete_conversion_records,
+    update_conversion_records,
+    flush_history_on_exit,
+    parse_fields,
+    parse_time_bound,
 )
 
-HEADERS = {
-    "Access-Control-Allow-Origin": "*",
-    "Content-Type": "application/json",
-}
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BULK_ITEMS = 500
+
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+STATS_PAGE_SIZE = 1000
+MAX_STATS_RECORDS = 1_000_000
+STATS_FIELDS = ["from", "to", "amount", "result", "rate", "timestamp"]
 
 FALLBACK_HISTORY = [
     {
@@ -52,23 +74,30 @@ def _decode_conversion_id(raw_id):
     return decoded_id
 
 
-def _success_response(body):
-    return {
-        "statusCode": 200,
-        "headers": HEADERS,
-        "body": json.dumps(body),
-    }
+def _select_fields(item, fields):
+    """Aplica el filtro de campos a los datos de respaldo (mock)"""
+    if not fields:
+        return item
+    return {field: item.get(field) for field in fields}
+
+
+def _parse_pair(from_currency, to_currency):
+    """Filtro por par: el GSI necesita ambas divisas."""
+    if not from_currency and not to_currency:
+        return None
+    if not from_currency or not to_currency:
+        raise ValueError("'from' and 'to' must be used together")
+    codes = (str(from_currency).strip().upper(), str(to_currency).strip().upper())
+    if not all(len(code) == 3 and code.isalpha() for code in codes):
+        raise ValueError("'from' and 'to' must be 3-letter currency codes")
+    return codes
 
 
-def _error_response(status_code, message, error_detail=None):
-    data = {"success": False, "message": message}
-    if error_detail is not None:
-        data["error"] = error_detail
-    return {
-        "statusCode": status_code,
-        "headers": HEADERS,
-        "body": json.dumps(data),
-    }
+def _history_etag(history, next_cursor):
+    """Versión de una página: cambia si se crea, edita o borra alguna de sus conversiones."""
+    page = json.dumps([history, next_cursor], sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha1(page.encode("utf-8")).hexdigest()[:16]
+    return f'W/"history-{digest}"'
 
 
 def get_history(event, context):
@@ -76,29 +105,126 @@ def get_history(event, context):
     try:
         # Obtener parámetros de query
         query_params = event.get("queryStringParameters") or {}
-        limit = int(query_params.get("limit", 20))
-        
-        history, storage_active = fetch_history(limit)
-        if not history:
-            history = FALLBACK_HISTORY
+        try:
+            limit = int(query_params.get("limit", DEFAULT_PAGE_SIZE))
+        except (TypeError, ValueError):
+            return error_response(400, "'limit' must be an integer")
+        # El tamaño de página se limita en el servidor
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        cursor = query_params.get("cursor")
+        try:
+            start_key = decode_cursor(cursor)
+            fields = parse_fields(query_params.get("fields"))
+            since = parse_time_bound(query_params.get("since"))
+            until = parse_time_bound(query_params.get("until"), upper=True)
+            pair = _parse_pair(query_params.get("from"), query_params.get("to"))
+        except (InvalidCursorError, ValueError) as exc:
+            return error_response(400, str(exc))
+        if since and until and since > until:
+            return error_response(400, "'since' must not be after 'until'")
+
+        history, last_key, storage_active = fetch_history_page(
+            limit, start_key, fields, since=since, until=until, pair=pair
+        )
+        filtered = bool(since or until or pair)
+        if not history and not cursor and not last_key and not filtered:
+            history = [_select_fields(item, fields) for item in FALLBACK_HISTORY]
+
+        next_cursor = encode_cursor(last_key)
+        if not storage_active:
+            return success_response({
+                "success": True,
+                "history": history,
+                "next_cursor": next_cursor,
+                "source": "mock",
+            })
 
-        return _success_response({
+        # El ETag sale de la página misma: si el cliente ya la tiene se
+        # responde 304 sin body, sin lecturas ni escrituras adicionales.
+        headers = cache_headers(_history_etag(history, next_cursor))
+        if etag_matches(event, headers["ETag"]):
+            return not_modified_response(headers)
+        return success_response({
             "success": True,
             "history": history,
-            "source": "dynamodb" if storage_active else "mock",
-        })
+            "next_cursor": next_cursor,
+            "source": "dynamodb",
+        }, headers=headers)
 
     except Exception as exc:
         logger.exception("Error al obtener el historial de conversiones")
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
+
+
+def get_history_stats(event, context):
+    """GET /history/stats - Volumen y tasa promedio/mín/máx por par y por día"""
+    try:
+        query_params = event.get("queryStringParameters") or {}
+        try:
+            days = int(query_params.get("days", DEFAULT_STATS_DAYS))
+        except (TypeError, ValueError):
+            return error_response(400, "'days' must be an integer")
+        days = max(1, min(days, MAX_STATS_DAYS))
+        today = datetime.now(timezone.utc).date()
+        cutoff = (today - timedelta(days=days - 1)).isoformat()
+
+        source = query_params.get("source") or "scan"
+        if source not in ("scan", "counters"):
+            return error_response(400, "'source' must be 'scan' or 'counters'")
+
+        if source == "counters":
+            # Contadores mantenidos al escribir: O(días x pares) items leídos
+            rows = fetch_daily_aggregates(today - timedelta(days=days - 1), today)
+            if rows is None:
+                return error_response(503, "History storage unavailable")
+            return success_response({
+                "success": True,
+                "from": cutoff,
+                "to": today.isoformat(),
+                **summarize_counters(rows),
+                "metadata": {"source": "counters", "days": days},
+            })
+
+        # Se recorren páginas del más reciente al más antiguo; cada página se
+        # agrega y se descarta, así la memoria no crece con el historial.
+        aggregator = HistoryAggregator()
+        start_key, pages, truncated = None, 0, False
+        while True:
+            page, start_key, storage_active = fetch_history_page(
+                STATS_PAGE_SIZE, start_key, STATS_FIELDS, since=cutoff
+            )
+            if not storage_active:
+                return error_response(503, "History storage unavailable")
+            pages += 1
+            in_range = [item for item in page if str(item.get("timestamp") or "")[:10] >= cutoff]
+            aggregator.add(in_range)
+            if not start_key or len(in_range) < len(page):
+                break
+            if aggregator.records >= MAX_STATS_RECORDS:
+                truncated = True
+                break
+
+        return success_response({
+            "success": True,
+            "from": cutoff,
+            "to": today.isoformat(),
+            **aggregator.summary(),
+            "metadata": {"source": "scan", "engine": aggregator.engine, "pages": pages, "truncated": truncated},
+        })
+
+    except Exception as exc:
+        logger.exception("Error al calcular las estadísticas del historial")
+        return error_response(500, "Internal server error", str(exc))
 
 
+@flush_history_on_exit
 def create_conversion(event, context):
     """POST /history - Crea una nueva entrada en el historial"""
     try:
         # Validar que hay un body
         if not event.get("body"):
-            return _error_response(400, "Request body is required")
+            return error_response(400, "Request body is required")
 
         body = json.loads(event["body"])
         
@@ -107,24 +233,26 @@ def create_conversion(event, context):
         missing_fields = [field for field in required_fields if not body.get(field)]
         
         if missing_fields:
-            return _error_response(400, f"Missing required fields: {', '.join(missing_fields)}")
+            return error_response(400, f"Missing required fields: {', '.join(missing_fields)}")
 
-        # Crear timestamp si no se proporciona
-        if not body.get("timestamp"):
+        # Crear timestamp si no se proporciona; uno del cliente puede
+        # sobrescribir un ID existente y se escribe sin pasar por el buffer
+        client_timestamp = bool(body.get("timestamp"))
+        if not client_timestamp:
             body["timestamp"] = datetime.now(timezone.utc).isoformat()
 
         # Guardar la conversión
-        success = store_conversion_record(body)
+        success = store_conversion_record(body, overwrite=client_timestamp)
         
         if success:
-            return _success_response({
+            return success_response({
                 "success": True,
                 "message": "Conversion record created successfully",
                 "data": body
             })
         else:
             # Si no se pudo guardar en DynamoDB, devolver la data pero indicar que no se persistió
-            return _success_response({
+            return success_response({
                 "success": True,
                 "message": "Conversion record created (not persisted - storage unavailable)",
                 "data": body,
@@ -132,12 +260,12 @@ def create_conversion(event, context):
             })
 
     except json.JSONDecodeError:
-        return _error_response(400, "Invalid JSON in request body")
+        return error_response(400, "Invalid JSON in request body")
     except ValueError as e:
-        return _error_response(400, f"Invalid data: {str(e)}")
+        return error_response(400, f"Invalid data: {str(e)}")
     except Exception as exc:
         logger.exception("Error creating conversion record")
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
 
 
 def get_conversion_by_id_handler(event, context):
@@ -148,12 +276,18 @@ def get_conversion_by_id_handler(event, context):
         raw_id = path_params.get("id")
         
         if not raw_id:
-            return _error_response(400, "Conversion ID is required")
+            return error_response(400, "Conversion ID is required")
         
         conversion_id = _decode_conversion_id(raw_id)
         logger.info(f"Looking for conversion with ID: {conversion_id}")
 
-        conversion, storage_active = get_conversion_by_id(conversion_id)
+        query_params = event.get("queryStringParameters") or {}
+        try:
+            fields = parse_fields(query_params.get("fields"))
+        except ValueError as exc:
+            return error_response(400, str(exc))
+
+        conversion, storage_active = get_conversion_by_id(conversion_id, fields)
         
         if not storage_active:
             # Buscar en el fallback data
@@ -162,18 +296,18 @@ def get_conversion_by_id_handler(event, context):
                 None
             )
             if fallback_conversion:
-                return _success_response({
+                return success_response({
                     "success": True,
-                    "conversion": fallback_conversion,
+                    "conversion": _select_fields(fallback_conversion, fields),
                     "source": "mock"
                 })
             else:
-                return _error_response(404, "Conversion not found")
+                return error_response(404, "Conversion not found")
 
         if conversion is None:
-            return _error_response(404, "Conversion not found")
+            return error_response(404, "Conversion not found")
 
-        return _success_response({
+        return success_response({
             "success": True,
             "conversion": conversion,
             "source": "dynamodb"
@@ -181,7 +315,7 @@ def get_conversion_by_id_handler(event, context):
 
     except Exception as exc:
         logger.exception("Error getting conversion by ID")
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
 
 
 def update_conversion(event, context):
@@ -192,40 +326,37 @@ def update_conversion(event, context):
         raw_id = path_params.get("id")
         
         if not raw_id:
-            return _error_response(400, "Conversion ID is required")
+            return error_response(400, "Conversion ID is required")
         
         conversion_id = _decode_conversion_id(raw_id)
         logger.info(f"Updating conversion with ID: {conversion_id}")
 
         # Validar que hay un body
         if not event.get("body"):
-            return _error_response(400, "Request body is required")
+            return error_response(400, "Request body is required")
 
         updates = json.loads(event["body"])
         
         # Agregar timestamp de última actualización
         updates["last_updated"] = datetime.now(timezone.utc).isoformat()
 
-        # Intentar actualizar
-        success = update_conversion_record(conversion_id, updates)
+        # Intentar actualizar (retorna el item nuevo en la misma llamada)
+        updated_conversion = update_conversion_record(conversion_id, updates)
         
-        if not success:
-            return _error_response(404, "Conversion not found or could not be updated")
+        if updated_conversion is None:
+            return error_response(404, "Conversion not found or could not be updated")
 
-        # Obtener la conversión actualizada
-        updated_conversion, _ = get_conversion_by_id(conversion_id)
-        
-        return _success_response({
+        return success_response({
             "success": True,
             "message": "Conversion updated successfully",
             "conversion": updated_conversion
         })
 
     except json.JSONDecodeError:
-        return _error_response(400, "Invalid JSON in request body")
+        return error_response(400, "Invalid JSON in request body")
     except Exception as exc:
         logger.exception("Error updating conversion")
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
 
 
 def delete_conversion(event, context):
@@ -236,7 +367,7 @@ def delete_conversion(event, context):
         raw_id = path_params.get("id")
         
         if not raw_id:
-            return _error_response(400, "Conversion ID is required")
+            return error_response(400, "Conversion ID is required")
         
         conversion_id = _decode_conversion_id(raw_id)
         logger.info(f"Deleting conversion with ID: {conversion_id}")
@@ -245,13 +376,108 @@ def delete_conversion(event, context):
         success = delete_conversion_record(conversion_id)
         
         if not success:
-            return _error_response(404, "Conversion not found or could not be deleted")
+            return error_response(404, "Conversion not found or could not be deleted")
 
-        return _success_response({
+        return success_response({
             "success": True,
             "message": "Conversion deleted successfully"
         })
 
     except Exception as exc:
         logger.exception("Error deleting conversion")
-        return _error_response(500, "Internal server error", str(exc))
+        return error_response(500, "Internal server error", str(exc))
+
+
+def _parse_bulk_ids(ids):
+    """Valida la lista de IDs de una operación masiva y elimina duplicados."""
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("'ids' must be a non-empty array")
+    if len(ids) > MAX_BULK_ITEMS:
+        raise ValueError(f"A bulk request accepts at most {MAX_BULK_ITEMS} IDs")
+    if not all(isinstance(conversion_id, str) and conversion_id for conversion_id in ids):
+        raise ValueError("Each ID must be a non-empty string")
+    return list(dict.fromkeys(ids))
+
+
+def bulk_delete_conversions(event, context):
+    """POST /history/bulk-delete - Elimina varias conversiones en una sola invocación"""
+    try:
+        body = json.loads(event.get("body") or "{}")
+        conversion_ids = _parse_bulk_ids(body.get("ids") if isinstance(body, dict) else None)
+
+        outcomes = delete_conversion_records(conversion_ids)
+        if outcomes is None:
+            return error_response(503, "History storage unavailable")
+
+        results = [{"id": conversion_id, "status": status} for conversion_id, status in outcomes.items()]
+        return success_response({
+            "success": True,
+            "results": results,
+            "deleted": sum(1 for result in results if result["status"] == "deleted"),
+            "not_found": sum(1 for result in results if result["status"] == "not_found"),
+            "failed": sum(1 for result in results if result["status"] == "failed"),
+        })
+
+    except json.JSONDecodeError:
+        return error_response(400, "Invalid JSON in request body")
+    except ValueError as exc:
+        return error_response(400, str(exc))
+    except Exception as exc:
+        logger.exception("Error deleting conversions in bulk")
+        return error_response(500, "Internal server error", str(exc))
+
+
+def bulk_update_conversions(event, context):
+    """PATCH /history/bulk - Actualiza varias conversiones en una sola invocación
+
+    Acepta ``{"items": [{"id": ..., "amount": ...}, ...]}`` con cambios por ID
+    o ``{"ids": [...], "updates": {...}}`` con los mismos cambios para todos.
+    """
+    try:
+        body = json.loads(event.get("body") or "{}")
+        if not isinstance(body, dict):
+            return error_response(400, "Request body must be an object")
+
+        if "items" in body:
+            items = body["items"]
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                return error_response(400, "'items' must be an array of objects")
+            conversion_ids = _parse_bulk_ids([item.get("id") for item in items])
+            updates_by_id = {
+                item["id"]: {field: value for field, value in item.items() if field != "id"}
+                for item in items
+            }
+        else:
+            updates = body.get("updates")
+            if not isinstance(updates, dict) or not updates:
+                return error_response(400, "'updates' must be a non-empty object")
+            conversion_ids = _parse_bulk_ids(body.get("ids"))
+            updates_by_id = {conversion_id: dict(updates) for conversion_id in conversion_ids}
+
+        # Agregar timestamp de última actualización solo donde hay algo que
+        # editar: un item con campos desconocidos queda "invalid"
+        last_updated = datetime.now(timezone.utc).isoformat()
+        for updates in updates_by_id.values():
+            if any(field in updates for field in EDITABLE_FIELDS):
+                updates["last_updated"] = last_updated
+
+        outcomes = update_conversion_records(updates_by_id)
+        if outcomes is None:
+            return error_response(503, "History storage unavailable")
+
+        results = [{"id": conversion_id, **outcomes[conversion_id]} for conversion_id in conversion_ids]
+        return success_response({
+            "success": True,
+            "results": results,
+            "updated": sum(1 for result in results if result["status"] == "updated"),
+            "not_found": sum(1 for result in results if result["status"] == "not_found"),
+            "failed": sum(1 for result in results if result["status"] in ("failed", "invalid")),
+        })
+
+    except json.JSONDecodeError:
+        return error_response(400, "Invalid JSON in request body")
+    except ValueError as exc:
+        return error_response(400, str(exc))
+    except Exception as exc:
+        logger.exception("Error updating conversions in bulk")
+        return error_response(500, "Internal server error", str(exc))
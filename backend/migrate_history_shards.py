@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Script de migración del historial a particiones por día y shard.
+Copia los items de "conversion#history" a "conversion#YYYY-MM-DD#N"
+según HISTORY_SHARD_COUNT y, opcionalmente, elimina los originales.
+
+Uso:
+    HISTORY_SHARD_COUNT=4 python migrate_history_shards.py --dry-run
+    HISTORY_SHARD_COUNT=4 python migrate_history_shards.py --delete-legacy
+"""
+
+import argparse
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append('.')
+
+from shared import storage
+
+
+def iter_legacy_items(table):
+    """Recorre todas las páginas de la partición legacy."""
+    start_key = None
+    while True:
+        items, start_key = storage._query_partition(
+            table, storage.LEGACY_PARTITION, 500, start_key=start_key
+        )
+        yield from items
+        if not start_key:
+            break
+
+
+def migrate(table, delete_legacy=False, dry_run=False):
+    """Copia cada item legacy a su partición con shard; retorna cuántos movió."""
+    moved = 0
+    legacy_keys = []
+
+    with table.batch_writer() as batch:
+        for item in iter_legacy_items(table):
+            sort_key = item[storage.SORT_KEY]
+            target = dict(item)
+            target[storage.PARTITION_KEY] = storage._partition_for(sort_key)
+            if not dry_run:
+                batch.put_item(Item=target)
+            legacy_keys.append({
+                storage.PARTITION_KEY: storage.LEGACY_PARTITION,
+                storage.SORT_KEY: sort_key,
+            })
+            moved += 1
+
+    # Se borra solo después de haber copiado todo
+    if delete_legacy and not dry_run:
+        with table.batch_writer() as batch:
+            for key in legacy_keys:
+                batch.delete_item(Key=key)
+
+    return moved
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Migra el historial a particiones con shard")
+    parser.add_argument("--delete-legacy", action="store_true", help="Elimina los items originales al terminar")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta los items a migrar")
+    args = parser.parse_args()
+
+    if storage.SHARD_COUNT <= 0:
+        print("❌ Define HISTORY_SHARD_COUNT > 0 para migrar")
+        sys.exit(1)
+
+    table = storage._get_table()
+    if table is None:
+        print("❌ No se pudo obtener la tabla DynamoDB")
+        sys.exit(1)
+
+    print(f"🔄 Migrando historial a {storage.SHARD_COUNT} shards por día...")
+    moved = migrate(table, delete_legacy=args.delete_legacy, dry_run=args.dry_run)
+    action = "a migrar" if args.dry_run else "migrados"
+    print(f"✅ {moved} registros {action}")
+    if not args.delete_legacy:
+        print("💡 Los items originales se conservan; mantén HISTORY_READ_LEGACY=true hasta eliminarlos")
+
+
+if __name__ == "__main__":
+    main()
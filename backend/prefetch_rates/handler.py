@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+
+from shared.exchange import (
+    PIVOT_CURRENCY,
+    PREFETCH_INTERVAL,
+    ExchangeRateProviderError,
+    normalize_currency,
+    refresh_rates,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _configured_bases():
+    raw = os.environ.get("PREFETCH_BASES") or PIVOT_CURRENCY
+    return [code.strip() for code in raw.split(",") if code.strip()]
+
+
+def prefetch_rates(event, context):
+    """Evento programado - Refresca las tasas del cache compartido antes de que venzan
+
+    Se renueva toda base que vence antes de la próxima ejecución
+    (EXCHANGE_PREFETCH_INTERVAL, el mismo período del schedule).
+    """
+    event = event or {}
+    force = bool(event.get("force"))
+    summary = {"refreshed": [], "skipped": [], "failed": {}}
+
+    for raw_base in event.get("bases") or _configured_bases():
+        try:
+            base = normalize_currency(raw_base)
+            payload = refresh_rates(base, only_if_expired=not force, refresh_ahead=PREFETCH_INTERVAL)
+        except (ValueError, ExchangeRateProviderError) as exc:
+            logger.warning("No fue posible precargar las tasas de %s: %s", raw_base, exc)
+            summary["failed"][str(raw_base)] = str(exc)
+            continue
+
+        if payload is None:
+            summary["skipped"].append(base)
+        else:
+            summary["refreshed"].append(base)
+            logger.info("Tasas de %s precargadas (last_updated=%s)", base, payload.get("last_updated"))
+
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from prefetch_rates.stub_provider import start_stub_provider
+    from shared import exchange
+
+    parser = argparse.ArgumentParser(description="Ejecuta el prefetcher de tasas en local")
+    parser.add_argument("--stub", action="store_true", help="Usa un proveedor simulado en localhost")
+    parser.add_argument("--force", action="store_true", help="Refresca aunque el cache siga vigente")
+    parser.add_argument("bases", nargs="*", help="Bases a precargar (default: PREFETCH_BASES)")
+    args = parser.parse_args()
+
+    if args.stub:
+        _, exchange.API_BASE_URL = start_stub_provider()
+
+    result = prefetch_rates({"force": args.force, "bases": args.bases}, None)
+    print(json.dumps(result, indent=2))
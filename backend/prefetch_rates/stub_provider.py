@@ -0,0 +1,88 @@
+"""Stub of the open.er-api.com "latest" endpoint for local runs.
+
+Serves deterministic rates for ``GET /v6/latest/<BASE>`` so the prefetcher
+and the handlers can be exercised without network access::
+
+    python -m prefetch_rates.stub_provider --port 8081
+    EXCHANGE_API_BASE=http://127.0.0.1:8081/v6/latest python -m prefetch_rates.handler
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+USD_RATES: Dict[str, float] = {
+    "USD": 1.0,
+    "EUR": 0.8621,
+    "GBP": 0.7563,
+    "JPY": 156.12,
+    "COP": 3812.45,
+    "MXN": 18.37,
+    "BRL": 5.34,
+}
+
+
+def build_payload(base: str) -> Dict[str, object]:
+    if base not in USD_RATES:
+        return {"result": "error", "error-type": "unsupported-code"}
+
+    now = datetime.now(timezone.utc)
+    last_update = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    next_update = last_update + timedelta(days=1)
+    base_rate = USD_RATES[base]
+    return {
+        "result": "success",
+        "provider": "stub",
+        "base_code": base,
+        "time_last_update_unix": int(last_update.timestamp()),
+        "time_last_update_utc": format_datetime(last_update),
+        "time_next_update_unix": int(next_update.timestamp()),
+        "time_next_update_utc": format_datetime(next_update),
+        "rates": {code: round(rate / base_rate, 6) for code, rate in USD_RATES.items()},
+    }
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802 - http.server API
+        base = self.path.rstrip("/").rsplit("/", 1)[-1].upper()
+        body = json.dumps(build_payload(base)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002 - keep test output quiet
+        pass
+
+
+def start_stub_provider(port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a daemon thread; returns the server and its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubProviderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v6/latest"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub exchange rate provider")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubProviderHandler)
+    print(f"Stub provider at http://127.0.0.1:{args.port}/v6/latest")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
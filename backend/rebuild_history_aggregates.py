@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Script para reconstruir los contadores por (día, par) del historial.
+Recorre todas las conversiones (partición legacy y shards, contando una
+sola vez las que están en ambas durante la migración), reescribe los items
+"stats#YYYY-MM-DD" con los totales absolutos y borra los de grupos que ya
+no tienen conversiones. Úsalo una vez al activar HISTORY_AGGREGATES o si
+los contadores se desvían.
+
+Uso:
+    python rebuild_history_aggregates.py --dry-run
+    python rebuild_history_aggregates.py
+"""
+
+import argparse
+import sys
+from decimal import Decimal
+
+# Agregar el directorio actual al path
+sys.path.append('.')
+
+from shared import storage
+
+PAGE_SIZE = 1000  # Conversiones agregadas por paso; el resto no se guarda en memoria
+
+
+def _partition_filter(prefix):
+    from boto3.dynamodb.conditions import Attr
+
+    return Attr(storage.PARTITION_KEY).begins_with(prefix)
+
+
+def _scan(table, prefix, **params):
+    scan_params = {"FilterExpression": _partition_filter(prefix), **params}
+    while True:
+        response = table.scan(**scan_params)
+        yield from response.get("Items", [])
+        if not response.get("LastEvaluatedKey"):
+            break
+        scan_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def iter_history_items(table):
+    """Scan de todas las conversiones, sin importar la partición."""
+    return _scan(table, "conversion#")
+
+
+def iter_unique_history_items(table):
+    """Cada conversión una sola vez: durante la migración a shards un registro
+    puede estar en su shard y en la partición legacy, y cuenta la del shard."""
+    sharded = set()
+    legacy_pending = {}
+    for item in iter_history_items(table):
+        sort_key = item[storage.SORT_KEY]
+        if item[storage.PARTITION_KEY] == storage.LEGACY_PARTITION:
+            if sort_key not in sharded:
+                legacy_pending[sort_key] = item
+            continue
+        sharded.add(sort_key)
+        legacy_pending.pop(sort_key, None)
+        yield item
+    yield from legacy_pending.values()
+
+
+def iter_aggregate_keys(table):
+    """Claves de los contadores "stats#" existentes."""
+    projection = {
+        "ProjectionExpression": "#pk, #sk",
+        "ExpressionAttributeNames": {"#pk": storage.PARTITION_KEY, "#sk": storage.SORT_KEY},
+    }
+    for item in _scan(table, storage.AGGREGATE_PARTITION_PREFIX, **projection):
+        yield {storage.PARTITION_KEY: item[storage.PARTITION_KEY], storage.SORT_KEY: item[storage.SORT_KEY]}
+
+
+def aggregate(items):
+    """Totales (count, amount, result) por (día, from, to), agregados por páginas."""
+    totals = {}
+    conversions = 0
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) >= PAGE_SIZE:
+            conversions += _add_page(totals, page)
+            page = []
+    conversions += _add_page(totals, page)
+    return (conversions, totals)
+
+
+def _add_page(totals, page):
+    for group, delta in storage._aggregate_deltas(added=page).items():
+        total = totals.setdefault(group, [Decimal(0), Decimal(0), Decimal(0)])
+        for index, value in enumerate(delta):
+            total[index] += value
+    return len(page)
+
+
+def rebuild(table, dry_run=False):
+    """Reescribe los contadores y borra los de grupos sin conversiones;
+    retorna (conversiones leídas, grupos escritos, grupos borrados)."""
+    conversions, totals = aggregate(iter_unique_history_items(table))
+    keys = {(key[storage.PARTITION_KEY], key[storage.SORT_KEY]): key
+            for key in (storage._aggregate_key(*group) for group in totals)}
+    stale = [key for key in iter_aggregate_keys(table)
+             if (key[storage.PARTITION_KEY], key[storage.SORT_KEY]) not in keys]
+
+    if not dry_run:
+        with table.batch_writer() as batch:
+            for (day, source, target), (count, amount, result) in totals.items():
+                batch.put_item(Item={
+                    **storage._aggregate_key(day, source, target),
+                    "from": source,
+                    "to": target,
+                    "count": count,
+                    "amount_sum": amount,
+                    "result_sum": result,
+                })
+            for key in stale:
+                batch.delete_item(Key=key)
+
+    return (conversions, len(totals), len(stale))
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Reconstruye los contadores agregados del historial")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta conversiones y grupos")
+    args = parser.parse_args()
+
+    table = storage._get_table()
+    if table is None:
+        print("❌ No se pudo obtener la tabla DynamoDB")
+        sys.exit(1)
+
+    print("🔄 Reconstruyendo contadores por día y par...")
+    conversions, groups, stale = rebuild(table, dry_run=args.dry_run)
+    action = "a escribir" if args.dry_run else "escritos"
+    removed = "a borrar" if args.dry_run else "borrados"
+    print(f"✅ {conversions} conversiones, {groups} contadores {action}, {stale} sin conversiones {removed}")
+    print("💡 Las conversiones escritas durante la reconstrucción pueden requerir una segunda pasada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Asyncio counterparts of the exchange and storage entry points.
+
+Each coroutine runs the existing synchronous call in a worker thread
+(``asyncio.to_thread``), so the in-memory/shared rate caches, single-flight,
+storage backoff and pooled HTTP/DynamoDB clients behave exactly as in the
+sync API. ``requests`` and boto3 release the GIL while waiting on the
+network, which lets independent calls gathered in one invocation overlap.
+
+The sharded history read fans out inside ``storage`` itself (the shards of
+each day and the legacy partition are queried on its worker pool, each
+thread through its own ``Table``), so the async wrapper is a plain
+``to_thread`` like the rest.
+
+Lambda still calls a plain function; ``async_handler`` adapts a coroutine
+handler and keeps one event loop per container across warm invocations.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from shared import exchange, storage
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def async_handler(
+    func: Callable[[Dict[str, Any], Any], Awaitable[Dict[str, Any]]],
+) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """Expose ``async def handler(event, context)`` as a synchronous Lambda handler."""
+
+    @functools.wraps(func)
+    def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        return _get_loop().run_until_complete(func(event, context))
+
+    return handler
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    # Reused across warm invocations so the default executor's threads are kept.
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+# Rates
+
+
+async def fetch_rates(base_currency: str) -> Dict[str, object]:
+    return await asyncio.to_thread(exchange.fetch_rates, base_currency)
+
+
+async def fetch_rates_many(bases: Iterable[str]) -> Dict[str, Dict[str, object]]:
+    """Fetch several bases concurrently; concurrent misses for one base share a request."""
+    normalized = list(dict.fromkeys(exchange.normalize_currency(base) for base in bases))
+    payloads = await asyncio.gather(*(fetch_rates(base) for base in normalized))
+    return dict(zip(normalized, payloads))
+
+
+async def get_rate(from_currency: str, to_currency: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(exchange.get_rate, from_currency, to_currency)
+
+
+async def rates_for_base(base_currency: str, symbols: Optional[List[str]] = None) -> Dict[str, Any]:
+    return await asyncio.to_thread(exchange.rates_for_base, base_currency, symbols)
+
+
+# History reads
+
+
+async def fetch_history(limit: int = 20) -> Tuple[List[Dict[str, Any]], bool]:
+    history, _, storage_active = await fetch_history_page(limit)
+    return (history, storage_active)
+
+
+async def fetch_history_page(
+    limit: int = 20,
+    start_key: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    pair: Optional[Tuple[str, str]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]], bool]:
+    return await asyncio.to_thread(storage.fetch_history_page, limit, start_key, fields, since, until, pair)
+
+
+# History writes
+
+
+async def store_conversion_record(record: Dict[str, Any], overwrite: bool = False) -> bool:
+    return await asyncio.to_thread(storage.store_conversion_record, record, overwrite)
+
+
+async def store_conversion_records(records: List[Dict[str, Any]]) -> int:
+    return await asyncio.to_thread(storage.store_conversion_records, records)
+
+
+async def update_conversion_record(conversion_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(storage.update_conversion_record, conversion_id, updates)
+
+
+async def delete_conversion_record(conversion_id: str) -> bool:
+    return await asyncio.to_thread(storage.delete_conversion_record, conversion_id)
@@ -2,16 +2,41 @@
 
 from __future__ import annotations
 
+import logging
 import os
-from typing import Dict, Optional
+import threading
+import time
+import uuid
+from datetime import date, datetime, timezone
+from decimal import ROUND_HALF_EVEN, Context, Decimal
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
-import requests
+if TYPE_CHECKING:  # pragma: no cover - requests is imported on first upstream call
+    import requests
+
+logger = logging.getLogger(__name__)
 
 
 class ExchangeRateProviderError(RuntimeError):
     """Raised when the upstream exchange rate provider reports an error."""
 
 
+class ExchangeRateTimeoutError(ExchangeRateProviderError):
+    """Raised when the provider does not answer within the timeout budget."""
+
+
+class ExchangeRateConnectionError(ExchangeRateProviderError):
+    """Raised when the provider cannot be reached."""
+
+
+class ExchangeRateHTTPError(ExchangeRateProviderError):
+    """Raised when the provider answers with an HTTP error status."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 def _get_timeout() -> float:
     try:
         return float(os.environ.get("EXCHANGE_API_TIMEOUT", "5"))
@@ -19,8 +44,93 @@ def _get_timeout() -> float:
         return 5.0
 
 
+def _get_cache_ttl() -> float:
+    try:
+        return max(0.0, float(os.environ.get("EXCHANGE_CACHE_TTL", "3600")))
+    except (TypeError, ValueError):
+        return 3600.0
+
+
+def _get_seconds(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.environ.get(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _get_retries() -> int:
+    try:
+        return max(0, int(os.environ.get("EXCHANGE_API_RETRIES", "2")))
+    except (TypeError, ValueError):
+        return 2
+
+
 API_BASE_URL = os.environ.get("EXCHANGE_API_BASE", "https://open.er-api.com/v6/latest")
 DEFAULT_TIMEOUT = _get_timeout()
+CACHE_TTL = _get_cache_ttl()
+MAX_RETRIES = _get_retries()
+RETRY_BACKOFF = 0.1
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 4
+# Stale-while-revalidate: expired rates may still be served for up to
+# MAX_STALENESS seconds past expiry while a single refresh is attempted at
+# most once every STALE_RETRY_INTERVAL seconds.
+MAX_STALENESS = _get_seconds("EXCHANGE_MAX_STALENESS", 6 * 3600)
+STALE_RETRY_INTERVAL = _get_seconds("EXCHANGE_STALE_RETRY_INTERVAL", 30)
+# Shortest lifetime of a fresh fetch, even when next_update has passed.
+MIN_CACHE_TTL = _get_seconds("EXCHANGE_MIN_CACHE_TTL", 60)
+# Second cache tier shared by every container through DynamoDB (rates#<BASE>).
+# Only the container holding the refresh lease calls the provider; the rest
+# wait up to SHARED_WAIT seconds for it to publish.
+SHARED_CACHE_ENABLED = os.environ.get("EXCHANGE_SHARED_CACHE", "true").strip().lower() in ("1", "true", "yes")
+SHARED_LEASE_SECONDS = _get_seconds("EXCHANGE_SHARED_LEASE", 10)
+SHARED_WAIT = _get_seconds("EXCHANGE_SHARED_WAIT", 1.0)
+SHARED_POLL_INTERVAL = 0.2
+# EXCHANGE_PREFETCH: a scheduled job (prefetch_rates) refreshes the shared
+# tier every PREFETCH_INTERVAL seconds, ahead of expiry. User requests then
+# serve a recently expired shared copy as stale instead of calling the
+# provider, and only go upstream if the job seems to have stopped.
+PREFETCH_ENABLED = os.environ.get("EXCHANGE_PREFETCH", "false").strip().lower() in ("1", "true", "yes")
+PREFETCH_INTERVAL = _get_seconds("EXCHANGE_PREFETCH_INTERVAL", 300)
+_LEASE_OWNER = uuid.uuid4().hex
+# Daily pivot snapshots (rates#history#<PIVOT>) written on each upstream fetch.
+SNAPSHOTS_ENABLED = os.environ.get("EXCHANGE_RATE_SNAPSHOTS", "true").strip().lower() in ("1", "true", "yes")
+PIVOT_CURRENCY = os.environ.get("EXCHANGE_PIVOT_CURRENCY", "USD").strip().upper() or "USD"
+
+# Significant digits kept for rates derived through the pivot currency.
+RATE_PRECISION = 12
+RATE_CONTEXT = Context(prec=RATE_PRECISION, rounding=ROUND_HALF_EVEN)
+
+# Per-container cache that survives warm Lambda invocations. Entries are
+# kept after they expire so they can be served stale.
+# base -> (expires_at epoch, fetched_at epoch, payload)
+_rates_cache: Dict[str, Tuple[float, float, Dict[str, Any]]] = {}
+# base -> epoch until which a refresh is in flight or recently failed
+_refresh_claims: Dict[str, float] = {}
+# base -> provider day already snapshotted by this container
+_snapshot_days: Dict[str, str] = {}
+_cache_lock = threading.Lock()
+
+
+class _Flight:
+    """One in-flight load; concurrent callers for the same key wait on ``done``."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+# base -> load in progress, shared by every concurrent caller (single-flight)
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+# Shared HTTP session, created on first upstream request and kept alive
+# across warm invocations so cache misses reuse the provider connection.
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
 
 
 def normalize_currency(code: Optional[str]) -> str:
@@ -34,13 +144,294 @@ def normalize_currency(code: Optional[str]) -> str:
     return normalized
 
 
+def clear_rates_cache() -> None:
+    with _cache_lock:
+        _rates_cache.clear()
+        _refresh_claims.clear()
+        _snapshot_days.clear()
+
+
+def transport_stats() -> Dict[str, int]:
+    """Connection pool counters for the shared provider session."""
+    opened = sent = 0
+    session = _session
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    sent += pool.num_requests
+    return {
+        "requests": sent,
+        "connections_opened": opened,
+        "connections_reused": max(0, sent - opened),
+    }
+
+
+def _get_session() -> "requests.Session":
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _build_session() -> "requests.Session":
+    # Imported here so warm cache hits never pay for requests/urllib3.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _attempt_timeout() -> float:
+    """Split EXCHANGE_API_TIMEOUT across every attempt and its backoff sleeps."""
+    attempts = MAX_RETRIES + 1
+    # urllib3 does not sleep before the first retry, then doubles the backoff.
+    backoff_total = sum(RETRY_BACKOFF * (2 ** (n - 1)) for n in range(2, attempts))
+    return max(0.5, (DEFAULT_TIMEOUT - backoff_total) / attempts)
+
+
 def fetch_rates(base_currency: str) -> Dict[str, object]:
     base = normalize_currency(base_currency)
+    now = time.time()
+
+    with _cache_lock:
+        cached = _rates_cache.get(base)
+        servable_stale = _is_servable(cached, now)
+        if cached is not None and cached[0] > now:
+            return _with_cache_info(cached, tier="memory")
+        if servable_stale:
+            if _refresh_claims.get(base, 0) > now:
+                # Another request is refreshing (or just failed to): don't wait.
+                return _with_cache_info(cached, tier="memory", stale=True)
+            _refresh_claims[base] = now + STALE_RETRY_INTERVAL
+
+    def load() -> Tuple[Tuple[float, float, Dict[str, Any]], str]:
+        # Cached before the flight is released, so a caller arriving right
+        # after it finds the entry in memory instead of starting a new load.
+        loaded = _load_rates(base, now)
+        _remember_rates(base, loaded[0], now)
+        return loaded
+
+    try:
+        entry, tier = _single_flight(base, load)
+    except ExchangeRateProviderError as exc:
+        if not servable_stale:
+            raise
+        logger.warning("Serving stale %s rates after provider failure: %s", base, exc)
+        return _with_cache_info(cached, tier="memory", stale=True)
+
+    return _with_cache_info(entry, tier=tier, stale=entry[0] <= now)
+
+
+def _remember_rates(base: str, entry: Tuple[float, float, Dict[str, Any]], now: float) -> None:
+    with _cache_lock:
+        current = _rates_cache.get(base)
+        if current is None or current[1] <= entry[1]:
+            _rates_cache[base] = entry
+        if entry[0] > now:
+            _refresh_claims.pop(base, None)
+
+
+def _single_flight(key: str, load: Callable[[], Any]) -> Any:
+    """Run ``load`` once for every concurrent caller with the same ``key``.
+
+    The first caller runs it; the rest block until it finishes and get the
+    same result, or the same exception re-raised.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = load()
+    except BaseException as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+    return flight.result
+
+
+def _is_servable(entry: Optional[Tuple[float, float, Dict[str, Any]]], now: float) -> bool:
+    return entry is not None and now - entry[0] <= MAX_STALENESS
+
+
+def _load_rates(base: str, now: float) -> Tuple[Tuple[float, float, Dict[str, Any]], str]:
+    """Resolve rates on a memory miss: shared tier first, then the provider."""
+    shared = _read_shared_rates(base)
+    if shared is not None and shared[0] > now:
+        return (shared, "shared")
+
+    if _prefetch_covers(shared, now):
+        return (shared, "shared")
+
+    if SHARED_CACHE_ENABLED:
+        from shared import storage
+
+        if not storage.acquire_rates_refresh_lease(base, _LEASE_OWNER, SHARED_LEASE_SECONDS):
+            fresh = _wait_for_shared_rates(base, now)
+            if fresh is not None:
+                return (fresh, "shared")
+            if _is_servable(shared, now):
+                return (shared, "shared")
+
+    try:
+        entry = _fetch_upstream(base, now)
+    except ExchangeRateProviderError:
+        if _is_servable(shared, now):
+            return (shared, "shared")
+        raise
+
+    return (entry, "upstream")
+
+
+def _prefetch_covers(shared: Optional[Tuple[float, float, Dict[str, Any]]], now: float) -> bool:
+    # Expired less than two prefetch runs ago: the next run will replace it.
+    return (
+        PREFETCH_ENABLED
+        and _is_servable(shared, now)
+        and now - shared[0] <= 2 * PREFETCH_INTERVAL
+    )
+
+
+def _fetch_upstream(base: str, now: float) -> Tuple[float, float, Dict[str, Any]]:
+    payload, next_update_at = _request_rates(base)
+    entry = (_cache_expiry(now, next_update_at), now, payload)
+    _write_shared_rates(base, entry)
+    _record_snapshot(base, payload, now)
+    return entry
+
+
+def refresh_rates(
+    base_currency: str, only_if_expired: bool = False, refresh_ahead: float = 0
+) -> Optional[Dict[str, Any]]:
+    """Fetch ``base_currency`` from the provider and publish it to every cache tier.
+
+    With ``only_if_expired`` the provider is skipped (and ``None`` returned)
+    while the shared copy stays fresh for more than ``refresh_ahead`` seconds.
+    """
+    base = normalize_currency(base_currency)
+    now = time.time()
+
+    if only_if_expired:
+        shared = _read_shared_rates(base)
+        if shared is not None and shared[0] > now + refresh_ahead:
+            return None
+
+    entry = _fetch_upstream(base, now)
+    with _cache_lock:
+        _rates_cache[base] = entry
+        _refresh_claims.pop(base, None)
+    return _with_cache_info(entry, tier="upstream")
+
+
+def _read_shared_rates(base: str) -> Optional[Tuple[float, float, Dict[str, Any]]]:
+    if not SHARED_CACHE_ENABLED:
+        return None
+    from shared import storage
+
+    shared = storage.get_shared_rates(base)
+    if shared is None:
+        return None
+    return (shared["expires_at"], shared["fetched_at"], shared["payload"])
+
+
+def _wait_for_shared_rates(base: str, now: float) -> Optional[Tuple[float, float, Dict[str, Any]]]:
+    deadline = time.monotonic() + SHARED_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(SHARED_POLL_INTERVAL)
+        shared = _read_shared_rates(base)
+        if shared is not None and shared[0] > now:
+            return shared
+    return None
+
+
+def _write_shared_rates(base: str, entry: Tuple[float, float, Dict[str, Any]]) -> None:
+    if not SHARED_CACHE_ENABLED:
+        return
+    from shared import storage
+
+    expires_at, fetched_at, payload = entry
+    storage.put_shared_rates(base, payload, expires_at, fetched_at, keep_until=expires_at + MAX_STALENESS)
+
+
+def _record_snapshot(base: str, payload: Dict[str, Any], now: float) -> None:
+    # Every other base is derived from the pivot, so only its table is kept.
+    if not SNAPSHOTS_ENABLED or base != PIVOT_CURRENCY:
+        return
+    day = _snapshot_day(payload, now)
+    with _cache_lock:
+        if _snapshot_days.get(base) == day:
+            return
+    from shared import storage
+
+    if storage.put_rates_snapshot(base, day, payload["rates"], payload.get("last_updated")):
+        with _cache_lock:
+            _snapshot_days[base] = day
+
+
+def _snapshot_day(payload: Dict[str, Any], now: float) -> str:
+    """Day the provider published the rates for, falling back to today (UTC)."""
+    raw = payload.get("last_updated")
+    if isinstance(raw, str):
+        from email.utils import parsedate_to_datetime
+
+        try:
+            return parsedate_to_datetime(raw).astimezone(timezone.utc).date().isoformat()
+        except (TypeError, ValueError):
+            pass
+    return datetime.fromtimestamp(now, timezone.utc).date().isoformat()
+
+
+def _request_rates(base: str) -> Tuple[Dict[str, Any], Optional[float]]:
     url = f"{API_BASE_URL}/{base}"
 
-    response = requests.get(url, timeout=DEFAULT_TIMEOUT)
-    response.raise_for_status()
-    payload = response.json()
+    session = _get_session()
+    import requests
+
+    try:
+        response = session.get(url, timeout=_attempt_timeout())
+        logger.debug("Exchange provider transport: %s", transport_stats())
+        response.raise_for_status()
+    except requests.Timeout as exc:
+        raise ExchangeRateTimeoutError("Exchange rate service timed out") from exc
+    except requests.HTTPError as exc:
+        raise ExchangeRateHTTPError(exc.response.status_code, str(exc)) from exc
+    except requests.RequestException as exc:
+        raise ExchangeRateConnectionError("Unable to contact exchange rate service") from exc
+
+    try:
+        payload = response.json()
+    except ValueError as exc:
+        raise ExchangeRateProviderError("Invalid response from exchange rate provider") from exc
 
     if payload.get("result") == "error":
         error_type = payload.get("error-type", "exchange_rate_error")
@@ -52,13 +443,189 @@ def fetch_rates(base_currency: str) -> Dict[str, object]:
     if not isinstance(rates, dict):
         raise ExchangeRateProviderError("Invalid response from exchange rate provider")
 
+    return (
+        {
+            "base": base,
+            "rates": rates,
+            "last_updated": payload.get("time_last_update_utc") or payload.get("time_last_update"),
+            "next_update": payload.get("time_next_update_utc") or payload.get("time_next_update"),
+            "additional_info": {
+                "documentation": payload.get("documentation"),
+                "terms_of_use": payload.get("terms_of_use"),
+            },
+        },
+        _parse_next_update(payload),
+    )
+
+
+def _parse_next_update(payload: Dict[str, Any]) -> Optional[float]:
+    unix_value = payload.get("time_next_update_unix")
+    if isinstance(unix_value, (int, float)):
+        return float(unix_value)
+
+    raw = payload.get("time_next_update_utc") or payload.get("time_next_update")
+    if not isinstance(raw, str):
+        return None
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return parsedate_to_datetime(raw).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_expiry(now: float, next_update_at: Optional[float]) -> float:
+    expires_at = now + CACHE_TTL
+    if next_update_at is not None:
+        expires_at = min(expires_at, next_update_at)
+    # A provider that publishes late reports a next update already in the
+    # past; keep the fresh copy briefly instead of refetching on every call.
+    return max(expires_at, now + min(CACHE_TTL, MIN_CACHE_TTL))
+
+
+def _with_cache_info(
+    entry: Tuple[float, float, Dict[str, Any]],
+    tier: str,
+    stale: bool = False,
+) -> Dict[str, Any]:
+    expires_at, fetched_at, payload = entry
+    now = time.time()
+    result = dict(payload)
+    result["stale"] = stale
+    result["cache"] = {
+        "hit": tier != "upstream",
+        "tier": tier,
+        "stale": stale,
+        "age_seconds": max(0, int(now - fetched_at)),
+        "expires_in": max(0, int(expires_at - now)),
+    }
+    return result
+
+
+def get_rate(from_currency: str, to_currency: str) -> Dict[str, Any]:
+    """Quote ``from_currency`` -> ``to_currency`` using the pivot rates only.
+
+    Pairs that start at the pivot are ``direct``; any other pair is
+    ``derived`` as ``rates[to] / rates[from]``.
+    """
+    source_code = normalize_currency(from_currency)
+    target_code = normalize_currency(to_currency)
+
+    pivot_payload = fetch_rates(PIVOT_CURRENCY)
+    rates = pivot_payload["rates"]
+
+    from_rate = _rate_for(rates, source_code)
+    to_rate = _rate_for(rates, target_code)
+
+    if source_code == target_code:
+        rate, source = Decimal(1), "direct"
+    elif source_code == PIVOT_CURRENCY:
+        rate, source = to_rate, "direct"
+    else:
+        rate, source = RATE_CONTEXT.divide(to_rate, from_rate), "derived"
+
+    return {
+        "from": source_code,
+        "to": target_code,
+        "rate": rate,
+        "source": source,
+        "pivot": PIVOT_CURRENCY,
+        "last_updated": pivot_payload.get("last_updated"),
+        "next_update": pivot_payload.get("next_update"),
+        "cache": pivot_payload.get("cache"),
+    }
+
+
+def rates_for_base(base_currency: str, symbols: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Return the rate table for ``base_currency`` derived from the pivot.
+
+    With ``symbols`` only those currencies are returned (and derived), in the
+    order given; an unknown code raises ``ValueError``.
+    """
+    base = normalize_currency(base_currency)
+    pivot_payload = fetch_rates(PIVOT_CURRENCY)
+    rates = pivot_payload["rates"]
+
+    wanted = None
+    if symbols:
+        wanted = list(dict.fromkeys(normalize_currency(code) for code in symbols))
+        for code in wanted:
+            if code not in rates:
+                raise ValueError(f"Currency '{code}' is not supported")
+
+    if base == PIVOT_CURRENCY:
+        if wanted:
+            rates = {code: rates[code] for code in wanted}
+        return dict(pivot_payload, rates=rates, source="direct")
+
+    base_rate = _rate_for(rates, base)
+    derived = {
+        code: 1.0 if code == base else float(RATE_CONTEXT.divide(Decimal(str(rates[code])), base_rate))
+        for code in (wanted or rates)
+    }
+    if not wanted:
+        derived[base] = 1.0
+
+    return dict(pivot_payload, base=base, rates=derived, source="derived")
+
+
+def rates_history(
+    base_currency: str,
+    start_day: date,
+    end_day: date,
+    symbols: Optional[List[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Daily rates for ``base_currency`` between two days, read from the pivot snapshots.
+
+    Returns ``None`` when the snapshot store is unavailable. Days whose
+    snapshot lacks ``base_currency`` are left out.
+    """
+    base = normalize_currency(base_currency)
+    if start_day > end_day:
+        raise ValueError("'from' must not be after 'to'")
+    wanted = sorted({normalize_currency(code) for code in symbols}) if symbols else None
+
+    from shared import storage
+
+    snapshots = storage.query_rates_snapshots(
+        PIVOT_CURRENCY,
+        start_day.isoformat(),
+        end_day.isoformat(),
+        sorted(set(wanted) | {base}) if wanted else None,
+    )
+    if snapshots is None:
+        return None
+
+    series: Dict[str, Dict[str, float]] = {}
+    for snapshot in snapshots:
+        rates = snapshot["rates"]
+        if base != PIVOT_CURRENCY:
+            base_rate = rates.get(base)
+            if not base_rate or base_rate <= 0:
+                continue
+            divisor = Decimal(repr(base_rate))
+            rates = {
+                code: float(RATE_CONTEXT.divide(Decimal(repr(value)), divisor))
+                for code, value in rates.items()
+            }
+            rates[base] = 1.0
+        if wanted:
+            rates = {code: rates[code] for code in wanted if code in rates}
+        series[snapshot["date"]] = rates
+
     return {
         "base": base,
-        "rates": rates,
-        "last_updated": payload.get("time_last_update_utc") or payload.get("time_last_update"),
-        "next_update": payload.get("time_next_update_utc") or payload.get("time_next_update"),
-        "additional_info": {
-            "documentation": payload.get("documentation"),
-            "terms_of_use": payload.get("terms_of_use"),
-        },
+        "pivot": PIVOT_CURRENCY,
+        "source": "direct" if base == PIVOT_CURRENCY else "derived",
+        "rates": series,
     }
+
+
+def _rate_for(rates: Dict[str, Any], code: str) -> Decimal:
+    value = rates.get(code)
+    if value is None:
+        raise ValueError(f"Currency '{code}' is not supported")
+    rate = Decimal(str(value))
+    if rate <= 0:
+        raise ExchangeRateProviderError(f"Invalid rate for currency '{code}'")
+    return rate
@@ -0,0 +1,74 @@
+"""Money amounts with per-currency precision.
+
+Amounts and rates stay ``Decimal`` end to end: CPython's ``decimal`` is
+the C libmpdec implementation, and a scaled-integer type written in Python
+measured slower per conversion (see ``benchmarks/bench_money.py``). What
+this module removes is the per-call overhead around it: numbers are
+parsed without a ``str()`` round trip where the type allows it, and results
+are rounded with a cached quantum per ISO 4217 minor unit (JPY has none,
+KWD has three) instead of a fixed two decimals.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict
+
+# ISO 4217 minor units that differ from the default of 2.
+MINOR_UNITS: Dict[str, int] = {
+    **dict.fromkeys(
+        ("BIF", "CLP", "DJF", "GNF", "ISK", "JPY", "KMF", "KRW", "PYG",
+         "RWF", "UGX", "VND", "VUV", "XAF", "XOF", "XPF"),
+        0,
+    ),
+    **dict.fromkeys(("BHD", "IQD", "JOD", "KWD", "LYD", "OMR", "TND"), 3),
+}
+DEFAULT_MINOR_UNITS = 2
+
+_QUANTA: Dict[int, Decimal] = {
+    digits: Decimal(1).scaleb(-digits) for digits in {DEFAULT_MINOR_UNITS, *MINOR_UNITS.values()}
+}
+
+
+def minor_units(currency: str) -> int:
+    return MINOR_UNITS.get(currency, DEFAULT_MINOR_UNITS)
+
+
+def quantum(currency: str) -> Decimal:
+    """Smallest amount of ``currency``: ``Decimal("0.01")`` for USD, ``Decimal("1")`` for JPY."""
+    return _QUANTA[minor_units(currency)]
+
+
+def to_decimal(value: Any) -> Decimal:
+    """Exact ``Decimal`` for an int, float, str or Decimal; ValueError if not a finite number."""
+    value_type = type(value)
+    try:
+        if value_type is Decimal:
+            number = value
+        elif value_type is int or value_type is str:
+            number = Decimal(value)
+        elif value_type is float:
+            # repr gives the shortest round-tripping digits, not the binary expansion
+            number = Decimal(repr(value))
+        elif isinstance(value, (int, float, str, Decimal)) and not isinstance(value, bool):
+            number = Decimal(str(value))
+        else:
+            raise ValueError(f"Invalid number {value!r}")
+    except InvalidOperation:
+        raise ValueError(f"Invalid number {value!r}") from None
+    if not number.is_finite():
+        raise ValueError(f"Invalid number {value!r}")
+    return number
+
+
+def round_money(amount: Decimal, currency: str) -> Decimal:
+    """Round ``amount`` to the minor unit of ``currency`` (ROUND_HALF_UP)."""
+    try:
+        return amount.quantize(_QUANTA[minor_units(currency)], rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError("Amount is out of range") from None
+
+
+def convert(amount: Decimal, rate: Decimal, currency: str) -> Decimal:
+    """``amount`` * ``rate`` rounded to the minor unit of the target ``currency``."""
+    return round_money(amount * rate, currency)
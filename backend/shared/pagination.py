@@ -0,0 +1,79 @@
+"""Opaque, signed pagination cursors for DynamoDB query results."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor is malformed or its signature does not match."""
+
+
+DEV_CURSOR_SECRET = "local-dev-cursor-secret"
+
+
+def _load_cursor_secret() -> bytes:
+    """HMAC key for cursors; the public development key only works locally.
+
+    A deployed function (``AWS_LAMBDA_FUNCTION_NAME`` set, not under
+    serverless-offline / SAM local) refuses to start without its own
+    ``HISTORY_CURSOR_SECRET``: with the well-known key anyone could forge
+    cursors.
+    """
+    secret = os.environ.get("HISTORY_CURSOR_SECRET", "").strip()
+    if secret and secret != DEV_CURSOR_SECRET:
+        return secret.encode("utf-8")
+    deployed = bool(os.environ.get("AWS_LAMBDA_FUNCTION_NAME"))
+    local = bool(os.environ.get("IS_OFFLINE") or os.environ.get("AWS_SAM_LOCAL"))
+    if deployed and not local:
+        raise RuntimeError("HISTORY_CURSOR_SECRET must be set to a private value outside local development")
+    return DEV_CURSOR_SECRET.encode("utf-8")
+
+
+CURSOR_SECRET = _load_cursor_secret()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET, data, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not last_key:
+        return None
+    data = json.dumps(last_key, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return f"{_b64encode(data)}.{_b64encode(_sign(data))}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not cursor:
+        return None
+    try:
+        data_part, signature_part = str(cursor).split(".", 1)
+        data = _b64decode(data_part)
+        signature = _b64decode(signature_part)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursorError("Invalid cursor") from exc
+
+    if not hmac.compare_digest(signature, _sign(data)):
+        raise InvalidCursorError("Invalid cursor")
+
+    try:
+        last_key = json.loads(data)
+    except ValueError as exc:
+        raise InvalidCursorError("Invalid cursor") from exc
+    if not isinstance(last_key, dict):
+        raise InvalidCursorError("Invalid cursor")
+    return last_key
@@ -0,0 +1,125 @@
+"""API Gateway response builders shared by every handler.
+
+The JSON encoder is pluggable: ``orjson`` is used when it is installed and
+the standard library otherwise (``RESPONSE_ENCODER`` forces either one).
+Both encoders serialize ``Decimal`` values directly, so items read from
+DynamoDB do not need a separate float conversion pass.
+
+Handlers that can version their content cheaply emit an ``ETag`` through
+``cache_headers`` and answer a matching ``If-None-Match`` with
+``not_modified_response`` (304, no body).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None  # type: ignore[assignment]
+
+
+HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Content-Type": "application/json",
+}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(payload: Any) -> str:
+    return json.dumps(payload, default=_default)
+
+
+def _orjson_dumps(payload: Any) -> str:
+    return orjson.dumps(payload, default=_default).decode("utf-8")
+
+
+ENCODERS: Dict[str, Callable[[Any], str]] = {"json": _stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = _orjson_dumps
+
+
+def _select_encoder() -> Callable[[Any], str]:
+    requested = os.environ.get("RESPONSE_ENCODER", "").strip().lower()
+    if requested in ENCODERS:
+        return ENCODERS[requested]
+    return ENCODERS.get("orjson", _stdlib_dumps)
+
+
+dumps = _select_encoder()
+
+
+def success_response(
+    payload: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    return {
+        "statusCode": status_code,
+        "headers": {**HEADERS, **(headers or {})},
+        "body": dumps(payload),
+    }
+
+
+def request_header(event: Optional[Dict[str, Any]], name: str) -> Optional[str]:
+    """Case-insensitive lookup of a request header in an API Gateway event."""
+    headers = (event or {}).get("headers") or {}
+    wanted = name.lower()
+    for key, value in headers.items():
+        if key.lower() == wanted:
+            return value
+    return None
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(event: Optional[Dict[str, Any]], etag: Optional[str]) -> bool:
+    """True when ``If-None-Match`` names ``etag`` (weak comparison, RFC 7232)."""
+    raw = request_header(event, "If-None-Match")
+    if not raw or not etag:
+        return False
+    if raw.strip() == "*":
+        return True
+    expected = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == expected for tag in raw.split(","))
+
+
+def cache_headers(etag: str, max_age: float = 0) -> Dict[str, str]:
+    """``ETag`` plus ``Cache-Control``; without ``max_age`` clients must revalidate."""
+    max_age = int(max_age)
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "no-cache",
+        "Access-Control-Expose-Headers": "ETag",
+    }
+
+
+def not_modified_response(headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        "statusCode": 304,
+        "headers": {"Access-Control-Allow-Origin": "*", **(headers or {})},
+        "body": "",
+    }
+
+
+def error_response(status_code: int, message: str, error_detail: Any = None) -> Dict[str, Any]:
+    body = {"success": False, "message": message}
+    if error_detail is not None:
+        body["error"] = error_detail
+    return {
+        "statusCode": status_code,
+        "headers": HEADERS,
+        "body": dumps(body),
+    }
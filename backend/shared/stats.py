@@ -0,0 +1,221 @@
+"""Agregados del historial de conversiones por par y por día.
+
+Cada página del historial se recorre una vez en Python para armar la clave
+de grupo y las columnas (``array``); la acumulación por grupo sobre esas
+columnas es vectorizada con NumPy si está disponible y un bucle sobre los
+``array`` si no. Solo se conservan los acumuladores por grupo, así que la
+memoria depende del número de grupos (días x pares), no del número de
+registros.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# numpy se importa en el primer uso: es opcional y su import pesa en cold start.
+np = None
+
+
+def _load_numpy() -> bool:
+    global np
+    if np is not None:
+        return True
+    try:
+        import numpy
+    except ImportError:
+        return False
+    np = numpy
+    return True
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class HistoryAggregator:
+    """Acumula count, suma de amount/result y rate promedio/mín/máx por (día, from, to)."""
+
+    def __init__(self, engine: Optional[str] = None):
+        if engine is None:
+            engine = "numpy" if _load_numpy() else "array"
+        elif engine == "numpy" and not _load_numpy():
+            raise ValueError("numpy is not installed")
+        self.engine = engine
+        self.records = 0
+        self._groups: Dict[Tuple[str, str, str], int] = {}
+
+        if engine == "numpy":
+            self._columns = {
+                "count": np.zeros(0, dtype=np.int64),
+                "amount": np.zeros(0),
+                "result": np.zeros(0),
+                "rate_count": np.zeros(0, dtype=np.int64),
+                "rate_sum": np.zeros(0),
+                "rate_min": np.zeros(0),
+                "rate_max": np.zeros(0),
+            }
+        else:
+            self._columns = {
+                "count": array("q"),
+                "amount": array("d"),
+                "result": array("d"),
+                "rate_count": array("q"),
+                "rate_sum": array("d"),
+                "rate_min": array("d"),
+                "rate_max": array("d"),
+            }
+
+    def add(self, items: Iterable[Dict[str, Any]]) -> None:
+        """Agrega una página de items del historial."""
+        group_ids, amounts, results, rates = array("q"), array("d"), array("d"), array("d")
+        groups = self._groups
+        for item in items:
+            key = (str(item.get("timestamp") or "")[:10], item.get("from") or "", item.get("to") or "")
+            group_id = groups.get(key)
+            if group_id is None:
+                group_id = groups[key] = len(groups)
+            group_ids.append(group_id)
+            amounts.append(_to_float(item.get("amount")))
+            results.append(_to_float(item.get("result")))
+            rates.append(_to_float(item.get("rate")))
+
+        if not group_ids:
+            return
+        self.records += len(group_ids)
+        if self.engine == "numpy":
+            self._add_numpy(group_ids, amounts, results, rates)
+        else:
+            self._add_array(group_ids, amounts, results, rates)
+
+    def _add_numpy(self, group_ids: array, amounts: array, results: array, rates: array) -> None:
+        size = len(self._groups)
+        columns = self._columns
+        grow = size - len(columns["count"])
+        if grow:
+            for name, column in columns.items():
+                fill = math.inf if name == "rate_min" else -math.inf if name == "rate_max" else 0
+                columns[name] = np.concatenate([column, np.full(grow, fill, dtype=column.dtype)])
+
+        ids = np.frombuffer(group_ids, dtype=np.int64)
+        amount = np.nan_to_num(np.frombuffer(amounts))
+        result = np.nan_to_num(np.frombuffer(results))
+        rate = np.frombuffer(rates)
+
+        columns["count"] += np.bincount(ids, minlength=size)
+        columns["amount"] += np.bincount(ids, weights=amount, minlength=size)
+        columns["result"] += np.bincount(ids, weights=result, minlength=size)
+
+        has_rate = ~np.isnan(rate)
+        rate_ids, rate = ids[has_rate], rate[has_rate]
+        columns["rate_count"] += np.bincount(rate_ids, minlength=size)
+        columns["rate_sum"] += np.bincount(rate_ids, weights=rate, minlength=size)
+        np.minimum.at(columns["rate_min"], rate_ids, rate)
+        np.maximum.at(columns["rate_max"], rate_ids, rate)
+
+    def _add_array(self, group_ids: array, amounts: array, results: array, rates: array) -> None:
+        columns = self._columns
+        grow = len(self._groups) - len(columns["count"])
+        if grow:
+            for name, column in columns.items():
+                fill = math.inf if name == "rate_min" else -math.inf if name == "rate_max" else 0
+                column.extend([fill] * grow)
+
+        count, amount_sum, result_sum = columns["count"], columns["amount"], columns["result"]
+        rate_count, rate_sum = columns["rate_count"], columns["rate_sum"]
+        rate_min, rate_max = columns["rate_min"], columns["rate_max"]
+        for group_id, amount, result, rate in zip(group_ids, amounts, results, rates):
+            count[group_id] += 1
+            if amount == amount:  # descarta NaN
+                amount_sum[group_id] += amount
+            if result == result:
+                result_sum[group_id] += result
+            if rate == rate:
+                rate_count[group_id] += 1
+                rate_sum[group_id] += rate
+                if rate < rate_min[group_id]:
+                    rate_min[group_id] = rate
+                if rate > rate_max[group_id]:
+                    rate_max[group_id] = rate
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen compacto: totales por par y agregados por (día, par)."""
+        columns = {name: column.tolist() for name, column in self._columns.items()}
+        daily: List[Dict[str, Any]] = []
+        pairs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+        for (day, source, target), index in sorted(self._groups.items()):
+            row = {name: columns[name][index] for name in columns}
+            daily.append({"date": day, "from": source, "to": target, **_format_row(row)})
+
+            pair = pairs.setdefault((source, target), {
+                "count": 0, "amount": 0.0, "result": 0.0,
+                "rate_count": 0, "rate_sum": 0.0, "rate_min": math.inf, "rate_max": -math.inf,
+            })
+            for name in ("count", "amount", "result", "rate_count", "rate_sum"):
+                pair[name] += row[name]
+            pair["rate_min"] = min(pair["rate_min"], row["rate_min"])
+            pair["rate_max"] = max(pair["rate_max"], row["rate_max"])
+
+        return {
+            "records": self.records,
+            "pairs": [
+                {"from": source, "to": target, **_format_row(row)}
+                for (source, target), row in sorted(pairs.items(), key=lambda entry: -entry[1]["amount"])
+            ],
+            "daily": daily,
+        }
+
+
+def _format_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    has_rate = row["rate_count"] > 0
+    return {
+        "count": int(row["count"]),
+        "volume": round(row["amount"], 6),
+        "result_total": round(row["result"], 6),
+        "avg_rate": row["rate_sum"] / row["rate_count"] if has_rate else None,
+        "min_rate": row["rate_min"] if has_rate else None,
+        "max_rate": row["rate_max"] if has_rate else None,
+    }
+
+
+def summarize_counters(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resumen a partir de los contadores por (día, par) que mantiene storage.
+
+    Los contadores no guardan la tasa de cada conversión: en lugar de
+    promedio/mín/máx se reporta la tasa efectiva ``result_total / volume``.
+    """
+    daily: List[Dict[str, Any]] = []
+    pairs: Dict[Tuple[str, str], List[float]] = {}
+    for row in sorted(rows, key=lambda row: (row["date"], row["from"], row["to"])):
+        count, amount, result = int(row["count"]), float(row["amount"]), float(row["result"])
+        if count <= 0:
+            continue
+        daily.append({"date": row["date"], "from": row["from"], "to": row["to"],
+                      **_format_counters(count, amount, result)})
+        pair = pairs.setdefault((row["from"], row["to"]), [0, 0.0, 0.0])
+        pair[0] += count
+        pair[1] += amount
+        pair[2] += result
+
+    return {
+        "records": sum(pair[0] for pair in pairs.values()),
+        "pairs": [
+            {"from": source, "to": target, **_format_counters(*totals)}
+            for (source, target), totals in sorted(pairs.items(), key=lambda entry: -entry[1][1])
+        ],
+        "daily": daily,
+    }
+
+
+def _format_counters(count: int, amount: float, result: float) -> Dict[str, Any]:
+    return {
+        "count": count,
+        "volume": round(amount, 6),
+        "result_total": round(result, 6),
+        "effective_rate": result / amount if amount else None,
+    }
@@ -2,24 +2,34 @@
 
 from __future__ import annotations
 
+import functools
+import heapq
+import json
 import logging
-from datetime import datetime, timezone
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Any, Dict, List, Optional, Tuple
 
-try:
-    import boto3
-    from boto3.dynamodb.conditions import Key
-    from botocore.exceptions import BotoCoreError, ClientError
-except ImportError:  # pragma: no cover - boto3 is optional during local runs
-    boto3 = None  # type: ignore[assignment]
-    Key = None  # type: ignore[assignment]
+from shared import money
 
-    class BotoCoreError(Exception):
-        """Fallback exception when botocore is not available."""
+# boto3 se importa en el primer uso (ver _load_boto3): su import cuesta
+# cientos de milisegundos en cold start y no todas las rutas tocan DynamoDB.
+boto3 = None
+Key = None
 
-    class ClientError(Exception):
-        """Fallback exception when botocore is not available."""
+
+class BotoCoreError(Exception):
+    """Fallback exception when botocore is not available."""
+
+
+class ClientError(Exception):
+    """Fallback exception when botocore is not available."""
 
 
 logger = logging.getLogger(__name__)
@@ -27,28 +37,135 @@ logger = logging.getLogger(__name__)
 TABLE_NAME = "aws-currency-converter-history"
 PARTITION_KEY = "pk"
 SORT_KEY = "sk"
+LEGACY_PARTITION = "conversion#history"
+RATES_PARTITION_PREFIX = "rates#"
+RATES_LATEST_SORT_KEY = "latest"
+RATES_HISTORY_PARTITION_PREFIX = "rates#history#"  # Un item por (base, día): rates#history#USD / 2026-10-17
+PAIR_INDEX = "pair-index"  # GSI: pair ("USD#COP") + sk
+PAIR_ATTRIBUTE = "pair"
+AGGREGATE_PARTITION_PREFIX = "stats#"  # Contadores por (día, par): stats#2026-10-17 / USD#COP
+TTL_ATTRIBUTE = "ttl"  # Atributo TTL de la tabla: DynamoDB borra el item al vencer
+
+BATCH_WRITE_SIZE = 25  # Límite de DynamoDB por llamada a BatchWriteItem
+BATCH_GET_SIZE = 100  # Límite por llamada a BatchGetItem
+TRANSACT_WRITE_SIZE = 100  # Límite de acciones por TransactWriteItems
+BATCH_WRITE_RETRIES = 3
+BATCH_WRITE_BACKOFF = 0.05
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# HISTORY_WRITE_MODE=buffered encola los registros y los escribe con BatchWriteItem.
+WRITE_MODE = os.environ.get("HISTORY_WRITE_MODE", "sync").strip().lower()
+BUFFER_MAX_ITEMS = max(1, int(_env_number("HISTORY_BUFFER_MAX_ITEMS", BATCH_WRITE_SIZE)))
+BUFFER_MAX_AGE = _env_number("HISTORY_BUFFER_MAX_AGE", 5.0)
+
+# HISTORY_SHARD_COUNT > 0 reparte las escrituras en "conversion#YYYY-MM-DD#N";
+# 0 conserva la partición única original "conversion#history".
+SHARD_COUNT = max(0, int(_env_number("HISTORY_SHARD_COUNT", 0)))
+READ_LEGACY = os.environ.get("HISTORY_READ_LEGACY", "true").strip().lower() in ("1", "true", "yes")
+LOOKBACK_DAYS = max(1, int(_env_number("HISTORY_LOOKBACK_DAYS", 30)))
+# Días que una página sin ``since`` recorre en total, ventana tras ventana.
+RETENTION_DAYS = max(1, int(_env_number("HISTORY_RETENTION_DAYS", 365)))
+# Hilos para consultar en paralelo los shards de un día y la partición legacy.
+QUERY_WORKERS = max(1, int(_env_number("HISTORY_QUERY_WORKERS", 8)))
+
+# HISTORY_AGGREGATES mantiene contadores por (día, par) con ADD en cada escritura.
+AGGREGATES_ENABLED = os.environ.get("HISTORY_AGGREGATES", "true").strip().lower() in ("1", "true", "yes")
 
+# Campos públicos de una conversión y el atributo DynamoDB del que salen.
+HISTORY_FIELDS = ("id", "from", "to", "amount", "result", "rate", "timestamp", "last_updated")
+# Campos que un cliente puede editar (last_updated lo pone el servidor).
+EDITABLE_FIELDS = ("from", "to", "amount", "result", "rate")
+_FIELD_ATTRIBUTES = {"id": SORT_KEY, "timestamp": SORT_KEY}
+
+# Errores que indican que la tabla no es utilizable (no existe, sin permisos,
+# credenciales inválidas); activan el backoff en vez de reintentar en cada request.
+_UNAVAILABLE_ERROR_CODES = {
+    "ResourceNotFoundException",
+    "AccessDeniedException",
+    "UnrecognizedClientException",
+    "InvalidSignatureException",
+}
+STORAGE_RETRY_BASE = _env_number("HISTORY_STORAGE_RETRY_BASE", 1.0)
+STORAGE_RETRY_MAX = _env_number("HISTORY_STORAGE_RETRY_MAX", 60.0)
+
+_boto3_loaded = False
+_boto3_lock = threading.Lock()
 _cached_table = None
-_table_checked = False
+_thread_tables = threading.local()  # tabla propia de cada hilo de trabajo
+_query_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_consecutive_failures = 0
+_disabled_until = 0.0
+_storage_metrics: Dict[str, Any] = {"init_ms": None, "failures": 0, "disabled_until": None}
+
+_write_buffer: List[Dict[str, Any]] = []
+_buffer_started_at: Optional[float] = None
+_buffer_lock = threading.Lock()
+_write_stats = {"flushed": 0, "dropped": 0}
+
+
+def _load_boto3() -> bool:
+    global boto3, Key, BotoCoreError, ClientError, _boto3_loaded
+    if _boto3_loaded:
+        return boto3 is not None
+    # Los hilos que llegan durante el import esperan su resultado en vez de
+    # ver boto3 = None y dar el almacenamiento por no disponible.
+    with _boto3_lock:
+        if not _boto3_loaded:
+            try:
+                import boto3 as boto3_module
+                from boto3.dynamodb.conditions import Key as key_condition
+                from botocore.exceptions import BotoCoreError as botocore_error, ClientError as client_error
+            except ImportError:  # pragma: no cover - boto3 is optional during local runs
+                pass
+            else:
+                BotoCoreError, ClientError = botocore_error, client_error
+                boto3, Key = boto3_module, key_condition
+            _boto3_loaded = True
+    return boto3 is not None
 
 
 def storage_supported() -> bool:
-    return boto3 is not None and Key is not None
+    return _load_boto3() and Key is not None
 
 
 def _get_table():
-    global _cached_table, _table_checked
-    if _cached_table is not None:
-        return _cached_table
+    """Retorna la tabla sin llamar a DescribeTable.
 
-    if _table_checked or not storage_supported():
+    Se confía en la configuración y la tabla se valida con la primera operación
+    real; si esa operación falla por falta de tabla o permisos, el almacenamiento
+    se pausa con backoff exponencial en lugar de quedar deshabilitado para
+    siempre en el contenedor.
+
+    Los resources de boto3 no son thread-safe: el hilo principal usa la tabla
+    del contenedor y cada hilo de trabajo (lecturas en paralelo,
+    ``asyncio.to_thread``) crea la suya con su propia sesión.
+    """
+    global _cached_table
+    if _disabled_until and time.monotonic() < _disabled_until:
         return None
 
+    main_thread = threading.current_thread() is threading.main_thread()
+    cached = _cached_table if main_thread else getattr(_thread_tables, "table", None)
+    if cached is not None:
+        return cached
+
+    if not storage_supported():
+        return None
+
+    started = time.perf_counter()
     try:
+        session = boto3 if main_thread else boto3.session.Session()  # type: ignore[union-attr]
         # Configuración para desarrollo local
-        import os
         if os.environ.get('IS_OFFLINE') or os.environ.get('AWS_SAM_LOCAL'):
-            resource = boto3.resource(
+            resource = session.resource(
                 "dynamodb",
                 endpoint_url="http://localhost:8000",
                 region_name="localhost",
@@ -56,30 +173,90 @@ def _get_table():
                 aws_secret_access_key="fake"
             )
         else:
-            resource = boto3.resource("dynamodb")  # type: ignore[union-attr]
-            
+            resource = session.resource("dynamodb")
+
         table = resource.Table(TABLE_NAME)
-        table.load()  # Ensures the table exists and we have permissions.
     except (BotoCoreError, ClientError) as exc:
-        logger.warning("Historial de conversiones deshabilitado: %s", exc)
-        _table_checked = True
+        logger.warning("Historial de conversiones no disponible: %s", exc)
+        _storage_failed(exc)
         return None
 
+    if not main_thread:
+        _thread_tables.table = table
+        return table
+
+    _storage_metrics["init_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info("Tabla de historial inicializada en %.2f ms", _storage_metrics["init_ms"])
     _cached_table = table
-    _table_checked = True
     return table
 
 
-def store_conversion_record(record: Dict[str, Any]) -> bool:
-    table = _get_table()
-    if table is None:
-        return False
+def _storage_failed(exc: Exception) -> None:
+    """Registra un fallo; los errores de disponibilidad pausan el almacenamiento."""
+    global _consecutive_failures, _disabled_until
+    _storage_metrics["failures"] += 1
+
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    if not isinstance(exc, BotoCoreError) and code not in _UNAVAILABLE_ERROR_CODES:
+        return
+
+    _consecutive_failures += 1
+    backoff = min(STORAGE_RETRY_MAX, STORAGE_RETRY_BASE * (2 ** (_consecutive_failures - 1)))
+    _disabled_until = time.monotonic() + backoff
+    _storage_metrics["disabled_until"] = time.time() + backoff
+    logger.warning("Historial pausado %.1f s tras %d fallos consecutivos", backoff, _consecutive_failures)
+
+
+def _storage_succeeded() -> None:
+    global _consecutive_failures, _disabled_until
+    if _consecutive_failures:
+        _consecutive_failures = 0
+        _disabled_until = 0.0
+        _storage_metrics["disabled_until"] = None
+
+
+def storage_metrics() -> Dict[str, Any]:
+    """Métricas del contenedor: tiempo de inicialización y fallos."""
+    return dict(_storage_metrics, consecutive_failures=_consecutive_failures)
+
+
+def _shard_partition(day: str, shard: int) -> str:
+    return f"conversion#{day}#{shard}"
+
+
+def _partition_for(sort_key: str) -> str:
+    """Partición de un registro según su timestamp (ID)."""
+    if SHARD_COUNT <= 0:
+        return LEGACY_PARTITION
+    shard = zlib.crc32(sort_key.encode("utf-8")) % SHARD_COUNT
+    return _shard_partition(sort_key[:10], shard)
+
+
+def _history_key(conversion_id: str) -> Dict[str, str]:
+    return {PARTITION_KEY: _partition_for(conversion_id), SORT_KEY: conversion_id}
+
+
+def _candidate_keys(conversion_id: str) -> List[Dict[str, str]]:
+    """Claves donde puede vivir un ID: la actual y, durante la migración, la legacy."""
+    keys = [_history_key(conversion_id)]
+    if SHARD_COUNT > 0 and READ_LEGACY:
+        keys.append({PARTITION_KEY: LEGACY_PARTITION, SORT_KEY: conversion_id})
+    return keys
+
+
+def _pair(source: Optional[str], target: Optional[str]) -> Optional[str]:
+    if not source or not target:
+        return None
+    return f"{source}#{target}"
+
 
+def _build_history_item(record: Dict[str, Any]) -> Dict[str, Any]:
     timestamp = record.get("timestamp") or datetime.now(timezone.utc).isoformat()
 
-    item = {
-        PARTITION_KEY: "conversion#history",
+    return {
+        PARTITION_KEY: _partition_for(timestamp),
         SORT_KEY: timestamp,
+        PAIR_ATTRIBUTE: _pair(record.get("from"), record.get("to")),
         "from": record.get("from"),
         "to": record.get("to"),
         "amount": _to_decimal(record.get("amount")),
@@ -88,115 +265,547 @@ def store_conversion_record(record: Dict[str, Any]) -> bool:
         "last_updated": record.get("last_updated"),
     }
 
+
+def store_conversion_record(record: Dict[str, Any], overwrite: bool = False) -> bool:
+    """Guarda una conversión; retorna si quedó escrita (o encolada).
+
+    ``overwrite`` indica que el ID lo eligió el cliente y puede existir: se
+    escribe en el momento con ALL_OLD para descontar la versión anterior de
+    los contadores, algo que el buffer (BatchWriteItem) no puede saber.
+    """
+    if WRITE_MODE == "buffered" and not overwrite:
+        return buffer_conversion_records([record]) == 1
+
+    table = _get_table()
+    if table is None:
+        return False
+
+    item = _build_history_item(record)
+
     try:
-        table.put_item(Item=item)
-        return True
+        # ALL_OLD: si el ID ya existía, sus valores se descuentan de los contadores
+        response = table.put_item(Item=item, ReturnValues="ALL_OLD")
+        _storage_succeeded()
     except (BotoCoreError, ClientError) as exc:
         logger.warning("No fue posible guardar el historial: %s", exc)
+        _storage_failed(exc)
         return False
 
+    _after_history_write(table, added=[item], removed=[response.get("Attributes")])
+    return True
+
+
+def store_conversion_records(records: List[Dict[str, Any]]) -> int:
+    """Guarda varias conversiones con batch_writer; retorna cuántas se escribieron."""
+    if WRITE_MODE == "buffered":
+        return buffer_conversion_records(records)
+
+    table = _get_table()
+    if table is None or not records:
+        return 0
+
+    try:
+        with table.batch_writer(overwrite_by_pkeys=[PARTITION_KEY, SORT_KEY]) as batch:
+            items = [_build_history_item(record) for record in records]
+            for item in items:
+                batch.put_item(Item=item)
+        _storage_succeeded()
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible guardar el historial en lote: %s", exc)
+        _storage_failed(exc)
+        return 0
+
+    _after_history_write(table, added=items)
+    return len(records)
+
+
+def buffer_conversion_records(records: List[Dict[str, Any]]) -> int:
+    """Encola conversiones para escribirlas en lote; retorna cuántas se encolaron."""
+    global _buffer_started_at
+    table = _get_table()
+    if table is None or not records:
+        return 0
+
+    with _buffer_lock:
+        if not _write_buffer:
+            _buffer_started_at = time.monotonic()
+        _write_buffer.extend(_build_history_item(record) for record in records)
+        should_flush = (
+            len(_write_buffer) >= BUFFER_MAX_ITEMS
+            or time.monotonic() - (_buffer_started_at or 0) >= BUFFER_MAX_AGE
+        )
+
+    if should_flush:
+        flush_conversion_records()
+    return len(records)
+
+
+def flush_conversion_records() -> Dict[str, int]:
+    """Escribe el buffer pendiente; reporta registros escritos y descartados."""
+    global _buffer_started_at
+    with _buffer_lock:
+        items = list(_write_buffer)
+        _write_buffer.clear()
+        _buffer_started_at = None
+
+    if not items:
+        return {"flushed": 0, "dropped": 0}
+
+    table = _get_table()
+    if table is None:
+        flushed, dropped = 0, len(items)
+    else:
+        flushed, dropped = _batch_write_items(table, items)
+
+    with _buffer_lock:
+        _write_stats["flushed"] += flushed
+        _write_stats["dropped"] += dropped
+
+    if dropped:
+        logger.warning("Historial en lote: %d escritos, %d descartados", flushed, dropped)
+    else:
+        logger.info("Historial en lote: %d escritos", flushed)
+    return {"flushed": flushed, "dropped": dropped}
+
+
+def history_write_stats() -> Dict[str, int]:
+    """Totales acumulados del contenedor para las escrituras en lote."""
+    with _buffer_lock:
+        return dict(_write_stats, pending=len(_write_buffer))
+
+
+def flush_history_on_exit(handler):
+    """Decorador que vacía el buffer de historial antes de terminar la invocación."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            if _write_buffer:
+                flush_conversion_records()
+
+    return wrapper
+
+
+def _batch_write_items(table, items: List[Dict[str, Any]]) -> Tuple[int, int]:
+    # BatchWriteItem rechaza claves repetidas dentro de la misma llamada;
+    # la última versión de cada registro reemplaza a las anteriores.
+    unique_items = list({(item[PARTITION_KEY], item[SORT_KEY]): item for item in items}.values())
+
+    unprocessed = _batch_write_requests(table, [{"PutRequest": {"Item": item}} for item in unique_items])
+    unprocessed_keys = {
+        (request["PutRequest"]["Item"][PARTITION_KEY], request["PutRequest"]["Item"][SORT_KEY])
+        for request in unprocessed
+    }
+    written = [item for item in unique_items if (item[PARTITION_KEY], item[SORT_KEY]) not in unprocessed_keys]
+
+    _after_history_write(table, added=written)
+    return (len(written), len(unprocessed))
+
+
+def _batch_write_requests(table, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Envía Put/DeleteRequests en lotes de 25 con reintento; retorna los no procesados."""
+    client = table.meta.client
+    unprocessed: List[Dict[str, Any]] = []
+
+    for start in range(0, len(requests), BATCH_WRITE_SIZE):
+        pending = {TABLE_NAME: requests[start:start + BATCH_WRITE_SIZE]}
+        attempt = 0
+        try:
+            while pending:
+                response = client.batch_write_item(RequestItems=pending)
+                _storage_succeeded()
+                pending = response.get("UnprocessedItems") or {}
+                if not pending or attempt >= BATCH_WRITE_RETRIES:
+                    break
+                time.sleep(BATCH_WRITE_BACKOFF * (2 ** attempt))
+                attempt += 1
+        except (BotoCoreError, ClientError) as exc:
+            logger.warning("No fue posible escribir el lote de historial: %s", exc)
+            _storage_failed(exc)
+
+        unprocessed.extend((pending or {}).get(TABLE_NAME, []))
+
+    return unprocessed
+
+
+def _batch_get_items(table, keys: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """BatchGetItem en lotes de 100 con reintento de UnprocessedKeys."""
+    client = table.meta.client
+    items: List[Dict[str, Any]] = []
+
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        pending = {TABLE_NAME: {"Keys": keys[start:start + BATCH_GET_SIZE], "ConsistentRead": True}}
+        attempt = 0
+        while pending:
+            response = client.batch_get_item(RequestItems=pending)
+            items.extend(response.get("Responses", {}).get(TABLE_NAME, []))
+            pending = response.get("UnprocessedKeys") or {}
+            if pending and attempt >= BATCH_WRITE_RETRIES:
+                raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "BatchGetItem")
+            if pending:
+                time.sleep(BATCH_WRITE_BACKOFF * (2 ** attempt))
+                attempt += 1
+
+    return items
+
 
 def fetch_history(limit: int = 20) -> Tuple[List[Dict[str, Any]], bool]:
+    history, _, storage_active = fetch_history_page(limit)
+    return (history, storage_active)
+
+
+def fetch_history_page(
+    limit: int = 20,
+    start_key: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    pair: Optional[Tuple[str, str]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]], bool]:
+    """Lee una página del historial; retorna (items, LastEvaluatedKey, storage_active).
+
+    ``fields`` limita los atributos leídos (ProjectionExpression) y serializados.
+    ``since``/``until`` son límites inclusivos del sort key (ver parse_time_bound)
+    y ``pair`` (from, to) consulta el GSI del par en lugar de las particiones.
+    """
     table = _get_table()
     if table is None or not storage_supported():
-        return ([], False)
+        return ([], None, False)
 
+    projection = _projection(fields)
     try:
-        response = table.query(
-            KeyConditionExpression=Key(PARTITION_KEY).eq("conversion#history"),
-            ScanIndexForward=False,
-            Limit=limit,
-        )
+        if pair:
+            items, last_key = _query_pair_index(table, _pair(*pair), limit, start_key, projection, since, until)
+        elif SHARD_COUNT > 0:
+            items, last_key = _gather_sharded_history(limit, start_key, projection, since, until)
+        else:
+            items, last_key = _query_partition(
+                table, LEGACY_PARTITION, limit, start_key=start_key, projection=projection,
+                since=since, until=until,
+            )
     except (BotoCoreError, ClientError) as exc:
         logger.warning("No fue posible leer el historial: %s", exc)
-        return ([], False)
+        _storage_failed(exc)
+        return ([], None, False)
+
+    _storage_succeeded()
+    return ([_serialize_item(item, fields) for item in items], last_key, True)
+
+
+def _projection(fields: Optional[List[str]]) -> Dict[str, Any]:
+    """ProjectionExpression para los campos pedidos; las claves siempre se incluyen."""
+    if not fields:
+        return {}
+    attributes = {PARTITION_KEY, SORT_KEY}
+    attributes.update(_FIELD_ATTRIBUTES.get(field, field) for field in fields)
+    names = {f"#p{index}": attribute for index, attribute in enumerate(sorted(attributes))}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+
+
+def _query_partition(
+    table,
+    partition: str,
+    limit: int,
+    start_key: Optional[Dict[str, Any]] = None,
+    before: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    index: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    partition_attribute = PAIR_ATTRIBUTE if index == PAIR_INDEX else PARTITION_KEY
+    condition = Key(partition_attribute).eq(partition)
 
+    # Un solo límite por sort key: ``before`` (exclusivo, del cursor) se
+    # combina con ``until`` (inclusivo) tomando el menor.
+    exclusive_upper = before is not None and (until is None or before <= until)
+    upper = before if exclusive_upper else until
+    query_limit = limit
+    if since and upper:
+        condition = condition & Key(SORT_KEY).between(since, upper)
+        # BETWEEN es inclusivo: se pide uno más por si aparece ``before``
+        query_limit = limit + 1 if exclusive_upper else limit
+    elif since:
+        condition = condition & Key(SORT_KEY).gte(since)
+    elif exclusive_upper:
+        condition = condition & Key(SORT_KEY).lt(before)
+    elif upper:
+        condition = condition & Key(SORT_KEY).lte(upper)
+
+    query_params = {
+        "KeyConditionExpression": condition,
+        "ScanIndexForward": False,
+        "Limit": query_limit,
+        **(projection or {}),
+    }
+    if index:
+        query_params["IndexName"] = index
+    if start_key:
+        query_params["ExclusiveStartKey"] = start_key
+
+    response = table.query(**query_params)
     items = response.get("Items", [])
-    history = [
-        {
-            "id": item.get(SORT_KEY),  # timestamp as unique ID
-            "from": item.get("from"),
-            "to": item.get("to"),
-            "amount": _to_float(item.get("amount")),
-            "result": _to_float(item.get("result")),
-            "rate": _to_float(item.get("rate")),
-            "timestamp": item.get(SORT_KEY),
-            "last_updated": item.get("last_updated"),
-        }
-        for item in items
-    ]
+    if query_limit != limit:
+        items = [item for item in items if item[SORT_KEY] != before][:limit]
+    return (items, response.get("LastEvaluatedKey"))
+
+
+def _query_pair_index(
+    table,
+    pair: str,
+    limit: int,
+    start_key: Optional[Dict[str, Any]],
+    projection: Optional[Dict[str, Any]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Página del GSI del par con una sola copia por conversión.
+
+    Durante la migración el shard y la partición legacy tienen el mismo sk y
+    ambos tienen ``pair``: en el índice aparecen seguidos. Se entrega la
+    copia del shard, se sigue leyendo hasta completar la página y el cursor
+    queda después de la última copia de la última conversión entregada.
+    """
+    chosen: Dict[str, Dict[str, Any]] = {}
+    cursor = None
+    while True:
+        items, next_key = _query_partition(
+            table, pair, limit + 1, start_key=start_key, projection=projection,
+            since=since, until=until, index=PAIR_INDEX,
+        )
+        for item in items:
+            sort_key = item[SORT_KEY]
+            current = chosen.get(sort_key)
+            if current is None:
+                if len(chosen) == limit:
+                    return (list(chosen.values()), cursor)
+                chosen[sort_key] = item
+            elif current[PARTITION_KEY] == LEGACY_PARTITION:
+                chosen[sort_key] = item
+            cursor = {PARTITION_KEY: item[PARTITION_KEY], SORT_KEY: sort_key, PAIR_ATTRIBUTE: pair}
+        if not next_key:
+            return (list(chosen.values()), None)
+        start_key = next_key
+
+
+def _gather_sharded_history(
+    limit: int,
+    start_key: Optional[Dict[str, Any]],
+    projection: Optional[Dict[str, Any]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Scatter-gather sobre los shards de cada día, del más reciente al más antiguo.
+
+    Los shards de un día (y la partición legacy) se consultan en paralelo.
+    El cursor guarda la última clave entregada; su sort key sirve como límite
+    superior (exclusivo) para la siguiente página en todos los shards. Una
+    página recorre a lo sumo LOOKBACK_DAYS días: si se agotan sin llenar la
+    página y quedan días hasta ``since`` (o RETENTION_DAYS sin ``since``), el
+    cursor de continuación lleva el último día visitado y la página siguiente
+    sigue desde el día anterior.
+    """
+    before, days, reaches_floor = _sharded_plan(start_key, since, until)
+    if not days:
+        return ([], None)
+    executor = _get_query_executor()
+
+    # La partición legacy no depende de los shards: se lee al mismo tiempo,
+    # acotada a la ventana para no saltarse días de shards sin visitar.
+    legacy = None
+    if READ_LEGACY:
+        legacy_since = since if reaches_floor else max(since or "", days[-1])
+        legacy = executor.submit(
+            _query_in_worker, LEGACY_PARTITION, limit,
+            before=before, projection=projection, since=legacy_since, until=until,
+        )
+
+    collected: List[Dict[str, Any]] = []
+    for day in days:
+        remaining = limit - len(collected)
+        if remaining <= 0:
+            break
+        futures = [
+            executor.submit(
+                _query_in_worker, _shard_partition(day, shard), remaining,
+                before=before, projection=projection, since=since, until=until,
+            )
+            for shard in range(SHARD_COUNT)
+        ]
+        collected.extend(_merge_shard_pages([future.result()[0] for future in futures], remaining))
+
+    legacy_items = legacy.result()[0] if legacy is not None else None
+    return _sharded_result(collected, limit, legacy_items, None if reaches_floor else days[-1])
+
+
+def _get_query_executor() -> ThreadPoolExecutor:
+    global _query_executor
+    with _executor_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="history-query")
+        return _query_executor
 
-    return (history, True)
 
+def _query_in_worker(partition: str, limit: int, **options: Any) -> Tuple[List[Dict[str, Any]], Any]:
+    # Cada hilo consulta con su propia tabla: los resources de boto3 no son thread-safe.
+    table = _get_table()
+    if table is None:
+        raise BotoCoreError()
+    return _query_partition(table, partition, limit, **options)
+
+
+def _sharded_plan(
+    start_key: Optional[Dict[str, Any]],
+    since: Optional[str],
+    until: Optional[str],
+) -> Tuple[Optional[str], List[str], bool]:
+    """Límite exclusivo del cursor, días a visitar (del más reciente al más
+    antiguo) y si la ventana llega hasta el primer día del rango."""
+    before = (start_key or {}).get(SORT_KEY)
+    first_day = _parse_day(before) if before else _today()
+    if before and len(str(before)) == len("YYYY-MM-DD"):
+        # Cursor de continuación: ese día ya se recorrió completo
+        first_day -= timedelta(days=1)
+    if until:
+        first_day = min(first_day, _parse_day(until))
+    floor = _parse_day(since) if since else _today() - timedelta(days=RETENTION_DAYS - 1)
+    span = max(0, (first_day - floor).days + 1)
+    days = min(span, LOOKBACK_DAYS)
+    return (before, [(first_day - timedelta(days=offset)).isoformat() for offset in range(days)], days == span)
+
+
+def _merge_shard_pages(shard_pages: List[List[Dict[str, Any]]], remaining: int) -> List[Dict[str, Any]]:
+    merged = heapq.merge(*shard_pages, key=lambda item: item[SORT_KEY], reverse=True)
+    return [item for _, item in zip(range(remaining), merged)]
+
+
+def _sharded_result(
+    collected: List[Dict[str, Any]],
+    limit: int,
+    legacy_items: Optional[List[Dict[str, Any]]] = None,
+    continue_before: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    if legacy_items is not None:
+        # Durante la migración un registro puede estar en su shard y en la
+        # partición legacy: se entrega una sola vez, la copia del shard.
+        migrated = {item[SORT_KEY] for item in collected}
+        pending = [item for item in legacy_items if item[SORT_KEY] not in migrated]
+        collected = heapq.nlargest(limit, collected + pending, key=lambda item: item[SORT_KEY])
+
+    if len(collected) < limit:
+        if continue_before:
+            return (collected, {PARTITION_KEY: LEGACY_PARTITION, SORT_KEY: continue_before})
+        return (collected, None)
+    last = collected[-1]
+    return (collected, {PARTITION_KEY: last[PARTITION_KEY], SORT_KEY: last[SORT_KEY]})
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _parse_day(sort_key: str) -> date:
+    try:
+        return date.fromisoformat(str(sort_key)[:10])
+    except ValueError:
+        return _today()
+
+
+def _serialize_item(item: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    # El ID es el timestamp (sort key). Los números quedan como Decimal:
+    # shared.responses los serializa directamente.
+    return {
+        field: item.get(_FIELD_ATTRIBUTES.get(field, field))
+        for field in fields or HISTORY_FIELDS
+    }
+
+
+def parse_time_bound(raw: Optional[str], upper: bool = False) -> Optional[str]:
+    """Convierte ``since``/``until`` (fecha o fecha-hora ISO 8601) en un límite del sort key.
+
+    Una fecha sola cubre el día completo: como ``until`` se vuelve
+    ``YYYY-MM-DD~``, mayor que cualquier timestamp de ese día. Lanza
+    ValueError si el valor no es una fecha válida.
+    """
+    if not raw:
+        return None
+    value = str(raw).strip()
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value).isoformat()
+            return f"{day}~" if upper else day
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date '{raw}', expected ISO 8601") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
 
-def get_conversion_by_id(conversion_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+
+def parse_fields(raw_fields: Optional[str]) -> Optional[List[str]]:
+    """Interpreta ``fields=from,to,result``; lanza ValueError con campos desconocidos."""
+    if not raw_fields:
+        return None
+    fields = []
+    for field in str(raw_fields).split(","):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in HISTORY_FIELDS:
+            raise ValueError(f"Unknown field '{field}'. Allowed: {', '.join(HISTORY_FIELDS)}")
+        fields.append(field)
+    return fields or None
+
+
+def _find_existing_item(
+    table,
+    conversion_id: str,
+    projection: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    for key in _candidate_keys(conversion_id):
+        item = table.get_item(Key=key, **(projection or {})).get("Item")
+        if item:
+            return item
+    return None
+
+
+def get_conversion_by_id(
+    conversion_id: str,
+    fields: Optional[List[str]] = None,
+) -> Tuple[Optional[Dict[str, Any]], bool]:
     """Obtiene una conversión específica por su ID (timestamp)."""
     table = _get_table()
     if table is None or not storage_supported():
         return (None, False)
 
     try:
-        response = table.get_item(
-            Key={
-                PARTITION_KEY: "conversion#history",
-                SORT_KEY: conversion_id
-            }
-        )
+        item = _find_existing_item(table, conversion_id, _projection(fields))
     except (BotoCoreError, ClientError) as exc:
         logger.warning("No fue posible obtener la conversión: %s", exc)
+        _storage_failed(exc)
         return (None, False)
 
-    item = response.get("Item")
+    _storage_succeeded()
     if not item:
         return (None, True)  # No encontrado pero operación exitosa
 
-    conversion = {
-        "id": item.get(SORT_KEY),
-        "from": item.get("from"),
-        "to": item.get("to"),
-        "amount": _to_float(item.get("amount")),
-        "result": _to_float(item.get("result")),
-        "rate": _to_float(item.get("rate")),
-        "timestamp": item.get(SORT_KEY),
-        "last_updated": item.get("last_updated"),
-    }
-
-    return (conversion, True)
-
+    return (_serialize_item(item, fields), True)
 
-def update_conversion_record(conversion_id: str, updates: Dict[str, Any]) -> bool:
-    """Actualiza una conversión existente."""
-    table = _get_table()
-    if table is None:
-        logger.warning("No se pudo obtener la tabla DynamoDB")
-        return False
-
-    logger.info(f"Intentando actualizar conversión con ID: {conversion_id}")
-    logger.info(f"Updates: {updates}")
-
-    # Primero verificar que la conversión existe
-    try:
-        response = table.get_item(
-            Key={
-                PARTITION_KEY: "conversion#history",
-                SORT_KEY: conversion_id
-            }
-        )
-        logger.info(f"Respuesta de get_item: {response}")
-        if "Item" not in response:
-            logger.warning(f"No se encontró item con ID: {conversion_id}")
-            return False  # No existe la conversión
-    except (BotoCoreError, ClientError) as exc:
-        logger.warning("Error verificando la conversión existente: %s", exc)
-        return False
 
-    # Construir la expresión de actualización
-    update_expression = "SET "
+def _build_update_expression(
+    updates: Dict[str, Any],
+) -> Optional[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+    """SET dinámico con los campos editables; None si no hay ninguno."""
     expression_attribute_values = {}
-    expression_attribute_names = {}
+    expression_attribute_names = {"#pk": PARTITION_KEY}
     expression_parts = []
 
-    allowed_fields = ["from", "to", "amount", "result", "rate", "last_updated"]
+    allowed_fields = [*EDITABLE_FIELDS, "last_updated"]
     reserved_words = {"result": "#result_value", "from": "#from_value", "to": "#to_value"}  # DynamoDB reserved words
     
     for field, value in updates.items():
@@ -215,34 +824,110 @@ def update_conversion_record(conversion_id: str, updates: Dict[str, Any]) -> boo
                 expression_attribute_values[f":{field}"] = value
 
     if not expression_parts:
+        return None
+
+    # El GSI del par se mantiene cuando se conocen ambas divisas
+    pair = _pair(updates.get("from"), updates.get("to"))
+    if pair:
+        expression_attribute_names["#pair"] = PAIR_ATTRIBUTE
+        expression_parts.append("#pair = :pair")
+        expression_attribute_values[":pair"] = pair
+    return ("SET " + ", ".join(expression_parts), expression_attribute_names, expression_attribute_values)
+
+
+def _apply_update(item: Dict[str, Any], expression_attribute_values: Dict[str, Any]) -> Dict[str, Any]:
+    """Versión nueva de ``item`` tras el SET (los placeholders son ``:<campo>``)."""
+    new_item = dict(item)
+    new_item.update({name[1:]: value for name, value in expression_attribute_values.items()})
+    return new_item
+
+
+def update_conversion_record(conversion_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Actualiza una conversión existente y retorna su versión nueva (None si no existe)."""
+    table = _get_table()
+    if table is None:
+        logger.warning("No se pudo obtener la tabla DynamoDB")
+        return None
+
+    logger.info(f"Intentando actualizar conversión con ID: {conversion_id}")
+    logger.info(f"Updates: {updates}")
+
+    update = _build_update_expression(updates)
+    if update is None:
         logger.warning("No hay campos válidos para actualizar")
-        return False  # No hay campos válidos para actualizar
+        return None  # No hay campos válidos para actualizar
 
-    update_expression += ", ".join(expression_parts)
+    update_expression, expression_attribute_names, expression_attribute_values = update
     logger.info(f"Update expression: {update_expression}")
-    logger.info(f"Expression values: {expression_attribute_values}")
-    logger.info(f"Expression names: {expression_attribute_names}")
 
+    # Un solo update_item por copia: la condición verifica que exista y
+    # ALL_OLD devuelve el item previo, sin get_item antes ni después. La
+    # versión nueva se obtiene aplicando los mismos SET y ajusta los
+    # contadores. Durante la migración se actualizan todas las copias
+    # (shard y legacy) para que la legacy no quede desactualizada.
+    updated = None
+    for key in _candidate_keys(conversion_id):
+        try:
+            response = table.update_item(
+                Key=key,
+                UpdateExpression=update_expression,
+                ConditionExpression="attribute_exists(#pk)",
+                ExpressionAttributeNames=expression_attribute_names,
+                ExpressionAttributeValues=expression_attribute_values,
+                ReturnValues="ALL_OLD",
+            )
+        except ClientError as exc:
+            if _is_conditional_check_failure(exc):
+                continue
+            logger.warning("No fue posible actualizar la conversión: %s", exc)
+            _storage_failed(exc)
+            return _serialize_item(updated) if updated else None
+        except BotoCoreError as exc:
+            logger.warning("No fue posible actualizar la conversión: %s", exc)
+            _storage_failed(exc)
+            return _serialize_item(updated) if updated else None
+
+        _storage_succeeded()
+        old_item = response.get("Attributes", {})
+        new_item = _apply_update(old_item, expression_attribute_values)
+        _sync_pair(table, key, new_item)
+        if updated is None:
+            # Los contadores cuentan la conversión una vez, aunque tenga dos copias
+            logger.info("Update ejecutado exitosamente")
+            _after_history_write(table, added=[new_item], removed=[old_item])
+            updated = new_item
+
+    if updated is None:
+        logger.warning(f"No se encontró item con ID: {conversion_id}")
+        return None
+    return _serialize_item(updated)
+
+
+def _error_code(exc: Exception) -> Optional[str]:
+    error = getattr(exc, "response", None) or {}
+    return error.get("Error", {}).get("Code")
+
+
+def _sync_pair(table, key: Dict[str, str], item: Dict[str, Any]) -> None:
+    """Corrige el atributo del GSI si el update cambió solo una de las divisas."""
+    pair = _pair(item.get("from"), item.get("to"))
+    if not pair or item.get(PAIR_ATTRIBUTE) == pair:
+        return
     try:
-        update_params = {
-            "Key": {
-                PARTITION_KEY: "conversion#history",
-                SORT_KEY: conversion_id
-            },
-            "UpdateExpression": update_expression,
-            "ExpressionAttributeValues": expression_attribute_values
-        }
-        
-        # Solo agregar ExpressionAttributeNames si hay palabras reservadas
-        if expression_attribute_names:
-            update_params["ExpressionAttributeNames"] = expression_attribute_names
-            
-        table.update_item(**update_params)
-        logger.info("Update ejecutado exitosamente")
-        return True
+        table.update_item(
+            Key=key,
+            UpdateExpression="SET #pair = :pair",
+            ExpressionAttributeNames={"#pair": PAIR_ATTRIBUTE},
+            ExpressionAttributeValues={":pair": pair},
+        )
+        item[PAIR_ATTRIBUTE] = pair
     except (BotoCoreError, ClientError) as exc:
-        logger.warning("No fue posible actualizar la conversión: %s", exc)
-        return False
+        logger.warning("No fue posible actualizar el par de la conversión: %s", exc)
+        _storage_failed(exc)
+
+
+def _is_conditional_check_failure(exc: Exception) -> bool:
+    return _error_code(exc) == "ConditionalCheckFailedException"
 
 
 def delete_conversion_record(conversion_id: str) -> bool:
@@ -251,33 +936,515 @@ def delete_conversion_record(conversion_id: str) -> bool:
     if table is None:
         return False
 
+    # Durante la migración se borran todas las copias (shard y legacy)
+    deleted = None
     try:
-        table.delete_item(
-            Key={
-                PARTITION_KEY: "conversion#history",
-                SORT_KEY: conversion_id
+        for key in _candidate_keys(conversion_id):
+            old_item = table.delete_item(Key=key, ReturnValues="ALL_OLD").get("Attributes")
+            deleted = deleted or old_item
+        _storage_succeeded()
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible eliminar la conversión: %s", exc)
+        _storage_failed(exc)
+        return False
+
+    _after_history_write(table, removed=[deleted])
+    return True
+
+
+def _find_existing_items(table, conversion_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Ubica varias conversiones con BatchGetItem; la clave actual gana sobre la legacy."""
+    return {conversion_id: copies[0] for conversion_id, copies in _find_item_copies(table, conversion_ids).items()}
+
+
+def _find_item_copies(table, conversion_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Todas las copias de cada conversión (shard y legacy), la actual primero."""
+    keys: List[Dict[str, str]] = []
+    seen = set()
+    for conversion_id in conversion_ids:
+        for key in _candidate_keys(conversion_id):
+            marker = (key[PARTITION_KEY], key[SORT_KEY])
+            if marker not in seen:
+                seen.add(marker)
+                keys.append(key)
+
+    found: Dict[str, List[Dict[str, Any]]] = {}
+    for item in _batch_get_items(table, keys):
+        copies = found.setdefault(item[SORT_KEY], [])
+        if item[PARTITION_KEY] == LEGACY_PARTITION:
+            copies.append(item)
+        else:
+            copies.insert(0, item)
+    return found
+
+
+def delete_conversion_records(conversion_ids: List[str]) -> Optional[Dict[str, str]]:
+    """Elimina varias conversiones con BatchWriteItem.
+
+    Retorna el estado por ID (``deleted``, ``not_found`` o ``failed``), o
+    None si el almacenamiento no está disponible.
+    """
+    table = _get_table()
+    if table is None:
+        return None
+
+    try:
+        copies = _find_item_copies(table, conversion_ids)
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible leer las conversiones a eliminar: %s", exc)
+        _storage_failed(exc)
+        return None
+    _storage_succeeded()
+
+    # Se borran todas las copias; los contadores descuentan una por conversión
+    unprocessed = _batch_write_requests(table, [
+        {"DeleteRequest": {"Key": {PARTITION_KEY: item[PARTITION_KEY], SORT_KEY: item[SORT_KEY]}}}
+        for items in copies.values()
+        for item in items
+    ])
+    failed = {request["DeleteRequest"]["Key"][SORT_KEY] for request in unprocessed}
+    existing = {conversion_id: items[0] for conversion_id, items in copies.items()}
+    _after_history_write(
+        table, removed=[item for conversion_id, item in existing.items() if conversion_id not in failed]
+    )
+
+    return {
+        conversion_id: "failed" if conversion_id in failed else "deleted" if conversion_id in existing else "not_found"
+        for conversion_id in conversion_ids
+    }
+
+
+def update_conversion_records(
+    updates_by_id: Dict[str, Dict[str, Any]],
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Actualiza varias conversiones con TransactWriteItems en lotes de 100.
+
+    Retorna por ID ``{"status": "updated", "conversion": {...}}`` o el
+    estado ``not_found`` / ``invalid`` / ``failed``; None si el
+    almacenamiento no está disponible.
+    """
+    table = _get_table()
+    if table is None:
+        return None
+
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    prepared = {}
+    for conversion_id, updates in updates_by_id.items():
+        # Un valor inválido o un item sin campos editables afecta solo a su ID
+        try:
+            update = _build_update_expression(updates)
+        except ValueError:
+            update = None
+        if update is None or not any(field in updates for field in EDITABLE_FIELDS):
+            outcomes[conversion_id] = {"status": "invalid"}
+        else:
+            prepared[conversion_id] = update
+
+    try:
+        copies = _find_item_copies(table, list(prepared))
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible leer las conversiones a actualizar: %s", exc)
+        _storage_failed(exc)
+        return None
+    _storage_succeeded()
+    existing = {conversion_id: items[0] for conversion_id, items in copies.items()}
+
+    targets = []
+    for conversion_id in prepared:
+        if conversion_id not in existing:
+            outcomes[conversion_id] = {"status": "not_found"}
+            continue
+        targets.append(conversion_id)
+        updates = updates_by_id[conversion_id]
+        if ("from" in updates) != ("to" in updates):
+            # Con la divisa que no cambia, el SET también actualiza el par del GSI
+            item = existing[conversion_id]
+            prepared[conversion_id] = _build_update_expression(
+                {"from": item.get("from"), "to": item.get("to"), **updates}
+            )
+
+    # Cada copia (shard y legacy durante la migración) es una acción de la transacción
+    chunks: List[List[str]] = [[]]
+    actions_in_chunk = 0
+    for conversion_id in targets:
+        size = len(copies[conversion_id])
+        if actions_in_chunk + size > TRANSACT_WRITE_SIZE:
+            chunks.append([])
+            actions_in_chunk = 0
+        chunks[-1].append(conversion_id)
+        actions_in_chunk += size
+
+    client = table.meta.client
+    for chunk in chunks:
+        if not chunk:
+            continue
+        actions = []
+        for conversion_id in chunk:
+            update_expression, names, values = prepared[conversion_id]
+            for item in copies[conversion_id]:
+                actions.append({"Update": {
+                    "TableName": TABLE_NAME,
+                    "Key": {PARTITION_KEY: item[PARTITION_KEY], SORT_KEY: item[SORT_KEY]},
+                    "UpdateExpression": update_expression,
+                    "ConditionExpression": "attribute_exists(#pk)",
+                    "ExpressionAttributeNames": names,
+                    "ExpressionAttributeValues": values,
+                }})
+
+        try:
+            client.transact_write_items(TransactItems=actions)
+        except ClientError as exc:
+            if _error_code(exc) == "TransactionCanceledException":
+                # Alguna conversión se eliminó entre la lectura y la escritura:
+                # el lote se reintenta de a una para aislarla.
+                for conversion_id in chunk:
+                    updated = update_conversion_record(conversion_id, updates_by_id[conversion_id])
+                    outcomes[conversion_id] = (
+                        {"status": "updated", "conversion": updated} if updated else {"status": "not_found"}
+                    )
+                continue
+            logger.warning("No fue posible actualizar el lote de conversiones: %s", exc)
+            _storage_failed(exc)
+            outcomes.update({conversion_id: {"status": "failed"} for conversion_id in chunk})
+            continue
+        except BotoCoreError as exc:
+            logger.warning("No fue posible actualizar el lote de conversiones: %s", exc)
+            _storage_failed(exc)
+            outcomes.update({conversion_id: {"status": "failed"} for conversion_id in chunk})
+            continue
+
+        _storage_succeeded()
+        new_items = {
+            conversion_id: _apply_update(existing[conversion_id], prepared[conversion_id][2])
+            for conversion_id in chunk
+        }
+        _after_history_write(
+            table,
+            added=list(new_items.values()),
+            removed=[existing[conversion_id] for conversion_id in chunk],
+        )
+        for conversion_id, new_item in new_items.items():
+            outcomes[conversion_id] = {"status": "updated", "conversion": _serialize_item(new_item)}
+
+    return outcomes
+
+
+def _aggregate_key(day: str, source: str, target: str) -> Dict[str, str]:
+    return {PARTITION_KEY: f"{AGGREGATE_PARTITION_PREFIX}{day}", SORT_KEY: f"{source}#{target}"}
+
+
+def _aggregate_deltas(
+    added: Optional[List[Optional[Dict[str, Any]]]] = None,
+    removed: Optional[List[Optional[Dict[str, Any]]]] = None,
+) -> Dict[Tuple[str, str, str], List[Decimal]]:
+    """Suma (count, amount, result) por (día, from, to); ``removed`` resta."""
+    deltas: Dict[Tuple[str, str, str], List[Decimal]] = {}
+    for items, sign in ((added or [], 1), (removed or [], -1)):
+        for item in items:
+            if not item or not item.get("from") or not item.get("to"):
+                continue
+            group = (str(item[SORT_KEY])[:10], item["from"], item["to"])
+            delta = deltas.setdefault(group, [Decimal(0), Decimal(0), Decimal(0)])
+            delta[0] += sign
+            delta[1] += sign * (_to_decimal(item.get("amount")) or 0)
+            delta[2] += sign * (_to_decimal(item.get("result")) or 0)
+    return {group: delta for group, delta in deltas.items() if any(delta)}
+
+
+def _after_history_write(
+    table,
+    added: Optional[List[Optional[Dict[str, Any]]]] = None,
+    removed: Optional[List[Optional[Dict[str, Any]]]] = None,
+) -> None:
+    """Ajustes posteriores a cada escritura: contadores por (día, par)."""
+    if not any(added or []) and not any(removed or []):
+        return
+    _apply_aggregate_deltas(table, added, removed)
+
+
+def _apply_aggregate_deltas(
+    table,
+    added: Optional[List[Optional[Dict[str, Any]]]] = None,
+    removed: Optional[List[Optional[Dict[str, Any]]]] = None,
+) -> None:
+    """Ajusta los contadores por (día, par) con ADD atómico; best-effort tras la escritura.
+
+    Un lote de N conversiones del mismo par y día produce un solo update_item.
+    """
+    if not AGGREGATES_ENABLED:
+        return
+
+    for (day, source, target), (count, amount, result) in _aggregate_deltas(added, removed).items():
+        try:
+            table.update_item(
+                Key=_aggregate_key(day, source, target),
+                UpdateExpression=(
+                    "SET #from_value = :from, #to_value = :to "
+                    "ADD #count :count, amount_sum :amount, result_sum :result"
+                ),
+                ExpressionAttributeNames={"#from_value": "from", "#to_value": "to", "#count": "count"},
+                ExpressionAttributeValues={
+                    ":from": source,
+                    ":to": target,
+                    ":count": count,
+                    ":amount": amount,
+                    ":result": result,
+                },
+            )
+        except (BotoCoreError, ClientError) as exc:
+            logger.warning("No fue posible actualizar los contadores de %s %s->%s: %s", day, source, target, exc)
+            _storage_failed(exc)
+            return
+
+
+def fetch_daily_aggregates(start_day: date, end_day: date) -> Optional[List[Dict[str, Any]]]:
+    """Lee los contadores por par de cada día del rango (un Query por día).
+
+    Retorna None si el almacenamiento no está disponible.
+    """
+    table = _get_table()
+    if table is None or not storage_supported():
+        return None
+
+    rows: List[Dict[str, Any]] = []
+    day = start_day
+    try:
+        while day <= end_day:
+            query_params = {
+                "KeyConditionExpression": Key(PARTITION_KEY).eq(f"{AGGREGATE_PARTITION_PREFIX}{day.isoformat()}"),
             }
+            while True:
+                response = table.query(**query_params)
+                rows.extend(
+                    {
+                        "date": day.isoformat(),
+                        "from": item.get("from"),
+                        "to": item.get("to"),
+                        "count": item.get("count", 0),
+                        "amount": item.get("amount_sum", 0),
+                        "result": item.get("result_sum", 0),
+                    }
+                    for item in response.get("Items", [])
+                )
+                if not response.get("LastEvaluatedKey"):
+                    break
+                query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+            day += timedelta(days=1)
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible leer los contadores del historial: %s", exc)
+        _storage_failed(exc)
+        return None
+
+    _storage_succeeded()
+    return rows
+
+
+def _rates_key(base: str) -> Dict[str, str]:
+    return {PARTITION_KEY: f"{RATES_PARTITION_PREFIX}{base}", SORT_KEY: RATES_LATEST_SORT_KEY}
+
+
+def get_shared_rates(base: str) -> Optional[Dict[str, Any]]:
+    """Lee las tasas compartidas por todos los contenedores (item rates#<BASE>)."""
+    table = _get_table()
+    if table is None:
+        return None
+
+    try:
+        item = table.get_item(Key=_rates_key(base), ConsistentRead=True).get("Item")
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible leer las tasas compartidas: %s", exc)
+        _storage_failed(exc)
+        return None
+
+    _storage_succeeded()
+    if not item or "payload" not in item:
+        return None
+    return {
+        "payload": json.loads(item["payload"]),
+        "expires_at": float(item["expires_at"]),
+        "fetched_at": float(item["fetched_at"]),
+    }
+
+
+def acquire_rates_refresh_lease(base: str, owner: str, lease_seconds: float) -> bool:
+    """Reserva el refresco de una base; solo un contenedor a la vez consulta al proveedor.
+
+    Si el almacenamiento no está disponible se retorna True: sin coordinación,
+    cada contenedor refresca por su cuenta como antes.
+    """
+    table = _get_table()
+    if table is None:
+        return True
+
+    now = time.time()
+    try:
+        table.update_item(
+            Key=_rates_key(base),
+            UpdateExpression="SET lease_owner = :owner, lease_until = :until",
+            ConditionExpression="attribute_not_exists(lease_until) OR lease_until < :now",
+            ExpressionAttributeValues={
+                ":owner": owner,
+                ":until": _to_decimal(round(now + lease_seconds, 3)),
+                ":now": _to_decimal(round(now, 3)),
+            },
         )
+    except ClientError as exc:
+        if _is_conditional_check_failure(exc):
+            return False
+        logger.warning("No fue posible reservar el refresco de tasas: %s", exc)
+        _storage_failed(exc)
+        return True
+    except BotoCoreError as exc:
+        logger.warning("No fue posible reservar el refresco de tasas: %s", exc)
+        _storage_failed(exc)
         return True
+
+    _storage_succeeded()
+    return True
+
+
+def put_shared_rates(
+    base: str,
+    payload: Dict[str, Any],
+    expires_at: float,
+    fetched_at: float,
+    keep_until: float,
+) -> bool:
+    """Publica tasas nuevas; la condición evita reemplazar datos más recientes.
+
+    ``keep_until`` alimenta el TTL de DynamoDB, de modo que el item sobrevive
+    a ``expires_at`` y puede servirse como stale.
+    """
+    table = _get_table()
+    if table is None:
+        return False
+
+    item = {
+        **_rates_key(base),
+        "payload": json.dumps(payload, separators=(",", ":")),
+        "expires_at": _to_decimal(round(expires_at, 3)),
+        "fetched_at": _to_decimal(round(fetched_at, 3)),
+        TTL_ATTRIBUTE: int(keep_until),
+    }
+    try:
+        table.put_item(
+            Item=item,
+            ConditionExpression="attribute_not_exists(fetched_at) OR fetched_at < :fetched_at",
+            ExpressionAttributeValues={":fetched_at": item["fetched_at"]},
+        )
+    except ClientError as exc:
+        if _is_conditional_check_failure(exc):
+            return False
+        logger.warning("No fue posible guardar las tasas compartidas: %s", exc)
+        _storage_failed(exc)
+        return False
+    except BotoCoreError as exc:
+        logger.warning("No fue posible guardar las tasas compartidas: %s", exc)
+        _storage_failed(exc)
+        return False
+
+    _storage_succeeded()
+    return True
+
+
+def _pack_rates(rates: Dict[str, Any]) -> Tuple[str, bytes]:
+    """Layout columnar: códigos separados por coma y un bloque float64 little-endian."""
+    symbols = sorted(rates)
+    values = struct.pack(f"<{len(symbols)}d", *(float(rates[code]) for code in symbols))
+    return (",".join(symbols), values)
+
+
+def _unpack_rates(
+    symbols: str,
+    values: Any,
+    wanted: Optional[List[str]] = None,
+) -> Dict[str, float]:
+    raw = bytes(getattr(values, "value", values))
+    codes = symbols.split(",") if symbols else []
+    if wanted is None:
+        return dict(zip(codes, struct.unpack(f"<{len(codes)}d", raw)))
+
+    # Solo se decodifican las columnas pedidas
+    index = {code: position for position, code in enumerate(codes)}
+    return {
+        code: struct.unpack_from("<d", raw, index[code] * 8)[0]
+        for code in wanted
+        if code in index
+    }
+
+
+def put_rates_snapshot(base: str, day: str, rates: Dict[str, Any], last_updated: Optional[str] = None) -> bool:
+    """Guarda la foto diaria de tasas de ``base`` (un item por día con todas las cotizaciones)."""
+    table = _get_table()
+    if table is None:
+        return False
+
+    symbols, values = _pack_rates(rates)
+    item = {
+        PARTITION_KEY: f"{RATES_HISTORY_PARTITION_PREFIX}{base}",
+        SORT_KEY: day,
+        "symbols": symbols,
+        "values": values,
+    }
+    if last_updated:
+        item["last_updated"] = last_updated
+
+    try:
+        table.put_item(Item=item)
     except (BotoCoreError, ClientError) as exc:
-        logger.warning("No fue posible eliminar la conversión: %s", exc)
+        logger.warning("No fue posible guardar la foto de tasas: %s", exc)
+        _storage_failed(exc)
         return False
 
+    _storage_succeeded()
+    return True
 
-def _to_decimal(value: Any) -> Optional[Decimal]:
-    if value is None:
-        return None
-    if isinstance(value, Decimal):
-        return value
-    return Decimal(str(value))
 
+def query_rates_snapshots(
+    base: str,
+    start_day: str,
+    end_day: str,
+    symbols: Optional[List[str]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """Lee las fotos diarias de ``base`` entre dos días (inclusive) con un solo Query.
 
-def _to_float(value: Any) -> Optional[float]:
-    if value is None:
+    Retorna None si el almacenamiento no está disponible.
+    """
+    table = _get_table()
+    if table is None or not storage_supported():
         return None
-    if isinstance(value, Decimal):
-        return float(value)
+
+    query_params = {
+        "KeyConditionExpression": Key(PARTITION_KEY).eq(f"{RATES_HISTORY_PARTITION_PREFIX}{base}")
+        & Key(SORT_KEY).between(start_day, end_day),
+    }
+    items: List[Dict[str, Any]] = []
     try:
-        return float(value)
-    except (TypeError, ValueError):
+        while True:
+            response = table.query(**query_params)
+            items.extend(response.get("Items", []))
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                break
+            query_params["ExclusiveStartKey"] = last_key
+    except (BotoCoreError, ClientError) as exc:
+        logger.warning("No fue posible leer el historial de tasas: %s", exc)
+        _storage_failed(exc)
+        return None
+
+    _storage_succeeded()
+    return [
+        {
+            "date": item[SORT_KEY],
+            "rates": _unpack_rates(item.get("symbols", ""), item.get("values", b""), symbols),
+            "last_updated": item.get("last_updated"),
+        }
+        for item in items
+    ]
+
+
+def _to_decimal(value: Any) -> Optional[Decimal]:
+    if value is None:
         return None
+    return money.to_decimal(value)
+
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los handlers de conversión.
+Simulan el proveedor externo, no requieren conexión a internet.
+"""
+
+import json
+import sys
+import time
+from unittest.mock import Mock, patch
+
+import requests
+
+# Agregar el directorio actual al path
+sys.path.append('.')
+
+from convert_currency.handler import convert_currency, convert_currency_batch
+from shared import exchange, money
+
+
+def _mock_provider():
+    response = Mock()
+    response.raise_for_status.return_value = None
+    response.json.return_value = {
+        "result": "success",
+        "rates": {"USD": 1, "EUR": 0.9, "COP": 4000, "GBP": 0.8, "JPY": 150.37, "KWD": 0.3071},
+        "time_last_update_utc": "Fri, 28 Nov 2025 00:02:31 +0000",
+        "time_next_update_unix": time.time() + 600,
+    }
+    session = Mock()
+    session.get.return_value = response
+    exchange.clear_rates_cache()
+    return patch.object(exchange, "_get_session", return_value=session)
+
+
+def test_convert_currency():
+    """Prueba POST /convert"""
+    print("🧪 Probando POST /convert...")
+
+    with _mock_provider():
+        response = convert_currency({"body": json.dumps({"from": "EUR", "to": "COP", "amount": 10})}, {})
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['result'] == 44444.44
+    assert body['metadata']['rate_source'] == "derived"
+    print("✅ POST /convert - OK\n")
+
+
+def test_convert_currency_batch():
+    """Prueba POST /convert/batch con líneas válidas e inválidas"""
+    print("🧪 Probando POST /convert/batch...")
+
+    items = [
+        {"from": "USD", "to": "COP", "amount": 2},
+        {"from": "EUR", "to": "COP", "amount": 10},
+        {"from": "GBP", "to": "COP", "amount": "abc"},
+        {"from": "USD", "to": "XXX", "amount": 1},
+        {"from": "EUR", "to": "COP", "amount": 1},
+    ]
+    with _mock_provider() as mock_session:
+        response = convert_currency_batch({"body": json.dumps({"items": items})}, {})
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert mock_session.return_value.get.call_count == 1
+    assert body['converted'] == 3
+    assert body['failed'] == 2
+    assert [item['success'] for item in body['results']] == [True, True, False, False, True]
+    assert body['results'][0]['result'] == 8000.0
+    timestamps = [item['timestamp'] for item in body['results'] if item['success']]
+    assert len(set(timestamps)) == len(timestamps)
+    print("✅ POST /convert/batch - OK\n")
+
+
+def test_convert_currency_batch_errors():
+    """Prueba validaciones del lote"""
+    print("🧪 Probando errores de POST /convert/batch...")
+
+    response = convert_currency_batch({"body": json.dumps({"items": []})}, {})
+    assert response['statusCode'] == 400
+
+    response = convert_currency_batch({"body": "invalid json"}, {})
+    assert response['statusCode'] == 400
+    print("✅ Errores de POST /convert/batch - OK\n")
+
+
+def test_convert_currency_provider_timeout():
+    """Un timeout del proveedor responde 504"""
+    print("🧪 Probando timeout del proveedor...")
+
+    session = Mock()
+    session.get.side_effect = requests.Timeout("slow")
+    exchange.clear_rates_cache()
+    with patch.object(exchange, "_get_session", return_value=session):
+        response = convert_currency({"body": json.dumps({"from": "USD", "to": "COP", "amount": 1})}, {})
+
+    assert response['statusCode'] == 504
+    print("✅ Timeout del proveedor - OK\n")
+
+
+def test_convert_rounds_to_target_minor_units():
+    """El resultado se redondea a la unidad mínima de la divisa destino"""
+    print("🧪 Probando precisión por divisa...")
+
+    def convert(source, target, amount):
+        body = json.dumps({"from": source, "to": target, "amount": amount})
+        return json.loads(convert_currency({"body": body}, {})['body'])
+
+    with _mock_provider():
+        to_jpy = convert("USD", "JPY", 9.99)
+        to_kwd = convert("USD", "KWD", 12.5)
+        from_jpy = convert("JPY", "USD", "1000")
+        invalid = convert("USD", "EUR", "1e")
+
+    assert to_jpy['result'] == 1502.0  # 1502.1963 -> sin decimales
+    assert to_kwd['result'] == 3.839  # 3.83875 -> 3 decimales, ROUND_HALF_UP
+    assert from_jpy['result'] == 6.65
+    assert invalid['success'] is False
+
+    assert money.to_decimal(0.1) == money.to_decimal("0.1")
+    assert money.convert(money.to_decimal("-2.5"), money.to_decimal(1), "JPY") == -3
+    for raw in (True, None, "abc", "nan", float("inf")):
+        try:
+            money.to_decimal(raw)
+            raise AssertionError(f"{raw!r} no debe aceptarse")
+        except ValueError:
+            pass
+    print("✅ Precisión por divisa - OK\n")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas de conversión\n")
+
+    try:
+        test_convert_currency()
+        test_convert_currency_batch()
+        test_convert_currency_batch_errors()
+        test_convert_currency_provider_timeout()
+        test_convert_rounds_to_target_minor_units()
+        print("🎉 Todas las pruebas pasaron exitosamente!")
+    except Exception as e:
+        print(f"❌ Error durante las pruebas: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Pruebas del módulo compartido de tasas de cambio.
+Simulan el proveedor externo, no requieren conexión a internet.
+"""
+
+import base64
+import json
+import struct
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+import requests
+
+# Agregar el directorio actual al path
+sys.path.append('.')
+
+from shared import exchange, storage
+
+
+def _provider_response(base="USD", rates=None, next_update_unix=None):
+    payload = {
+        "result": "success",
+        "base_code": base,
+        "rates": rates or {"USD": 1, "EUR": 0.9, "COP": 4000},
+        "time_last_update_utc": "Fri, 28 Nov 2025 00:02:31 +0000",
+        "time_next_update_utc": "Sat, 29 Nov 2025 00:02:31 +0000",
+    }
+    if next_update_unix is not None:
+        payload["time_next_update_unix"] = next_update_unix
+    response = Mock()
+    response.json.return_value = payload
+    response.raise_for_status.return_value = None
+    return response
+
+
+def _mock_provider(response):
+    session = Mock()
+    session.get.return_value = response
+    return patch.object(exchange, "_get_session", return_value=session)
+
+
+def test_rates_cache_hit_and_miss():
+    """La segunda consulta de la misma base se sirve desde el cache"""
+    print("🧪 Probando cache de tasas...")
+    exchange.clear_rates_cache()
+
+    response = _provider_response(next_update_unix=time.time() + 600)
+    with _mock_provider(response) as mock_session:
+        first = exchange.fetch_rates("usd")
+        second = exchange.fetch_rates("USD")
+
+    assert mock_session.return_value.get.call_count == 1
+    assert first["cache"]["hit"] is False
+    assert second["cache"]["hit"] is True
+    assert second["rates"]["COP"] == 4000
+    print("✅ Cache de tasas - OK\n")
+
+
+def test_rates_cache_expires_at_next_update():
+    """Las entradas expiran cuando el proveedor publica nuevas tasas"""
+    print("🧪 Probando expiración del cache...")
+    exchange.clear_rates_cache()
+
+    now = time.time()
+    response = _provider_response(next_update_unix=now + 120)
+    with _mock_provider(response) as mock_session:
+        exchange.fetch_rates("USD")
+        with patch.object(exchange.time, "time", return_value=now + 121):
+            second = exchange.fetch_rates("USD")
+
+    assert mock_session.return_value.get.call_count == 2
+    assert second["cache"]["hit"] is False
+
+    # Proveedor atrasado: next_update ya pasó, la copia nueva dura MIN_CACHE_TTL
+    exchange.clear_rates_cache()
+    late = _provider_response(next_update_unix=now - 1)
+    with _mock_provider(late) as mock_session:
+        exchange.fetch_rates("USD")
+        third = exchange.fetch_rates("USD")
+    assert mock_session.return_value.get.call_count == 1
+    assert third["cache"]["hit"] is True
+    assert exchange._cache_expiry(now, now - 1) == now + exchange.MIN_CACHE_TTL
+    print("✅ Expiración del cache - OK\n")
+
+
+def test_cross_base_rates_use_one_fetch():
+    """Todos los pares se derivan de una única consulta a la moneda pivote"""
+    print("🧪 Probando derivación de tasas cruzadas...")
+    exchange.clear_rates_cache()
+
+    response = _provider_response(next_update_unix=time.time() + 600)
+    with _mock_provider(response) as mock_session:
+        direct = exchange.get_rate("USD", "COP")
+        derived = exchange.get_rate("EUR", "COP")
+        inverse = exchange.get_rate("COP", "USD")
+        eur_table = exchange.rates_for_base("EUR")
+
+    assert mock_session.return_value.get.call_count == 1
+    assert direct["source"] == "direct"
+    assert direct["rate"] == Decimal("4000")
+    assert derived["source"] == "derived"
+    assert derived["rate"] == Decimal("4444.44444444")
+    assert inverse["rate"] == Decimal("0.00025")
+    assert eur_table["base"] == "EUR"
+    assert eur_table["rates"]["EUR"] == 1.0
+    print("✅ Derivación de tasas cruzadas - OK\n")
+
+
+def test_stale_rates_served_when_provider_fails():
+    """Con el proveedor caído se sirven las últimas tasas marcadas como stale"""
+    print("🧪 Probando stale-while-revalidate...")
+    exchange.clear_rates_cache()
+
+    expired = _provider_response(next_update_unix=time.time() - 60)
+    with _mock_provider(expired), patch.object(exchange, "MIN_CACHE_TTL", 0):
+        exchange.fetch_rates("USD")
+
+    session = Mock()
+    session.get.side_effect = requests.Timeout("timeout")
+    with patch.object(exchange, "_get_session", return_value=session):
+        first = exchange.fetch_rates("USD")
+        second = exchange.fetch_rates("USD")
+
+    assert first["stale"] is True
+    assert first["cache"]["stale"] is True
+    assert first["rates"]["COP"] == 4000
+    assert second["stale"] is True
+    # La segunda consulta no espera al proveedor: ya hubo un intento reciente
+    assert session.get.call_count == 1
+
+    with patch.object(exchange, "MAX_STALENESS", 0), \
+            patch.object(exchange, "_get_session", return_value=session):
+        try:
+            exchange.fetch_rates("USD")
+            raise AssertionError("Las tasas demasiado viejas no deben servirse")
+        except exchange.ExchangeRateTimeoutError:
+            pass
+    print("✅ Stale-while-revalidate - OK\n")
+
+
+def test_shared_rates_tier_coalesces_containers():
+    """Las tasas del item rates#USD evitan la consulta al proveedor"""
+    print("🧪 Probando cache compartido en DynamoDB...")
+    exchange.clear_rates_cache()
+
+    published = {
+        "payload": {"base": "USD", "rates": {"USD": 1, "COP": 3999}},
+        "expires_at": time.time() + 600,
+        "fetched_at": time.time() - 5,
+    }
+    response = _provider_response(next_update_unix=time.time() + 600)
+
+    # Otro contenedor tiene el lease y publica las tasas mientras esperamos
+    reads = [None, None, published]
+    with _mock_provider(response) as mock_session, \
+            patch.object(storage, "get_shared_rates", side_effect=lambda base: reads.pop(0)), \
+            patch.object(storage, "acquire_rates_refresh_lease", return_value=False), \
+            patch.object(storage, "put_shared_rates") as mock_put, \
+            patch.object(exchange, "SHARED_POLL_INTERVAL", 0):
+        payload = exchange.fetch_rates("USD")
+
+    assert mock_session.return_value.get.call_count == 0
+    assert mock_put.call_count == 0
+    assert payload["cache"]["tier"] == "shared"
+    assert payload["rates"]["COP"] == 3999
+
+    # Con el lease, este contenedor consulta al proveedor y publica
+    exchange.clear_rates_cache()
+    with _mock_provider(response) as mock_session, \
+            patch.object(storage, "get_shared_rates", return_value=None), \
+            patch.object(storage, "acquire_rates_refresh_lease", return_value=True), \
+            patch.object(storage, "put_shared_rates") as mock_put:
+        payload = exchange.fetch_rates("USD")
+
+    assert mock_session.return_value.get.call_count == 1
+    assert mock_put.call_count == 1
+    assert payload["cache"]["tier"] == "upstream"
+    print("✅ Cache compartido en DynamoDB - OK\n")
+
+
+def test_prefetch_refreshes_only_expired_shared_rates():
+    """El prefetcher omite las bases vigentes y precarga las vencidas"""
+    print("🧪 Probando precarga programada de tasas...")
+    from prefetch_rates.handler import prefetch_rates
+
+    exchange.clear_rates_cache()
+    fresh = {
+        "payload": {"base": "USD", "rates": {"USD": 1, "COP": 4000}},
+        "expires_at": time.time() + 600,
+        "fetched_at": time.time() - 5,
+    }
+    shared = {"USD": fresh, "EUR": None}
+    response = _provider_response(next_update_unix=time.time() + 600)
+
+    with _mock_provider(response) as mock_session, \
+            patch.object(storage, "get_shared_rates", side_effect=shared.get), \
+            patch.object(storage, "put_shared_rates") as mock_put:
+        summary = prefetch_rates({"bases": ["USD", "EUR"]}, None)
+
+    assert summary["skipped"] == ["USD"]
+    assert summary["refreshed"] == ["EUR"]
+    assert mock_session.return_value.get.call_count == 1
+    assert mock_put.call_count == 1
+
+    # La petición siguiente se sirve desde memoria sin consultar al proveedor
+    with _mock_provider(response) as mock_session:
+        payload = exchange.fetch_rates("EUR")
+    assert mock_session.return_value.get.call_count == 0
+    assert payload["cache"]["tier"] == "memory"
+
+    # Vence antes de la próxima ejecución: se renueva por adelantado
+    exchange.clear_rates_cache()
+    expiring = dict(fresh, expires_at=time.time() + exchange.PREFETCH_INTERVAL / 2)
+    with _mock_provider(response) as mock_session, \
+            patch.object(storage, "get_shared_rates", return_value=expiring), \
+            patch.object(storage, "put_shared_rates"):
+        summary = prefetch_rates({"bases": ["USD"]}, None)
+    assert summary["refreshed"] == ["USD"]
+    assert mock_session.return_value.get.call_count == 1
+    print("✅ Precarga programada de tasas - OK\n")
+
+
+def test_prefetch_enabled_serves_expired_shared_copy():
+    """Con el prefetcher activo las peticiones sirven la copia vencida sin ir al proveedor"""
+    print("🧪 Probando copia compartida vencida con prefetch...")
+    response = _provider_response(next_update_unix=time.time() + 600)
+
+    def shared_expired(seconds_ago):
+        return {
+            "payload": {"base": "USD", "rates": {"USD": 1, "COP": 3900}},
+            "expires_at": time.time() - seconds_ago,
+            "fetched_at": time.time() - 3600,
+        }
+
+    exchange.clear_rates_cache()
+    with _mock_provider(response) as mock_session, \
+            patch.object(exchange, "PREFETCH_ENABLED", True), \
+            patch.object(storage, "get_shared_rates", return_value=shared_expired(60)), \
+            patch.object(storage, "acquire_rates_refresh_lease") as mock_lease:
+        payload = exchange.fetch_rates("USD")
+    assert payload["stale"] is True
+    assert payload["rates"]["COP"] == 3900
+    assert mock_session.return_value.get.call_count == 0
+    assert mock_lease.call_count == 0
+
+    # Vencida hace más de dos ejecuciones: el prefetcher parece detenido
+    exchange.clear_rates_cache()
+    with _mock_provider(response) as mock_session, \
+            patch.object(exchange, "PREFETCH_ENABLED", True), \
+            patch.object(storage, "get_shared_rates", return_value=shared_expired(3 * exchange.PREFETCH_INTERVAL)), \
+            patch.object(storage, "acquire_rates_refresh_lease", return_value=True), \
+            patch.object(storage, "put_shared_rates"):
+        payload = exchange.fetch_rates("USD")
+    assert payload["stale"] is False
+    assert payload["rates"]["COP"] == 4000
+    assert mock_session.return_value.get.call_count == 1
+    print("✅ Copia compartida vencida con prefetch - OK\n")
+
+
+def test_rates_history_derives_from_pivot_snapshots():
+    """El historial de tasas se deriva de las fotos diarias del pivote"""
+    print("🧪 Probando historial de tasas...")
+    snapshots = [
+        {"date": "2025-11-27", "rates": {"USD": 1.0, "EUR": 0.8, "COP": 4000.0}, "last_updated": None},
+        {"date": "2025-11-28", "rates": {"USD": 1.0, "COP": 3900.0}, "last_updated": None},
+    ]
+    with patch.object(storage, "query_rates_snapshots", return_value=snapshots) as mock_query:
+        history = exchange.rates_history("eur", date(2025, 11, 1), date(2025, 11, 30), ["cop"])
+
+    # Se piden solo las columnas necesarias, incluida la base para derivar
+    assert mock_query.call_args.args == ("USD", "2025-11-01", "2025-11-30", ["COP", "EUR"])
+    assert history["source"] == "derived"
+    assert history["rates"] == {"2025-11-27": {"COP": 5000.0}}
+
+    with patch.object(storage, "query_rates_snapshots", return_value=None):
+        assert exchange.rates_history("USD", date(2025, 11, 1), date(2025, 11, 30)) is None
+    print("✅ Historial de tasas - OK\n")
+
+
+def test_rates_etag_and_not_modified():
+    """GET /rates emite ETag y Cache-Control y responde 304 con If-None-Match"""
+    print("🧪 Probando ETag de GET /rates...")
+    from get_exchange_rates.handler import get_exchange_rates
+
+    exchange.clear_rates_cache()
+    response = _provider_response(next_update_unix=time.time() + 600)
+    with _mock_provider(response):
+        first = get_exchange_rates({"queryStringParameters": {"base": "USD"}}, None)
+        etag = first["headers"]["ETag"]
+        assert etag.startswith('W/"rates-')
+        assert first["headers"]["Cache-Control"].startswith("public, max-age=")
+        assert 0 < int(first["headers"]["Cache-Control"].split("=")[1]) <= 600
+
+        repeat = get_exchange_rates(
+            {"queryStringParameters": {"base": "USD"}, "headers": {"if-none-match": etag}}, None
+        )
+        other_base = get_exchange_rates({"queryStringParameters": {"base": "EUR"}}, None)
+
+    assert repeat["statusCode"] == 304
+    assert repeat["body"] == ""
+    assert other_base["headers"]["ETag"] != etag
+    print("✅ ETag de GET /rates - OK\n")
+
+
+def test_rates_symbols_and_compact_formats():
+    """GET /rates filtra por symbols y ofrece formatos compact y packed"""
+    print("🧪 Probando symbols y formatos compactos de GET /rates...")
+    from get_exchange_rates.handler import get_exchange_rates
+
+    exchange.clear_rates_cache()
+    response = _provider_response(rates={"USD": 1, "EUR": 0.8, "COP": 4000, "JPY": 150})
+    with _mock_provider(response):
+        filtered = get_exchange_rates({"queryStringParameters": {"base": "EUR", "symbols": "cop,usd"}}, None)
+        compact = get_exchange_rates(
+            {"queryStringParameters": {"base": "EUR", "symbols": "cop,usd", "format": "compact"}}, None
+        )
+        packed = get_exchange_rates(
+            {"queryStringParameters": {"base": "EUR", "symbols": "cop,usd", "format": "packed"}}, None
+        )
+        full_compact = get_exchange_rates({"queryStringParameters": {"format": "compact"}}, None)
+        unknown = get_exchange_rates({"queryStringParameters": {"symbols": "XXX"}}, None)
+        bad_format = get_exchange_rates({"queryStringParameters": {"format": "xml"}}, None)
+
+    assert json.loads(filtered["body"])["rates"] == {"COP": 5000.0, "USD": 1.25}
+
+    compact_body = json.loads(compact["body"])
+    assert compact_body["symbols"] == ["COP", "USD"]
+    assert compact_body["rates"] == [5000.0, 1.25]
+    assert "metadata" not in compact_body
+
+    packed_body = json.loads(packed["body"])
+    assert packed_body["encoding"] == "float64le"
+    assert struct.unpack("<2d", base64.b64decode(packed_body["rates"])) == (5000.0, 1.25)
+
+    # Cada representación tiene su propio ETag
+    assert len({filtered["headers"]["ETag"], compact["headers"]["ETag"], packed["headers"]["ETag"]}) == 3
+
+    assert json.loads(full_compact["body"])["symbols"] == ["COP", "EUR", "JPY", "USD"]
+    assert unknown["statusCode"] == 400
+    assert bad_format["statusCode"] == 400
+    print("✅ Symbols y formatos compactos de GET /rates - OK\n")
+
+
+def _run_concurrently(callers, target):
+    """Lanza ``callers`` hilos a la vez y devuelve (resultados, errores)."""
+    barrier = threading.Barrier(callers)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(target())
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_fetches_share_one_upstream_request():
+    """100 consultas concurrentes de la misma base hacen una sola llamada al proveedor"""
+    print("🧪 Probando single-flight de tasas...")
+    exchange.clear_rates_cache()
+
+    response = _provider_response(next_update_unix=time.time() + 600)
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.2)
+        return response
+
+    session = Mock()
+    session.get.side_effect = slow_get
+    with patch.object(exchange, "_get_session", return_value=session):
+        results, errors = _run_concurrently(100, lambda: exchange.fetch_rates("USD"))
+
+    assert not errors
+    assert len(results) == 100
+    assert session.get.call_count == 1
+    assert all(result["rates"]["COP"] == 4000 for result in results)
+    assert not exchange._flights
+
+    # La entrada ya está en memoria cuando se libera el vuelo
+    exchange.clear_rates_cache()
+    cached_on_release = []
+
+    class RecordingFlight(exchange._Flight):
+        __slots__ = ()
+
+        def __init__(self):
+            super().__init__()
+            done_set = self.done.set
+            self.done.set = lambda: (cached_on_release.append("USD" in exchange._rates_cache), done_set())
+
+    session = Mock()
+    session.get.return_value = response
+    with patch.object(exchange, "_get_session", return_value=session), \
+            patch.object(exchange, "_Flight", RecordingFlight):
+        exchange.fetch_rates("USD")
+    assert cached_on_release == [True]
+
+    # Un error del proveedor también se comparte
+    exchange.clear_rates_cache()
+
+    def failing_get(*args, **kwargs):
+        time.sleep(0.2)
+        raise requests.Timeout("timeout")
+
+    session = Mock()
+    session.get.side_effect = failing_get
+    with patch.object(exchange, "_get_session", return_value=session):
+        results, errors = _run_concurrently(100, lambda: exchange.fetch_rates("USD"))
+
+    assert not results
+    assert len(errors) == 100
+    assert all(isinstance(error, exchange.ExchangeRateTimeoutError) for error in errors)
+    assert session.get.call_count == 1
+    print("✅ Single-flight de tasas - OK\n")
+
+
+def test_async_rates_and_handler_adapter():
+    """Las variantes async comparten cache y single-flight; async_handler reutiliza el loop"""
+    print("🧪 Probando variantes async de tasas...")
+    from shared import aio
+
+    exchange.clear_rates_cache()
+    response = _provider_response(next_update_unix=time.time() + 600)
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.1)
+        return response
+
+    session = Mock()
+    session.get.side_effect = slow_get
+
+    @aio.async_handler
+    async def handler(event, context):
+        rates = await aio.fetch_rates_many(["usd", "USD", "usd"])
+        quote = await aio.get_rate("EUR", "COP")
+        return {"bases": list(rates), "rate": quote["rate"]}
+
+    with patch.object(exchange, "_get_session", return_value=session):
+        first = handler({}, None)
+        loop = aio._loop
+        second = handler({}, None)
+        expected_rate = exchange.get_rate("EUR", "COP")["rate"]
+
+    assert first == {"bases": ["USD"], "rate": expected_rate}
+    assert second == first
+    assert aio._loop is loop
+    assert session.get.call_count == 1
+    print("✅ Variantes async de tasas - OK\n")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas del módulo de tasas de cambio\n")
+
+    try:
+        test_rates_cache_hit_and_miss()
+        test_rates_cache_expires_at_next_update()
+        test_cross_base_rates_use_one_fetch()
+        test_stale_rates_served_when_provider_fails()
+        test_shared_rates_tier_coalesces_containers()
+        test_prefetch_refreshes_only_expired_shared_rates()
+        test_prefetch_enabled_serves_expired_shared_copy()
+        test_rates_history_derives_from_pivot_snapshots()
+        test_rates_etag_and_not_modified()
+        test_rates_symbols_and_compact_formats()
+        test_concurrent_fetches_share_one_upstream_request()
+        test_async_rates_and_handler_adapter()
+        print("🎉 Todas las pruebas pasaron exitosamente!")
+    except Exception as e:
+        print(f"❌ Error durante las pruebas: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,14 @@ Ejecuta pruebas locales de las funciones implementadas.
 import json
 import sys
 from datetime import datetime, timezone
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 # Agregar el directorio actual al path
 sys.path.append('.')
 
+from shared import stats
+from shared.pagination import InvalidCursorError, decode_cursor, encode_cursor
+import get_history.handler as history_handler
 from get_history.handler import (
     get_history,
     create_conversion,
@@ -70,6 +73,18 @@ def test_create_conversion():
     
     return response
 
+def test_create_with_client_timestamp_skips_buffer():
+    """POST /history con timestamp propio pide escritura con sobrescritura"""
+    print("🧪 Probando POST /history con timestamp del cliente...")
+
+    body = {"from": "USD", "to": "EUR", "amount": 100, "result": 89.45}
+    with patch.object(history_handler, "store_conversion_record", return_value=True) as mock_store:
+        create_conversion({"body": json.dumps(body)}, {})
+        assert mock_store.call_args.kwargs == {"overwrite": False}
+        create_conversion({"body": json.dumps(dict(body, timestamp="2025-11-28T10:00:00Z"))}, {})
+        assert mock_store.call_args.kwargs == {"overwrite": True}
+    print("✅ POST /history con timestamp del cliente - OK\n")
+
 def test_get_conversion_by_id():
     """Prueba la función get_conversion_by_id_handler"""
     print("🧪 Probando GET /history/{id}...")
@@ -141,6 +156,189 @@ def test_delete_conversion():
     
     return response
 
+def test_get_history_sparse_fields():
+    """Prueba GET /history?fields=from,to,result"""
+    print("🧪 Probando GET /history con fields...")
+
+    response = get_history({"queryStringParameters": {"fields": "from,to,result"}}, {})
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert all(set(item) == {"from", "to", "result"} for item in body['history'])
+    print("✅ GET /history con fields - OK\n")
+
+    return response
+
+def test_history_cursor_roundtrip():
+    """Prueba que el cursor de paginación es opaco y firmado"""
+    print("🧪 Probando cursor de paginación...")
+
+    last_key = {"pk": "conversion#history", "sk": "2025-10-28T10:00:00Z"}
+    cursor = encode_cursor(last_key)
+    assert decode_cursor(cursor) == last_key
+
+    signature_part = cursor.split(".")[1]
+    tampered = encode_cursor({"pk": "conversion#history", "sk": "9999"}).split(".")[0]
+    try:
+        decode_cursor(f"{tampered}.{signature_part}")
+        raise AssertionError("El cursor alterado debió ser rechazado")
+    except InvalidCursorError:
+        pass
+
+    # Desplegado (no offline) no arranca con la clave pública de desarrollo
+    from shared import pagination
+    deployed = {"AWS_LAMBDA_FUNCTION_NAME": "getHistory"}
+    for env in ({}, {"HISTORY_CURSOR_SECRET": pagination.DEV_CURSOR_SECRET}):
+        with patch.dict("os.environ", {**deployed, **env}, clear=True):
+            try:
+                pagination._load_cursor_secret()
+                raise AssertionError("Sin secreto propio la función no debe arrancar")
+            except RuntimeError:
+                pass
+    with patch.dict("os.environ", {**deployed, "HISTORY_CURSOR_SECRET": "s3cret"}, clear=True):
+        assert pagination._load_cursor_secret() == b"s3cret"
+    with patch.dict("os.environ", {**deployed, "IS_OFFLINE": "true"}, clear=True):
+        assert pagination._load_cursor_secret() == pagination.DEV_CURSOR_SECRET.encode("utf-8")
+    print("✅ Cursor de paginación - OK\n")
+
+def test_history_time_range_and_pair():
+    """Prueba GET /history?since=&until=&from=&to="""
+    print("🧪 Probando GET /history por rango y par...")
+
+    params = {"since": "2025-11-28T10:00:00Z", "until": "2025-11-28", "from": "usd", "to": "cop"}
+    with patch.object(history_handler, "fetch_history_page", return_value=([], None, True)) as mock_fetch:
+        response = get_history({"queryStringParameters": params}, {})
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert mock_fetch.call_args.kwargs == {
+        "since": "2025-11-28T10:00:00+00:00", "until": "2025-11-28~", "pair": ("USD", "COP"),
+    }
+    # Con filtros no se rellenan datos de ejemplo
+    assert body['history'] == []
+    print("✅ GET /history por rango y par - OK\n")
+
+def test_history_etag():
+    """Prueba ETag / If-None-Match en GET /history"""
+    print("🧪 Probando ETag de GET /history...")
+
+    page = ([{"id": "2025-10-28T10:00:00Z", "from": "USD", "to": "EUR", "amount": 10}], None, True)
+    with patch.object(history_handler, "fetch_history_page", return_value=page):
+        response = get_history({"queryStringParameters": None}, {})
+        assert response['statusCode'] == 200
+        etag = response['headers']['ETag']
+        assert etag.startswith('W/"history-')
+        assert response['headers']['Cache-Control'] == "no-cache"
+
+        # Misma página: 304 sin body
+        response = get_history({"queryStringParameters": None, "headers": {"If-None-Match": etag}}, {})
+        assert response['statusCode'] == 304
+        assert response['body'] == ""
+
+    # Editar una conversión de la página cambia el ETag
+    edited = ([dict(page[0][0], amount=12)], None, True)
+    with patch.object(history_handler, "fetch_history_page", return_value=edited):
+        response = get_history({"queryStringParameters": None, "headers": {"If-None-Match": etag}}, {})
+        assert response['statusCode'] == 200
+        assert response['headers']['ETag'] != etag
+    print("✅ ETag de GET /history - OK\n")
+
+def test_history_stats():
+    """Prueba GET /history/stats agregando página por página"""
+    print("🧪 Probando GET /history/stats...")
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    pages = [
+        ([
+            {"from": "USD", "to": "COP", "amount": 10, "result": 40000, "rate": 4000, "timestamp": f"{today}T10:00:00Z"},
+            {"from": "USD", "to": "COP", "amount": 5, "result": 20500, "rate": 4100, "timestamp": f"{today}T09:00:00Z"},
+        ], {"pk": "conversion#history", "sk": f"{today}T09:00:00Z"}, True),
+        # Ventana de días sin conversiones: página vacía con cursor de continuación
+        ([], {"pk": "conversion#history", "sk": today}, True),
+        ([
+            {"from": "EUR", "to": "USD", "amount": 2, "result": 2.3, "rate": None, "timestamp": f"{today}T08:00:00Z"},
+            {"from": "USD", "to": "COP", "amount": 1, "result": 3900, "rate": 3900, "timestamp": "2000-01-01T00:00:00Z"},
+        ], None, True),
+    ]
+
+    engines = ["array"] + (["numpy"] if stats._load_numpy() else [])
+    for engine in engines:
+        with patch.object(history_handler, "fetch_history_page", side_effect=list(pages)), \
+                patch.object(history_handler, "HistoryAggregator", lambda: stats.HistoryAggregator(engine)):
+            response = history_handler.get_history_stats({"queryStringParameters": {"days": "7"}}, {})
+        body = json.loads(response['body'])
+        assert response['statusCode'] == 200
+        assert body['records'] == 3
+        assert body['metadata'] == {"source": "scan", "engine": engine, "pages": 3, "truncated": False}
+        usd_cop = body['pairs'][0]
+        assert (usd_cop['from'], usd_cop['to'], usd_cop['count'], usd_cop['volume']) == ("USD", "COP", 2, 15)
+        assert (usd_cop['avg_rate'], usd_cop['min_rate'], usd_cop['max_rate']) == (4050, 4000, 4100)
+        assert body['pairs'][1]['avg_rate'] is None
+        assert [row['date'] for row in body['daily']] == [today, today]
+
+    with patch.object(history_handler, "fetch_history_page", return_value=([], None, False)):
+        response = history_handler.get_history_stats({"queryStringParameters": None}, {})
+    assert response['statusCode'] == 503
+
+    counters = [
+        {"date": today, "from": "USD", "to": "COP", "count": 2, "amount": 15, "result": 60500},
+        {"date": today, "from": "EUR", "to": "USD", "count": 0, "amount": 0, "result": 0},
+    ]
+    with patch.object(history_handler, "fetch_daily_aggregates", return_value=counters) as mock_counters:
+        response = history_handler.get_history_stats({"queryStringParameters": {"source": "counters", "days": "3"}}, {})
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert (mock_counters.call_args.args[1] - mock_counters.call_args.args[0]).days == 2
+    assert body['records'] == 2
+    assert body['pairs'] == [{"from": "USD", "to": "COP", "count": 2, "volume": 15, "result_total": 60500,
+                              "effective_rate": 60500 / 15}]
+    print("✅ GET /history/stats - OK\n")
+
+def test_bulk_operations():
+    """Prueba POST /history/bulk-delete y PATCH /history/bulk"""
+    print("🧪 Probando operaciones masivas...")
+
+    ids = ["2025-10-28T10:00:00Z", "2025-10-27T14:30:00Z", "2025-10-27T14:30:00Z"]
+    outcomes = {ids[0]: "deleted", ids[1]: "not_found"}
+    with patch.object(history_handler, "delete_conversion_records", return_value=outcomes) as mock_delete:
+        response = history_handler.bulk_delete_conversions({"body": json.dumps({"ids": ids})}, {})
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert mock_delete.call_args.args[0] == ids[:2]  # sin duplicados
+    assert (body['deleted'], body['not_found'], body['failed']) == (1, 1, 0)
+
+    updated = {"status": "updated", "conversion": {"id": ids[0], "amount": 5}}
+    with patch.object(history_handler, "update_conversion_records",
+                      return_value={ids[0]: updated, ids[1]: {"status": "not_found"}}) as mock_update:
+        response = history_handler.bulk_update_conversions(
+            {"body": json.dumps({"ids": ids[:2], "updates": {"amount": 5}})}, {}
+        )
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['results'][0] == {"id": ids[0], **updated}
+    assert (body['updated'], body['not_found']) == (1, 1)
+    sent = mock_update.call_args.args[0]
+    assert sent[ids[0]]["amount"] == 5 and "last_updated" in sent[ids[0]]
+
+    # Un item sin campos editables no recibe last_updated (queda "invalid")
+    with patch.object(history_handler, "update_conversion_records",
+                      return_value={ids[0]: updated, ids[1]: {"status": "invalid"}}) as mock_update:
+        response = history_handler.bulk_update_conversions({"body": json.dumps({"items": [
+            {"id": ids[0], "amount": 5}, {"id": ids[1], "color": "red"},
+        ]})}, {})
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert (body['updated'], body['failed']) == (1, 1)
+    assert mock_update.call_args.args[0][ids[1]] == {"color": "red"}
+
+    bad_requests = [
+        (history_handler.bulk_delete_conversions, {"ids": []}),
+        (history_handler.bulk_delete_conversions, {"ids": ["x"] * (history_handler.MAX_BULK_ITEMS + 1)}),
+        (history_handler.bulk_update_conversions, {"ids": ids, "updates": {}}),
+        (history_handler.bulk_update_conversions, {"items": [{"amount": 1}]}),
+    ]
+    for handler, payload in bad_requests:
+        assert handler({"body": json.dumps(payload)}, {})['statusCode'] == 400
+    print("✅ Operaciones masivas - OK\n")
+
 def test_error_cases():
     """Prueba casos de error"""
     print("🧪 Probando casos de error...")
@@ -160,6 +358,27 @@ def test_error_cases():
     assert response['statusCode'] == 400
     print("✅ POST sin campos requeridos - Error 400 OK")
     
+    # GET /history con cursor alterado
+    response = get_history({"queryStringParameters": {"cursor": "abc.def"}}, {})
+    assert response['statusCode'] == 400
+    print("✅ GET con cursor inválido - Error 400 OK")
+
+    # GET /history con limit inválido
+    response = get_history({"queryStringParameters": {"limit": "many"}}, {})
+    assert response['statusCode'] == 400
+    print("✅ GET con limit inválido - Error 400 OK")
+
+    # GET /history con campo desconocido
+    response = get_history({"queryStringParameters": {"fields": "from,password"}}, {})
+    assert response['statusCode'] == 400
+    print("✅ GET con fields inválido - Error 400 OK")
+
+    # GET /history con rango o par inválidos
+    for params in ({"since": "ayer"}, {"since": "2025-11-29", "until": "2025-11-28"}, {"from": "USD"}):
+        response = get_history({"queryStringParameters": params}, {})
+        assert response['statusCode'] == 400
+    print("✅ GET con since/until/from/to inválidos - Error 400 OK")
+
     # GET con ID faltante
     response = get_conversion_by_id_handler({"pathParameters": None}, {})
     assert response['statusCode'] == 400
@@ -175,10 +394,18 @@ def main():
         # Pruebas de funcionalidad básica
         test_get_history()
         test_create_conversion()
+        test_create_with_client_timestamp_skips_buffer()
         test_get_conversion_by_id()
         test_update_conversion()
         test_delete_conversion()
         
+        test_get_history_sparse_fields()
+        test_history_cursor_roundtrip()
+        test_history_time_range_and_pair()
+        test_history_etag()
+        test_history_stats()
+        test_bulk_operations()
+
         # Pruebas de casos de error
         test_error_cases()
         
@@ -189,6 +416,8 @@ def main():
         print("- ✅ GET /history/{id} - Obtener por ID")
         print("- ✅ PUT /history/{id} - Actualizar conversión")
         print("- ✅ DELETE /history/{id} - Eliminar conversión")
+        print("- ✅ GET /history/stats - Agregados por par y día")
+        print("- ✅ POST /history/bulk-delete y PATCH /history/bulk - Operaciones masivas")
         print("- ✅ Manejo de errores")
         
     except Exception as e:
@@ -0,0 +1,691 @@
+#!/usr/bin/env python3
+"""
+Pruebas del módulo compartido de persistencia.
+Usan una tabla simulada, no requieren DynamoDB.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import types
+from unittest.mock import MagicMock, Mock, patch
+
+# Agregar el directorio actual al path
+sys.path.append('.')
+
+from shared import aio, storage
+
+
+def _counter_updates(table):
+    """update_item de los contadores por (día, par)."""
+    return [
+        call.kwargs for call in table.update_item.call_args_list
+        if call.kwargs["Key"][storage.PARTITION_KEY].startswith(storage.AGGREGATE_PARTITION_PREFIX)
+    ]
+
+
+def _record(index):
+    return {
+        "from": "USD",
+        "to": "COP",
+        "amount": 1,
+        "result": 4000,
+        "rate": 4000,
+        "timestamp": f"2025-11-28T10:00:{index:02d}+00:00",
+    }
+
+
+def test_buffered_writes_flush_in_batches():
+    """Los registros encolados se escriben en lotes de 25 con reintento"""
+    print("🧪 Probando escrituras en lote del historial...")
+
+    table = Mock()
+    unprocessed_once = {storage.TABLE_NAME: [{"PutRequest": {"Item": {}}}]}
+    table.meta.client.batch_write_item.side_effect = [
+        {"UnprocessedItems": unprocessed_once},
+        {"UnprocessedItems": {}},
+        {"UnprocessedItems": {}},
+    ]
+
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "BUFFER_MAX_ITEMS", 100), \
+            patch.object(storage, "BATCH_WRITE_BACKOFF", 0):
+        queued = storage.buffer_conversion_records([_record(i) for i in range(30)])
+        assert table.meta.client.batch_write_item.call_count == 0
+        report = storage.flush_conversion_records()
+
+    assert queued == 30
+    assert report == {"flushed": 30, "dropped": 0}
+    calls = table.meta.client.batch_write_item.call_args_list
+    assert len(calls[0].kwargs["RequestItems"][storage.TABLE_NAME]) == 25
+    assert calls[1].kwargs["RequestItems"] == unprocessed_once
+    assert len(calls[2].kwargs["RequestItems"][storage.TABLE_NAME]) == 5
+    print("✅ Escrituras en lote del historial - OK\n")
+
+
+def test_buffered_mode_writes_client_ids_synchronously():
+    """Un ID elegido por el cliente no pasa por el buffer: ALL_OLD evita contarlo dos veces"""
+    print("🧪 Probando sobrescritura de un ID en modo buffered...")
+
+    record = _record(0)
+    old_item = storage._build_history_item(record)
+    table = MagicMock()
+    table.put_item.side_effect = [{}, {"Attributes": old_item}]
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "WRITE_MODE", "buffered"), \
+            patch.object(storage, "SHARD_COUNT", 0):
+        assert storage.store_conversion_record(record, overwrite=True)
+        assert storage.store_conversion_record(record, overwrite=True)
+        assert storage.flush_conversion_records() == {"flushed": 0, "dropped": 0}
+
+    assert all(call.kwargs["ReturnValues"] == "ALL_OLD" for call in table.put_item.call_args_list)
+    assert table.meta.client.batch_write_item.call_count == 0
+    # La segunda escritura reemplaza a la primera: el par suma una sola conversión
+    counts = [update["ExpressionAttributeValues"][":count"] for update in _counter_updates(table)]
+    assert sum(counts) == 1
+    print("✅ Sobrescritura de un ID en modo buffered - OK\n")
+
+
+def test_buffer_flushes_on_size_threshold():
+    """El buffer se vacía solo al alcanzar el tamaño máximo"""
+    print("🧪 Probando umbral de tamaño del buffer...")
+
+    table = Mock()
+    table.meta.client.batch_write_item.return_value = {"UnprocessedItems": {}}
+
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "BUFFER_MAX_ITEMS", 2):
+        storage.buffer_conversion_records([_record(0)])
+        assert table.meta.client.batch_write_item.call_count == 0
+        storage.buffer_conversion_records([_record(1)])
+        assert table.meta.client.batch_write_item.call_count == 1
+
+    assert storage.history_write_stats()["pending"] == 0
+    print("✅ Umbral de tamaño del buffer - OK\n")
+
+
+def test_sharded_history_scatter_gather():
+    """El historial con shards se mezcla del más reciente al más antiguo"""
+    print("🧪 Probando lectura scatter-gather del historial...")
+
+    timestamps = [
+        "2025-11-28T10:00:00+00:00",
+        "2025-11-28T11:00:00+00:00",
+        "2025-11-28T12:00:00+00:00",
+        "2025-11-27T09:00:00+00:00",
+    ]
+    legacy = ["2025-11-27T23:00:00+00:00", "2025-11-01T08:00:00+00:00"]
+
+    with patch.object(storage, "SHARD_COUNT", 3):
+        partitions = {}
+        for sort_key in timestamps:
+            item = {storage.PARTITION_KEY: storage._partition_for(sort_key), storage.SORT_KEY: sort_key}
+            partitions.setdefault(item[storage.PARTITION_KEY], []).append(item)
+        partitions[storage.LEGACY_PARTITION] = [
+            {storage.PARTITION_KEY: storage.LEGACY_PARTITION, storage.SORT_KEY: sort_key} for sort_key in legacy
+        ]
+
+        def fake_query(table, partition, limit, start_key=None, before=None, projection=None,
+                       since=None, until=None, index=None):
+            items = sorted(partitions.get(partition, []), key=lambda i: i[storage.SORT_KEY], reverse=True)
+            items = [i for i in items if before is None or i[storage.SORT_KEY] < before]
+            items = [i for i in items if since is None or i[storage.SORT_KEY] >= since]
+            items = [i for i in items if until is None or i[storage.SORT_KEY] <= until]
+            return (items[:limit], None)
+
+        with patch.object(storage, "_query_partition", side_effect=fake_query), \
+                patch.object(storage, "_get_table", return_value=Mock()), \
+                patch.object(storage, "_today", return_value=storage.date(2025, 11, 28)):
+            first, cursor = storage._gather_sharded_history(3, None)
+            second, end = storage._gather_sharded_history(3, cursor)
+            # Solo el 27: el día 28 ni los anteriores se consultan
+            ranged, _ = storage._gather_sharded_history(
+                10, None, since=storage.parse_time_bound("2025-11-27"),
+                until=storage.parse_time_bound("2025-11-27", upper=True),
+            )
+
+    assert [i[storage.SORT_KEY] for i in first] == sorted(timestamps[:3], reverse=True)
+    assert cursor[storage.SORT_KEY] == "2025-11-28T10:00:00+00:00"
+    assert [i[storage.SORT_KEY] for i in second] == [legacy[0], timestamps[3], legacy[1]]
+    assert end is not None
+    assert [i[storage.SORT_KEY] for i in ranged] == [legacy[0], timestamps[3]]
+    print("✅ Lectura scatter-gather del historial - OK\n")
+
+
+def test_async_sharded_history_queries_shards_concurrently():
+    """Los shards del día (y el legacy) se consultan en paralelo, también desde aio"""
+    print("🧪 Probando lectura async del historial con shards...")
+
+    timestamps = ["2025-11-28T10:00:00+00:00", "2025-11-28T11:00:00+00:00", "2025-11-28T12:00:00+00:00"]
+    partitions = {}
+    with patch.object(storage, "SHARD_COUNT", 3):
+        for sort_key in timestamps:
+            item = {storage.PARTITION_KEY: storage._partition_for(sort_key), storage.SORT_KEY: sort_key}
+            partitions.setdefault(item[storage.PARTITION_KEY], []).append(item)
+    partitions[storage.LEGACY_PARTITION] = [
+        {storage.PARTITION_KEY: storage.LEGACY_PARTITION, storage.SORT_KEY: "2025-11-27T23:00:00+00:00"}
+    ]
+
+    in_flight = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def slow_query(table, partition, limit, start_key=None, before=None, projection=None,
+                   since=None, until=None, index=None):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        time.sleep(0.05)
+        with lock:
+            in_flight["now"] -= 1
+        items = sorted(partitions.get(partition, []), key=lambda i: i[storage.SORT_KEY], reverse=True)
+        return ([i for i in items if before is None or i[storage.SORT_KEY] < before][:limit], None)
+
+    with patch.object(storage, "SHARD_COUNT", 3), \
+            patch.object(storage, "_get_table", return_value=Mock()), \
+            patch.object(storage, "storage_supported", return_value=True), \
+            patch.object(storage, "_query_partition", side_effect=slow_query), \
+            patch.object(storage, "_today", return_value=storage.date(2025, 11, 28)):
+        items, cursor, active = asyncio.run(aio.fetch_history_page(3))
+        sync_items, sync_cursor, _ = storage.fetch_history_page(3)
+
+    assert active is True
+    assert items == sync_items
+    assert cursor == sync_cursor
+    assert [item["timestamp"] for item in items] == sorted(timestamps, reverse=True)
+    # 3 shards del 28 + partición legacy al mismo tiempo
+    assert in_flight["max"] == 4
+    print("✅ Lectura async del historial con shards - OK\n")
+
+
+def test_sharded_history_continues_past_lookback_window():
+    """Una página recorre LOOKBACK_DAYS días y el cursor sigue hasta ``since``"""
+    print("🧪 Probando cursor de continuación del historial con shards...")
+
+    timestamps = ["2025-11-28T10:00:00+00:00", "2025-11-22T10:00:00+00:00", "2025-11-10T10:00:00+00:00"]
+    partitions = {}
+    with patch.object(storage, "SHARD_COUNT", 2):
+        for sort_key in timestamps:
+            item = {storage.PARTITION_KEY: storage._partition_for(sort_key), storage.SORT_KEY: sort_key}
+            partitions.setdefault(item[storage.PARTITION_KEY], []).append(item)
+    # Legacy fuera de la primera ventana: no puede adelantarse a los shards del 22
+    partitions[storage.LEGACY_PARTITION] = [
+        {storage.PARTITION_KEY: storage.LEGACY_PARTITION, storage.SORT_KEY: "2025-11-20T10:00:00+00:00"}
+    ]
+    queried = []
+
+    def fake_query(table, partition, limit, start_key=None, before=None, projection=None,
+                   since=None, until=None, index=None):
+        queried.append(partition)
+        items = sorted(partitions.get(partition, []), key=lambda i: i[storage.SORT_KEY], reverse=True)
+        items = [i for i in items if before is None or i[storage.SORT_KEY] < before]
+        items = [i for i in items if since is None or i[storage.SORT_KEY] >= since]
+        return (items[:limit], None)
+
+    def read_all(since=None):
+        pages, cursor = [], None
+        while True:
+            page, cursor = storage._gather_sharded_history(2, cursor, since=since)
+            pages.append([item[storage.SORT_KEY] for item in page])
+            if not cursor:
+                return pages
+
+    with patch.object(storage, "SHARD_COUNT", 2), \
+            patch.object(storage, "LOOKBACK_DAYS", 5), \
+            patch.object(storage, "RETENTION_DAYS", 15), \
+            patch.object(storage, "READ_LEGACY", True), \
+            patch.object(storage, "_get_table", return_value=Mock()), \
+            patch.object(storage, "_query_partition", side_effect=fake_query), \
+            patch.object(storage, "_today", return_value=storage.date(2025, 11, 28)):
+        first, cursor = storage._gather_sharded_history(2, None)
+        # Ventana 28..24: un solo item y el cursor apunta al último día visitado
+        assert [i[storage.SORT_KEY] for i in first] == [timestamps[0]]
+        assert cursor == {storage.PARTITION_KEY: storage.LEGACY_PARTITION, storage.SORT_KEY: "2025-11-24"}
+        assert len(queried) == 5 * 2 + 1
+
+        # Sin ``since`` se llega hasta RETENTION_DAYS (14-nov); con ``since`` no se recorta
+        assert read_all() == [[timestamps[0]], [timestamps[1], "2025-11-20T10:00:00+00:00"], [], []]
+        assert sum(read_all(since=storage.parse_time_bound("2025-11-01")), []) == [
+            timestamps[0], timestamps[1], "2025-11-20T10:00:00+00:00", timestamps[2]
+        ]
+    print("✅ Cursor de continuación del historial con shards - OK\n")
+
+
+def test_migrated_rows_are_read_once_and_written_in_every_copy():
+    """Durante la migración cada registro se lee una vez y se edita/borra en todas sus copias"""
+    print("🧪 Probando copias shard + legacy durante la migración...")
+
+    sort_keys = ["2025-11-28T10:00:00+00:00", "2025-11-28T09:00:00+00:00"]
+    with patch.object(storage, "SHARD_COUNT", 3), patch.object(storage, "READ_LEGACY", True):
+        shard_items = [{storage.PARTITION_KEY: storage._partition_for(key), storage.SORT_KEY: key} for key in sort_keys]
+        legacy_items = [{storage.PARTITION_KEY: storage.LEGACY_PARTITION, storage.SORT_KEY: key} for key in sort_keys]
+        page, _ = storage._sharded_result(list(shard_items), 10, legacy_items)
+        assert page == shard_items
+
+        table = MagicMock()
+        table.delete_item.side_effect = lambda Key, **kwargs: {"Attributes": dict(Key, **{"from": "USD", "to": "COP"})}
+        table.update_item.side_effect = lambda Key, **kwargs: {
+            "Attributes": dict(Key, **{"from": "USD", "to": "COP", "amount": 1, "pair": "USD#COP"})
+        }
+        with patch.object(storage, "_get_table", return_value=table):
+            assert storage.delete_conversion_record(sort_keys[0]) is True
+            deleted_keys = [call.kwargs["Key"] for call in table.delete_item.call_args_list]
+            assert deleted_keys == [shard_items[0], legacy_items[0]]
+            # El contador del par descuenta la conversión una sola vez
+            assert _counter_updates(table)[-1]["ExpressionAttributeValues"][":count"] == -1
+
+            table.reset_mock()
+            assert storage.update_conversion_record(sort_keys[1], {"amount": 5})["amount"] == 5
+            updated_keys = [call.kwargs["Key"] for call in table.update_item.call_args_list
+                            if "ConditionExpression" in call.kwargs]
+            assert updated_keys == [shard_items[1], legacy_items[1]]
+
+            table.reset_mock()
+            table.meta.client.batch_get_item.return_value = {
+                "Responses": {storage.TABLE_NAME: legacy_items + shard_items}
+            }
+            table.meta.client.batch_write_item.return_value = {}
+            outcomes = storage.delete_conversion_records(sort_keys)
+            requests = table.meta.client.batch_write_item.call_args.kwargs["RequestItems"][storage.TABLE_NAME]
+            assert outcomes == {key: "deleted" for key in sort_keys}
+            assert len(requests) == 4
+
+            table.reset_mock()
+            table.meta.client.batch_get_item.return_value = {
+                "Responses": {storage.TABLE_NAME: legacy_items + shard_items}
+            }
+            storage.update_conversion_records({key: {"amount": 2} for key in sort_keys})
+            actions = table.meta.client.transact_write_items.call_args.kwargs["TransactItems"]
+            assert [action["Update"]["Key"] for action in actions] == [
+                shard_items[0], legacy_items[0], shard_items[1], legacy_items[1]
+            ]
+    print("✅ Copias shard + legacy durante la migración - OK\n")
+
+
+def test_concurrent_first_calls_wait_for_boto3_import():
+    """Los hilos que llegan durante el import de boto3 esperan su resultado"""
+    print("🧪 Probando import concurrente de boto3...")
+
+    def slow_attribute(name):
+        if name == "Key":
+            time.sleep(0.1)
+            return Mock()
+        raise AttributeError(name)
+
+    conditions = types.ModuleType("boto3.dynamodb.conditions")
+    conditions.__getattr__ = slow_attribute
+    exceptions = types.ModuleType("botocore.exceptions")
+    exceptions.BotoCoreError, exceptions.ClientError = Exception, Exception
+    fake_modules = {
+        "boto3": types.ModuleType("boto3"),
+        "boto3.dynamodb": types.ModuleType("boto3.dynamodb"),
+        "boto3.dynamodb.conditions": conditions,
+        "botocore": types.ModuleType("botocore"),
+        "botocore.exceptions": exceptions,
+    }
+    results = []
+    with patch.dict(sys.modules, fake_modules), \
+            patch.object(storage, "boto3", None), patch.object(storage, "Key", None), \
+            patch.object(storage, "BotoCoreError", storage.BotoCoreError), \
+            patch.object(storage, "ClientError", storage.ClientError), \
+            patch.object(storage, "_boto3_loaded", False):
+        threads = [threading.Thread(target=lambda: results.append(storage.storage_supported())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert results == [True] * 4
+    print("✅ Import concurrente de boto3 - OK\n")
+
+
+def test_worker_threads_get_their_own_table():
+    """Cada hilo de trabajo usa su propio resource (boto3 no es thread-safe)"""
+    print("🧪 Probando tablas por hilo...")
+
+    fake_boto3 = MagicMock()
+    fake_boto3.session.Session.side_effect = lambda: MagicMock()
+    main_table = Mock()
+    seen = []
+
+    def worker():
+        seen.append(storage._get_table())
+        seen.append(storage._get_table())
+
+    with patch.object(storage, "boto3", fake_boto3), \
+            patch.object(storage, "storage_supported", return_value=True), \
+            patch.object(storage, "_cached_table", main_table):
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert storage._get_table() is main_table
+
+    # Una tabla por hilo, reutilizada dentro del hilo, ninguna compartida
+    assert seen[0] is seen[1] and seen[2] is seen[3]
+    assert len({id(seen[0]), id(seen[2]), id(main_table)}) == 3
+    assert fake_boto3.session.Session.call_count == 2
+    print("✅ Tablas por hilo - OK\n")
+
+
+def test_rebuild_aggregates_counts_migrated_rows_once():
+    """La reconstrucción cuenta una vez las filas migradas y borra contadores huérfanos"""
+    print("🧪 Probando reconstrucción de contadores...")
+    import rebuild_history_aggregates as rebuild_script
+
+    migrated = storage._build_history_item(_record(0))
+    legacy_only = storage._build_history_item(_record(1))
+    with patch.object(storage, "SHARD_COUNT", 2):
+        shard_copy = storage._build_history_item(_record(0))
+    migrated[storage.PARTITION_KEY] = legacy_only[storage.PARTITION_KEY] = storage.LEGACY_PARTITION
+    stale_key = storage._aggregate_key("2020-01-01", "USD", "EUR")
+    rows = [migrated, legacy_only, shard_copy, dict(stale_key, count=3)]
+
+    table = MagicMock()
+    table.scan.side_effect = lambda FilterExpression, **kwargs: {
+        "Items": [row for row in rows if row[storage.PARTITION_KEY].startswith(FilterExpression)]
+    }
+    batch = table.batch_writer.return_value.__enter__.return_value
+    with patch.object(rebuild_script, "_partition_filter", side_effect=lambda prefix: prefix), \
+            patch.object(rebuild_script, "PAGE_SIZE", 1):
+        assert rebuild_script.rebuild(table) == (2, 1, 1)
+
+    counters = batch.put_item.call_args.kwargs["Item"]
+    assert (counters["count"], counters["amount_sum"]) == (2, 2)
+    assert batch.delete_item.call_args.kwargs["Key"] == stale_key
+    print("✅ Reconstrucción de contadores - OK\n")
+
+
+def test_pair_index_returns_one_copy_per_conversion():
+    """El GSI del par entrega la copia del shard una vez y rellena la página"""
+    print("🧪 Probando copias duplicadas en el índice del par...")
+
+    sort_keys = [f"2025-11-28T10:00:0{index}+00:00" for index in (5, 4, 3, 2)]
+    index_rows = []
+    with patch.object(storage, "SHARD_COUNT", 2):
+        for position, sort_key in enumerate(sort_keys):
+            shard = {storage.PARTITION_KEY: storage._partition_for(sort_key), storage.SORT_KEY: sort_key}
+            legacy = {storage.PARTITION_KEY: storage.LEGACY_PARTITION, storage.SORT_KEY: sort_key}
+            # Las dos copias quedan seguidas, en cualquier orden; la última no está migrada
+            copies = [legacy] if position == 3 else [legacy, shard] if position % 2 else [shard, legacy]
+            index_rows.extend(dict(row, pair="USD#COP") for row in copies)
+
+    def fake_index_query(table, partition, limit, start_key=None, **options):
+        offset = 0
+        if start_key:
+            offset = next(position for position, row in enumerate(index_rows)
+                          if (row[storage.PARTITION_KEY], row[storage.SORT_KEY])
+                          == (start_key[storage.PARTITION_KEY], start_key[storage.SORT_KEY])) + 1
+        page = index_rows[offset:offset + limit]
+        more = offset + limit < len(index_rows)
+        return (page, dict(page[-1]) if more else None)
+
+    pages, cursor = [], None
+    with patch.object(storage, "_query_partition", side_effect=fake_index_query):
+        while True:
+            items, cursor = storage._query_pair_index(Mock(), "USD#COP", 3, cursor)
+            pages.append(items)
+            if not cursor:
+                break
+
+    delivered = [item[storage.SORT_KEY] for page in pages for item in page]
+    assert delivered == sort_keys
+    assert [len(page) for page in pages] == [3, 1]
+    assert all(item[storage.PARTITION_KEY] != storage.LEGACY_PARTITION for item in sum(pages, [])[:3])
+    assert pages[1][0][storage.PARTITION_KEY] == storage.LEGACY_PARTITION
+    print("✅ Copias duplicadas en el índice del par - OK\n")
+
+
+def test_update_is_single_conditional_call():
+    """PUT usa un solo update_item condicional y retorna el item nuevo"""
+    print("🧪 Probando actualización condicional...")
+
+    table = Mock()
+    table.update_item.return_value = {"Attributes": {
+        storage.PARTITION_KEY: storage.LEGACY_PARTITION,
+        storage.SORT_KEY: "2025-11-28T10:00:00Z",
+        "from": "USD", "to": "EUR", "amount": 100,
+    }}
+
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "SHARD_COUNT", 0):
+        updated = storage.update_conversion_record("2025-11-28T10:00:00Z", {"amount": 150})
+
+        missing = storage.ClientError()
+        missing.response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+        table.update_item.side_effect = missing
+        not_found = storage.update_conversion_record("nope", {"amount": 1})
+
+    kwargs = table.update_item.call_args_list[0].kwargs
+    assert kwargs["ConditionExpression"] == "attribute_exists(#pk)"
+    assert kwargs["ReturnValues"] == "ALL_OLD"
+    assert table.get_item.call_count == 0
+    assert updated["amount"] == 150.0
+    assert not_found is None
+
+    # El segundo update_item es el ajuste del contador del par con la diferencia
+    counter = _counter_updates(table)[0]
+    assert counter["Key"] == {storage.PARTITION_KEY: "stats#2025-11-28", storage.SORT_KEY: "USD#EUR"}
+    assert counter["ExpressionAttributeValues"][":amount"] == 50
+    assert counter["ExpressionAttributeValues"][":count"] == 0
+    print("✅ Actualización condicional - OK\n")
+
+
+def test_aggregates_follow_writes_and_deletes():
+    """Los contadores por (día, par) se ajustan con ADD al escribir y eliminar"""
+    print("🧪 Probando contadores agregados del historial...")
+
+    table = MagicMock()
+    records = [_record(index) for index in range(3)] + [dict(_record(3), to="EUR", result=1)]
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "WRITE_MODE", "sync"):
+        assert storage.store_conversion_records(records) == 4
+
+    # Un update_item por grupo, no por conversión
+    updates = {kwargs["Key"][storage.SORT_KEY]: kwargs for kwargs in _counter_updates(table)}
+    assert set(updates) == {"USD#COP", "USD#EUR"}
+    assert "ADD #count :count" in updates["USD#COP"]["UpdateExpression"]
+    values = updates["USD#COP"]["ExpressionAttributeValues"]
+    assert (values[":count"], values[":amount"], values[":result"]) == (3, 3, 12000)
+    # Las escrituras solo tocan los contadores: ningún item global por lote
+    assert table.update_item.call_count == len(updates)
+
+    table.reset_mock()
+    table.delete_item.return_value = {"Attributes": storage._build_history_item(_record(0))}
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "SHARD_COUNT", 0):
+        assert storage.delete_conversion_record(_record(0)["timestamp"])
+    values = _counter_updates(table)[-1]["ExpressionAttributeValues"]
+    assert (values[":count"], values[":amount"], values[":result"]) == (-1, -1, -4000)
+
+    # Borrar un ID inexistente no toca los contadores
+    table.reset_mock()
+    table.delete_item.return_value = {}
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "SHARD_COUNT", 0):
+        storage.delete_conversion_record("nope")
+    assert table.update_item.call_count == 0
+    print("✅ Contadores agregados del historial - OK\n")
+
+
+def test_projection_for_sparse_fields():
+    """fields= se traduce a ProjectionExpression y solo serializa lo pedido"""
+    print("🧪 Probando proyección de campos...")
+
+    projection = storage._projection(["from", "result"])
+    assert set(projection["ExpressionAttributeNames"].values()) == {"pk", "sk", "from", "result"}
+
+    item = {"pk": "p", "sk": "2025-11-28T10:00:00Z", "from": "USD", "result": storage.Decimal("8.5")}
+    assert storage._serialize_item(item, ["id", "result"]) == {"id": "2025-11-28T10:00:00Z", "result": 8.5}
+    print("✅ Proyección de campos - OK\n")
+
+
+def test_storage_backs_off_and_recovers():
+    """Un fallo de disponibilidad pausa el almacenamiento y luego se recupera"""
+    print("🧪 Probando backoff del almacenamiento...")
+
+    table = Mock()
+    missing_table = storage.ClientError()
+    missing_table.response = {"Error": {"Code": "ResourceNotFoundException"}}
+    table.put_item.side_effect = [missing_table, {}]
+
+    with patch.object(storage, "_cached_table", table), \
+            patch.object(storage, "WRITE_MODE", "sync"), \
+            patch.object(storage, "SHARD_COUNT", 0):
+        assert storage.store_conversion_record(_record(0)) is False
+        assert storage._get_table() is None
+        assert storage.storage_metrics()["consecutive_failures"] == 1
+
+        # Al vencer el backoff se vuelve a intentar y el éxito limpia el estado
+        storage._disabled_until = 0.0
+        assert storage.store_conversion_record(_record(1)) is True
+        assert storage.storage_metrics()["consecutive_failures"] == 0
+        assert storage._get_table() is table
+
+    assert table.load.call_count == 0
+    print("✅ Backoff del almacenamiento - OK\n")
+
+
+def test_rates_snapshots_roundtrip_columnar():
+    """Las fotos diarias se guardan en columnas y se leen con un solo Query"""
+    print("🧪 Probando fotos diarias de tasas...")
+
+    table = Mock()
+    rates = {"USD": 1, "COP": 3999.5, "EUR": 0.8621}
+    with patch.object(storage, "_get_table", return_value=table):
+        assert storage.put_rates_snapshot("USD", "2025-11-28", rates, "Fri, 28 Nov 2025 00:02:31 +0000")
+
+    item = table.put_item.call_args.kwargs["Item"]
+    assert item[storage.PARTITION_KEY] == "rates#history#USD"
+    assert item[storage.SORT_KEY] == "2025-11-28"
+    assert item["symbols"] == "COP,EUR,USD"
+    assert len(item["values"]) == 3 * 8
+
+    table.query.side_effect = [
+        {"Items": [item], "LastEvaluatedKey": {storage.SORT_KEY: "2025-11-28"}},
+        {"Items": [dict(item, sk="2025-11-29")]},
+    ]
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "storage_supported", return_value=True), \
+            patch.object(storage, "Key", MagicMock()):
+        snapshots = storage.query_rates_snapshots("USD", "2025-11-01", "2025-11-30", ["EUR", "COP", "JPY"])
+
+    assert table.query.call_count == 2
+    assert [snapshot["date"] for snapshot in snapshots] == ["2025-11-28", "2025-11-29"]
+    assert snapshots[0]["rates"] == {"EUR": 0.8621, "COP": 3999.5}
+    print("✅ Fotos diarias de tasas - OK\n")
+
+
+def test_bulk_delete_and_update_use_batch_calls():
+    """Las operaciones masivas usan BatchGet + BatchWrite / TransactWrite por lotes"""
+    print("🧪 Probando eliminación y actualización masivas...")
+
+    stored = [storage._build_history_item(_record(index)) for index in range(3)]
+    ids = [item[storage.SORT_KEY] for item in stored] + ["nope"]
+
+    table = Mock()
+    client = table.meta.client
+    client.batch_get_item.return_value = {"Responses": {storage.TABLE_NAME: stored}}
+    client.batch_write_item.return_value = {"UnprocessedItems": {storage.TABLE_NAME: [
+        {"DeleteRequest": {"Key": {storage.PARTITION_KEY: stored[2][storage.PARTITION_KEY],
+                                   storage.SORT_KEY: stored[2][storage.SORT_KEY]}}},
+    ]}}
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "SHARD_COUNT", 0), \
+            patch.object(storage, "BATCH_WRITE_RETRIES", 0):
+        outcomes = storage.delete_conversion_records(ids)
+
+    assert outcomes == {ids[0]: "deleted", ids[1]: "deleted", ids[2]: "failed", "nope": "not_found"}
+    assert client.batch_get_item.call_count == 1
+    assert client.batch_write_item.call_count == 1
+    # Solo los dos eliminados descuentan del contador del par
+    counter = _counter_updates(table)[-1]["ExpressionAttributeValues"]
+    assert (counter[":count"], counter[":amount"]) == (-2, -2)
+
+    table.reset_mock()
+    client.batch_get_item.return_value = {"Responses": {storage.TABLE_NAME: stored}}
+    updates = {item_id: {"amount": 2} for item_id in ids}
+    updates[ids[0]] = {"unknown": 1, "last_updated": "2025-11-28T10:00:00+00:00"}
+    updates["bad-amount"] = {"amount": "abc"}
+    with patch.object(storage, "_get_table", return_value=table), \
+            patch.object(storage, "SHARD_COUNT", 0):
+        outcomes = storage.update_conversion_records(updates)
+
+    # Sin campos editables o con un valor inválido: "invalid" solo para ese ID
+    assert outcomes[ids[0]] == {"status": "invalid"}
+    assert outcomes["bad-amount"] == {"status": "invalid"}
+    assert outcomes["nope"] == {"status": "not_found"}
+    assert outcomes[ids[1]]["status"] == "updated"
+    assert outcomes[ids[1]]["conversion"]["amount"] == 2
+    actions = client.transact_write_items.call_args.kwargs["TransactItems"]
+    assert [action["Update"]["Key"][storage.SORT_KEY] for action in actions] == ids[1:3]
+    assert all(action["Update"]["ConditionExpression"] == "attribute_exists(#pk)" for action in actions)
+    print("✅ Eliminación y actualización masivas - OK\n")
+
+
+def test_time_range_and_pair_key_conditions():
+    """since/until y el par se resuelven con la condición de clave, no con filtros"""
+    print("🧪 Probando consultas por rango de tiempo y par...")
+
+    assert storage.parse_time_bound("2025-11-28") == "2025-11-28"
+    assert storage.parse_time_bound("2025-11-28", upper=True) == "2025-11-28~"
+    assert storage.parse_time_bound("2025-11-28T05:00:00-05:00") == "2025-11-28T10:00:00+00:00"
+    try:
+        storage.parse_time_bound("ayer")
+        raise AssertionError("La fecha inválida debió ser rechazada")
+    except ValueError:
+        pass
+
+    key = MagicMock()
+    table = Mock()
+    before = "2025-11-28T10:00:00+00:00"
+    table.query.return_value = {"Items": [{storage.SORT_KEY: before}, {storage.SORT_KEY: "2025-11-28T09:00:00+00:00"}]}
+    with patch.object(storage, "Key", key):
+        items, _ = storage._query_partition(
+            table, "USD#COP", 1, before=before, since="2025-11-28", until="2025-11-28~", index=storage.PAIR_INDEX
+        )
+
+    params = table.query.call_args.kwargs
+    assert params["IndexName"] == storage.PAIR_INDEX
+    assert params["Limit"] == 2  # BETWEEN incluye ``before``: se pide uno más y se descarta
+    key.assert_any_call(storage.PAIR_ATTRIBUTE)
+    key.return_value.between.assert_called_once_with("2025-11-28", before)
+    assert [item[storage.SORT_KEY] for item in items] == ["2025-11-28T09:00:00+00:00"]
+
+    item = storage._build_history_item(_record(0))
+    assert item[storage.PAIR_ATTRIBUTE] == "USD#COP"
+    print("✅ Consultas por rango de tiempo y par - OK\n")
+
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Iniciando pruebas del módulo de persistencia\n")
+
+    try:
+        test_buffered_writes_flush_in_batches()
+        test_buffer_flushes_on_size_threshold()
+        test_buffered_mode_writes_client_ids_synchronously()
+        test_sharded_history_scatter_gather()
+        test_async_sharded_history_queries_shards_concurrently()
+        test_sharded_history_continues_past_lookback_window()
+        test_migrated_rows_are_read_once_and_written_in_every_copy()
+        test_concurrent_first_calls_wait_for_boto3_import()
+        test_worker_threads_get_their_own_table()
+        test_time_range_and_pair_key_conditions()
+        test_rebuild_aggregates_counts_migrated_rows_once()
+        test_pair_index_returns_one_copy_per_conversion()
+        test_update_is_single_conditional_call()
+        test_aggregates_follow_writes_and_deletes()
+        test_bulk_delete_and_update_use_batch_calls()
+        test_projection_for_sparse_fields()
+        test_storage_backs_off_and_recovers()
+        test_rates_snapshots_roundtrip_columnar()
+        print("🎉 Todas las pruebas pasaron exitosamente!")
+    except Exception as e:
+        print(f"❌ Error durante las pruebas: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()